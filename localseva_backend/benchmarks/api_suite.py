@@ -0,0 +1,300 @@
+"""
+End-to-end load benchmark of the REST API with realistic request mixes.
+
+Seeds a local database (seed.py), starts a server from this checkout with
+benchmarks.settings (media in an in-memory fake of Cloudinary), logs in one
+customer per virtual user and runs weighted scenarios until `--duration`:
+
+    browse   provider list, provider reviews, marketplace list, product detail and comments
+    search   provider / product text search, category, location and distance filters
+    book     find a provider, book, quote, accept, start, complete and review
+    login    log in again
+
+Latency and throughput are reported per endpoint (and overall), and the run
+is written as JSON (--output) together with its configuration and git
+revision, so results can be compared across runs (--compare OLD.json).
+From localseva_backend/, with DB_* pointing at a local database:
+
+    python benchmarks/api_suite.py --server sync-wsgi --concurrency 32 --duration 30
+    python benchmarks/api_suite.py --mix browse=1 --output browse.json --compare api_suite.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from http_load import ApiClient, LatencyRecorder  # noqa: E402
+from seed import CATEGORIES, CITIES, PASSWORD, PRODUCT_WORDS, customer_name, near, seed, setup_django  # noqa: E402
+from servers import BACKEND_DIR, SERVERS, running_server  # noqa: E402
+
+SCENARIOS = {}
+DEFAULT_MIX = {'browse': 60, 'search': 25, 'book': 10, 'login': 5}
+
+
+def scenario(func):
+    SCENARIOS[func.__name__] = func
+    return func
+
+
+def ok(status):
+    return status is not None and status < 400
+
+
+class VirtualUser:
+    """One customer with its own connections; provider calls go over a second one"""
+
+    def __init__(self, base_url, recorder, username, data, tokens, rng):
+        self.customer = ApiClient(base_url, recorder)
+        self.provider = ApiClient(base_url, recorder)
+        self.username = username
+        self.data = data
+        # username -> access token, shared by all virtual users
+        self.tokens = tokens
+        self.rng = rng
+
+    async def login(self, client, username):
+        status, body = await client.call('POST', '/login/', data={'username': username, 'password': PASSWORD})
+        if not ok(status):
+            return None
+        self.tokens[username] = client.token = body['access']
+        return client.token
+
+    async def login_provider(self, username):
+        self.provider.token = self.tokens.get(username)
+        if self.provider.token is None:
+            await self.login(self.provider, username)
+        return self.provider.token
+
+    def close(self):
+        self.customer.close()
+        self.provider.close()
+
+
+@scenario
+async def browse(user):
+    rng, data = user.rng, user.data
+    await user.customer.call('GET', '/providers/')
+    provider_id = rng.choice(data['provider_ids'])
+    await user.customer.call('GET', f'/providers/{provider_id}/reviews/', 'GET /providers/<id>/reviews/')
+    await user.customer.call('GET', '/marketplace/')
+    product_id = rng.choice(data['product_ids'])
+    await user.customer.call('GET', f'/marketplace/{product_id}/', 'GET /marketplace/<id>/')
+    await user.customer.call('GET', f'/marketplace/{product_id}/comments/', 'GET /marketplace/<id>/comments/')
+
+
+@scenario
+async def search(user):
+    rng = user.rng
+    city = rng.choice(CITIES)
+    latitude, longitude = near(rng, city)
+    category = rng.choice(CATEGORIES)
+    await user.customer.call('GET', f'/providers/?search={category.split()[0].lower()}',
+                             'GET /providers/?search=')
+    await user.customer.call('GET', f'/providers/?category={category.lower().replace(" ", "-")}'
+                                    f'&location={city[0]}', 'GET /providers/?category=&location=')
+    await user.customer.call('GET', f'/providers/?near={latitude:.4f},{longitude:.4f}&radius=10',
+                             'GET /providers/?near=')
+    await user.customer.call('GET', f'/providers/top/?category={category.lower().replace(" ", "-")}',
+                             'GET /providers/top/?category=')
+    await user.customer.call('GET', f'/marketplace/?search={rng.choice(PRODUCT_WORDS)}',
+                             'GET /marketplace/?search=')
+    await user.customer.call('GET', f'/marketplace/?near={latitude:.4f},{longitude:.4f}&radius=10',
+                             'GET /marketplace/?near=')
+
+
+@scenario
+async def book(user):
+    rng = user.rng
+    category = rng.choice(CATEGORIES)
+    status, providers = await user.customer.call(
+        'GET', f'/providers/?category={category.lower().replace(" ", "-")}&is_available=true',
+        'GET /providers/?category=&location=',
+    )
+    if not ok(status) or not providers:
+        return False
+    provider = rng.choice(providers)
+    if not await user.login_provider(provider['username']):
+        return False
+
+    # Spread over a year so runs rarely pick a time the provider is already booked at
+    scheduled = datetime.now(timezone.utc) + timedelta(
+        days=rng.randint(1, 365), minutes=rng.randrange(0, 24 * 60, 15)
+    )
+    status, booking = await user.customer.call('POST', '/bookings/create/', data={
+        'provider_id': provider['id'], 'service_category': category,
+        'description': 'Benchmark booking', 'address': '1 Bench Street',
+        'scheduled_date': scheduled.isoformat(),
+    })
+    if not ok(status):
+        return False
+    path = f"/bookings/{booking['id']}/"
+
+    steps = [
+        (user.provider, 'quote', {'quote_price': '750.00', 'provider_notes': 'Can do'}),
+        (user.customer, 'accept', {'status': 'ACCEPTED'}),
+        (user.provider, 'start', {'status': 'IN_PROGRESS'}),
+        (user.provider, 'complete', {'status': 'COMPLETED', 'final_price': '750.00'}),
+    ]
+    for client, step, data in steps:
+        status, _ = await client.call('PATCH', path, f'PATCH /bookings/<id>/ ({step})', data=data)
+        if not ok(status):
+            return False
+
+    status, _ = await user.customer.call('POST', '/reviews/create/', data={
+        'booking': booking['id'], 'provider_id': provider['id'],
+        'rating': rng.randint(3, 5), 'comment': 'Benchmark review',
+    })
+    if not ok(status):
+        return False
+    status, _ = await user.customer.call('GET', '/bookings/')
+    return ok(status)
+
+
+@scenario
+async def login(user):
+    return await user.login(user.customer, user.username) is not None
+
+
+async def run_mix(base_url, data, mix, concurrency, duration, think_time=0.0, random_seed=1):
+    """Run weighted scenarios from `concurrency` virtual users for `duration` seconds"""
+    recorder = LatencyRecorder()
+    names, weights = zip(*mix.items())
+    counts = {name: {'runs': 0, 'failures': 0} for name in names}
+    tokens = {}
+
+    users = [
+        VirtualUser(base_url, recorder, customer_name(i % data['customers']), data, tokens,
+                    random.Random(random_seed + i))
+        for i in range(concurrency)
+    ]
+    # Log in before the clock starts; logins are measured all the same
+    await asyncio.gather(*(user.login(user.customer, user.username) for user in users))
+
+    deadline = time.monotonic() + duration
+
+    async def run(user):
+        while time.monotonic() < deadline:
+            name = user.rng.choices(names, weights)[0]
+            succeeded = await SCENARIOS[name](user)
+            counts[name]['runs'] += 1
+            if succeeded is False:
+                counts[name]['failures'] += 1
+            if think_time:
+                await asyncio.sleep(user.rng.expovariate(1 / think_time))
+        user.close()
+
+    started = time.monotonic()
+    await asyncio.gather(*(run(user) for user in users))
+    elapsed = time.monotonic() - started
+    return {**recorder.report(elapsed), 'scenarios': counts, 'elapsed': round(elapsed, 2)}
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"Unknown scenario {name!r}, choose from {', '.join(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, previous=None):
+    before = (previous or {}).get('results', {}).get('paths', {})
+    print(f"\n{'endpoint':<42} {'requests':>8} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for label, stats in [('(all)', results['overall']), *sorted(results['paths'].items())]:
+        line = (f"{label:<42} {stats['requests']:>8} {stats['rps']:>8} {stats['p50_ms']!s:>8} "
+                f"{stats['p95_ms']!s:>8} {stats['p99_ms']!s:>8} {stats['errors']:>7}")
+        old = previous['results']['overall'] if previous and label == '(all)' else before.get(label)
+        if old and old.get('p95_ms') and stats['p95_ms']:
+            change = (stats['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100
+            line += f"   p95 {change:+.0f}% vs {old['p95_ms']}"
+        print(line)
+    print()
+    for name, counts in results['scenarios'].items():
+        print(f"scenario {name:<8} {counts['runs']:>6} runs, {counts['failures']} failed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server', choices=SERVERS, default='sync-wsgi')
+    parser.add_argument('--base-url', help='Benchmark an already running server instead of starting one')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=30.0)
+    parser.add_argument('--warmup', type=float, default=3.0, help='Seconds of unrecorded load first')
+    parser.add_argument('--think-time', type=float, default=0.0,
+                        help='Mean pause between scenarios per virtual user (seconds)')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help='Scenario weights, e.g. browse=60,search=25,book=10,login=5')
+    parser.add_argument('--response-cache-timeout', default='60',
+                        help='RESPONSE_CACHE_TIMEOUT for the server (0 disables the cache)')
+    parser.add_argument('--providers', type=int, default=200)
+    parser.add_argument('--customers', type=int, default=200)
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--reseed', action='store_true', help='Recreate the benchmark data')
+    parser.add_argument('--output', default='api_suite.json')
+    parser.add_argument('--compare', help='Earlier --output file to compare against')
+    args = parser.parse_args()
+
+    setup_django()
+    data = seed(args.providers, args.customers, args.products, reset=args.reseed)
+
+    env = {
+        'DJANGO_SETTINGS_MODULE': 'benchmarks.settings',
+        'RESPONSE_CACHE_TIMEOUT': args.response_cache_timeout,
+    }
+
+    def measure(base_url):
+        if args.warmup:
+            asyncio.run(run_mix(base_url, data, args.mix, args.concurrency, args.warmup))
+        return asyncio.run(run_mix(base_url, data, args.mix, args.concurrency, args.duration))
+
+    print(f"Running {', '.join(args.mix)} for {args.duration}s with {args.concurrency} users ...", flush=True)
+    if args.base_url:
+        results = measure(args.base_url.rstrip('/'))
+    else:
+        with running_server(args.server, args.workers, args.port, env) as base_url:
+            results = measure(base_url)
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    print_results(results, previous)
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'config': {
+                key: getattr(args, key) for key in (
+                    'server', 'base_url', 'workers', 'concurrency', 'duration', 'think_time',
+                    'mix', 'response_cache_timeout',
+                )
+            },
+            'dataset': {key: data[key] for key in ('providers', 'customers', 'products')},
+            'results': results,
+        }, f, indent=2)
+    print(f'\nWrote {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Compare concurrent-request throughput of the sync WSGI workers (what the
+Procfile's `web` process runs) with the ASGI deployment and its native
+async read views (the `asgi` process).
+
+Both servers are started from this checkout with the current environment
+(DB_*, SECRET_KEY, ... or DJANGO_SETTINGS_MODULE), so point it at a local
+database with some data in it. For example, from localseva_backend/:
+
+    python benchmarks/async_vs_sync.py --workers 2 --concurrency 64 --duration 15
+
+Prints a table and writes the full results as JSON (--output).
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from http_load import run_load  # noqa: E402
+from servers import SERVERS, running_server  # noqa: E402
+
+DEFAULT_PATHS = [
+    '/providers/',
+    '/marketplace/',
+    '/marketplace/?search=sofa',
+]
+
+
+def run_server(name, args):
+    # The response cache would hide the database from the comparison
+    env = {'RESPONSE_CACHE_TIMEOUT': os.environ.get('RESPONSE_CACHE_TIMEOUT', '0')}
+    with running_server(name, args.workers, args.port, env) as base_url:
+        # Warm up connections, caches and code paths before measuring
+        asyncio.run(run_load(base_url, args.paths, concurrency=4, duration=2))
+        return asyncio.run(run_load(base_url, args.paths, args.concurrency, args.duration))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--path', dest='paths', action='append',
+                        help='Path to request (repeatable, default: providers and marketplace)')
+    parser.add_argument('--output', default='async_vs_sync.json')
+    args = parser.parse_args()
+    args.paths = args.paths or DEFAULT_PATHS
+
+    results = {}
+    for name in SERVERS:
+        print(f'Running {name} ...', flush=True)
+        results[name] = run_server(name, args)
+
+    print(f"\n{'server':<12} {'path':<32} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for name, result in results.items():
+        for path, stats in [('(all)', result['overall']), *result['paths'].items()]:
+            print(f"{name:<12} {path:<32} {stats['rps']:>8} {stats['p50_ms']!s:>8} "
+                  f"{stats['p95_ms']!s:>8} {stats['p99_ms']!s:>8} {stats['errors']:>7}")
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'config': {key: getattr(args, key) for key in ('workers', 'concurrency', 'duration', 'paths')},
+            'results': results,
+        }, f, indent=2)
+    print(f'\nWrote {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,12 @@
+"""
+Stand-in for Cloudinary during benchmarks: files are kept in the server
+process's memory and URLs look like Cloudinary delivery URLs, so uploads
+and serializers work without network calls or credentials.
+"""
+from django.core.files.storage import InMemoryStorage
+
+
+class FakeCloudinaryStorage(InMemoryStorage):
+    def __init__(self, **kwargs):
+        kwargs.setdefault('base_url', 'https://res.cloudinary.com/localseva-bench/image/upload/')
+        super().__init__(**kwargs)
@@ -0,0 +1,200 @@
+"""
+Minimal HTTP/1.1 load generator (standard library only).
+
+`concurrency` client coroutines each keep one connection open (reconnecting
+whenever the server closes it, as gunicorn's sync workers do) and send
+requests back to back for `duration` seconds. Latency is measured per
+request, from writing the request to reading the last body byte.
+
+`LatencyRecorder` and `ApiClient` are the building blocks for scripted
+scenarios (see api_suite.py): each call is recorded under a label such as
+"GET /providers/", and the recorder summarizes per label.
+"""
+import asyncio
+import json
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+
+# What a dropped or garbled connection raises in Connection.request()
+CONNECTION_ERRORS = (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(int(len(sorted_values) * fraction), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    ms = lambda value: None if value is None else round(value * 1000, 2)  # noqa: E731
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': ms(percentile(latencies, 0.50)),
+        'p95_ms': ms(percentile(latencies, 0.95)),
+        'p99_ms': ms(percentile(latencies, 0.99)),
+    }
+
+
+class LatencyRecorder:
+    """Latencies of successful requests and error counts, per label"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(Counter)
+
+    def record(self, label, seconds, status=None):
+        """`status` None means the request failed without a response"""
+        self.statuses[label][str(status or 'no response')] += 1
+        if status is None or status >= 400:
+            self.errors[label] += 1
+        else:
+            self.latencies[label].append(seconds)
+
+    def labels(self):
+        return sorted(set(self.latencies) | set(self.errors))
+
+    def report(self, elapsed, labels=None):
+        """{'overall': {...}, 'paths': {label: {...}}} for `elapsed` seconds of load"""
+        labels = labels or self.labels()
+        paths = {}
+        for label in labels:
+            paths[label] = summarize(self.latencies[label], self.errors[label], elapsed)
+            paths[label]['statuses'] = dict(self.statuses[label])
+        return {
+            'overall': summarize([v for label in labels for v in self.latencies[label]],
+                                 sum(self.errors[label] for label in labels), elapsed),
+            'paths': paths,
+        }
+
+
+class Connection:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, headers=None, body=b''):
+        """Send one request, return (status, headers, body)"""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {self.host}:{self.port}',
+                 f'Content-Length: {len(body)}']
+        lines += [f'{name}: {value}' for name, value in (headers or {}).items()]
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode() + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('Server closed the connection')
+        status = int(status_line.split()[1])
+
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        if 'content-length' in response_headers:
+            content = await self.reader.readexactly(int(response_headers['content-length']))
+        elif response_headers.get('transfer-encoding') == 'chunked':
+            content = await self._read_chunked()
+        else:
+            content = await self.reader.read()
+            response_headers['connection'] = 'close'
+
+        if response_headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, response_headers, content
+
+    async def _read_chunked(self):
+        chunks = []
+        while True:
+            size = int((await self.reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                await self.reader.readline()
+                return b''.join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readline()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+class ApiClient:
+    """JSON requests over one keep-alive connection, recorded in a LatencyRecorder"""
+
+    def __init__(self, base_url, recorder, token=None):
+        url = urlsplit(base_url)
+        self.connection = Connection(url.hostname, url.port or 80)
+        self.recorder = recorder
+        self.token = token
+
+    async def call(self, method, path, label=None, data=None):
+        """Returns (status, decoded JSON body); status is None if the request failed"""
+        headers = {'Accept': 'application/json'}
+        body = b''
+        if data is not None:
+            headers['Content-Type'] = 'application/json'
+            body = json.dumps(data).encode()
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+
+        label = label or f'{method} {path.split("?")[0]}'
+        started = time.perf_counter()
+        try:
+            status, _, content = await self.connection.request(method, path, headers, body)
+        except CONNECTION_ERRORS:
+            self.connection.close()
+            self.recorder.record(label, time.perf_counter() - started)
+            return None, None
+        self.recorder.record(label, time.perf_counter() - started, status)
+        try:
+            return status, json.loads(content) if content else None
+        except ValueError:
+            return status, None
+
+    def close(self):
+        self.connection.close()
+
+
+async def run_load(base_url, paths, concurrency=32, duration=10.0, headers=None):
+    """
+    Hit `paths` round robin from `concurrency` clients for `duration`
+    seconds. Returns {'overall': {...}, 'paths': {path: {...}}}.
+    """
+    url = urlsplit(base_url)
+    host, port = url.hostname, url.port or 80
+    recorder = LatencyRecorder()
+    deadline = time.monotonic() + duration
+
+    async def client(offset):
+        connection = Connection(host, port)
+        index = offset
+        while time.monotonic() < deadline:
+            path = paths[index % len(paths)]
+            index += 1
+            started = time.perf_counter()
+            try:
+                status, _, _ = await connection.request('GET', path, headers)
+            except CONNECTION_ERRORS:
+                connection.close()
+                recorder.record(path, time.perf_counter() - started)
+                continue
+            recorder.record(path, time.perf_counter() - started, status)
+        connection.close()
+
+    started = time.monotonic()
+    await asyncio.gather(*(client(i) for i in range(concurrency)))
+    elapsed = time.monotonic() - started
+    return recorder.report(elapsed, labels=paths)
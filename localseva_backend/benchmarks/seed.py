@@ -0,0 +1,181 @@
+"""
+Deterministic benchmark data: service providers with categories, areas,
+completed bookings and reviews, customers, and marketplace products.
+
+Rows are inserted with bulk_create (no signals), so profiles, geohashes and
+image names are filled in here and the counter columns are fixed up with
+`reconcile_counters` afterwards. All accounts are named bench_* and share
+PASSWORD; `--reset` deletes them (and everything they own) first.
+
+    DJANGO_SETTINGS_MODULE=benchmarks.settings python benchmarks/seed.py --providers 200
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PREFIX = 'bench_'
+PASSWORD = 'bench-Pass-123'
+
+CATEGORIES = ['Plumbing', 'Electrical', 'Cleaning', 'Carpentry', 'Painting', 'Appliance Repair']
+CITIES = [
+    ('Mumbai', 19.076, 72.877),
+    ('Pune', 18.520, 73.856),
+    ('Bengaluru', 12.972, 77.594),
+]
+PRODUCT_WORDS = ['sofa', 'table', 'chair', 'laptop', 'phone', 'bicycle', 'fridge', 'lamp', 'bed', 'desk']
+PRODUCT_CATEGORIES = ['FURNITURE', 'ELECTRONICS', 'VEHICLES', 'HOME_APPLIANCES', 'OTHER']
+CONDITIONS = ['NEW', 'LIKE_NEW', 'GOOD', 'FAIR']
+
+
+def provider_name(i):
+    return f'{PREFIX}provider_{i}'
+
+
+def customer_name(i):
+    return f'{PREFIX}customer_{i}'
+
+
+def near(rng, city):
+    _, lat, lng = city
+    return lat + rng.uniform(-0.2, 0.2), lng + rng.uniform(-0.2, 0.2)
+
+
+def seed(providers=200, customers=200, products=2000, reviews_per_provider=5, random_seed=1, reset=False):
+    """Create the data set unless it already exists; returns its size"""
+    from django.contrib.auth.hashers import make_password
+    from django.core.management import call_command
+    from django.db import connection, transaction
+    from django.utils import timezone
+
+    from local_user.geo import encode_geohash
+    from local_user.models import (
+        Booking, Product, Profile, Review, ServiceArea, ServiceCategory, UserModel
+    )
+
+    bench_users = UserModel.objects.filter(username__startswith=PREFIX)
+    if reset:
+        bench_users.delete()
+    elif bench_users.filter(username=provider_name(0)).exists():
+        return describe()
+
+    rng = random.Random(random_seed)
+    password = make_password(PASSWORD)
+    now = timezone.now()
+
+    with transaction.atomic():
+        users = UserModel.objects.bulk_create(
+            [UserModel(username=provider_name(i), email=f'{provider_name(i)}@example.com',
+                       password=password, is_service_provider=True) for i in range(providers)]
+            + [UserModel(username=customer_name(i), email=f'{customer_name(i)}@example.com',
+                         password=password) for i in range(customers)]
+        )
+        customer_users = users[providers:]
+
+        profiles = []
+        for i, user in enumerate(users):
+            city = CITIES[i % len(CITIES)]
+            latitude, longitude = near(rng, city)
+            profile = Profile(user=user, location=city[0], latitude=latitude, longitude=longitude,
+                              geohash=encode_geohash(latitude, longitude))
+            if user.is_service_provider:
+                profile.role = 'SERVICE'
+                profile.experience_years = rng.randint(1, 20)
+                profile.pricing_type = rng.choice(['FIXED', 'FLEXIBLE'])
+                profile.base_price = rng.randint(200, 2000)
+                profile.bio = f'{rng.choice(CATEGORIES)} professional in {city[0]}'
+            profiles.append(profile)
+        profiles = Profile.objects.bulk_create(profiles)
+        provider_profiles = profiles[:providers]
+
+        categories = ServiceCategory.objects.resolve(CATEGORIES)
+        areas = {area.name: area for area in ServiceArea.objects.resolve([city[0] for city in CITIES])}
+        Profile.service_categories.through.objects.bulk_create([
+            Profile.service_categories.through(profile=profile, servicecategory=category)
+            for profile in provider_profiles
+            for category in rng.sample(categories, 2)
+        ])
+        Profile.service_areas.through.objects.bulk_create([
+            Profile.service_areas.through(profile=profile, servicearea=areas[profile.location])
+            for profile in provider_profiles
+        ])
+
+        product_rows = []
+        for i in range(products):
+            city = CITIES[i % len(CITIES)]
+            latitude, longitude = near(rng, city)
+            word = rng.choice(PRODUCT_WORDS)
+            product_rows.append(Product(
+                seller=rng.choice(customer_users), title=f'{word.title()} #{i}',
+                description=f'Used {word} in {rng.choice(CONDITIONS).lower()} condition',
+                category=rng.choice(PRODUCT_CATEGORIES), condition=rng.choice(CONDITIONS),
+                price=rng.randint(100, 50000), address=f'{i} Bench Street', city=city[0],
+                main_image=f'products/{PREFIX}{i}.jpg', contact_phone='9999999999',
+                latitude=latitude, longitude=longitude, geohash=encode_geohash(latitude, longitude),
+            ))
+        Product.objects.bulk_create(product_rows, batch_size=1000)
+
+        bookings = []
+        for profile in provider_profiles:
+            for _ in range(reviews_per_provider):
+                done = now - timedelta(days=rng.randint(1, 365))
+                bookings.append(Booking(
+                    user=rng.choice(customer_users), service_provider=profile,
+                    service_category=rng.choice(CATEGORIES), description='Benchmark booking',
+                    address='1 Bench Street', scheduled_date=done, quote_price=500, final_price=500,
+                    status='COMPLETED', quoted_at=done, accepted_at=done, started_at=done, completed_at=done,
+                ))
+        bookings = Booking.objects.bulk_create(bookings, batch_size=1000)
+        Review.objects.bulk_create([
+            Review(booking=booking, user=booking.user, provider=booking.service_provider,
+                   rating=rng.randint(2, 5), comment='Good work')
+            for booking in bookings
+        ], batch_size=1000)
+
+    call_command('reconcile_counters', stdout=open(os.devnull, 'w'))
+    call_command('refresh_rankings', stdout=open(os.devnull, 'w'))
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    return describe()
+
+
+def describe():
+    from local_user.models import Product, Profile
+
+    providers = Profile.objects.filter(user__username__startswith=f'{PREFIX}provider_')
+    return {
+        'providers': providers.count(),
+        'customers': Profile.objects.filter(user__username__startswith=f'{PREFIX}customer_').count(),
+        'products': Product.objects.filter(seller__username__startswith=PREFIX).count(),
+        'provider_ids': list(providers.order_by('id').values_list('id', flat=True)),
+        'product_ids': list(Product.objects.filter(seller__username__startswith=PREFIX, is_active=True)
+                            .order_by('id').values_list('id', flat=True)[:1000]),
+    }
+
+
+def setup_django():
+    sys.path.insert(0, BACKEND_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    import django
+    django.setup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--providers', type=int, default=200)
+    parser.add_argument('--customers', type=int, default=200)
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--reviews-per-provider', type=int, default=5)
+    parser.add_argument('--reset', action='store_true', help='Delete existing benchmark data first')
+    args = parser.parse_args()
+
+    setup_django()
+    data = seed(args.providers, args.customers, args.products, args.reviews_per_provider, reset=args.reset)
+    print(f"{data['providers']} providers, {data['customers']} customers, {data['products']} products")
+
+
+if __name__ == '__main__':
+    main()
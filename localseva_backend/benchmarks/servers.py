@@ -0,0 +1,46 @@
+"""Start the Procfile's web servers from this checkout for a benchmark run"""
+import contextlib
+import os
+import subprocess
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVERS = {
+    'sync-wsgi': [
+        'gunicorn', 'localseva_backend.wsgi',
+        '--workers', '{workers}', '--bind', '127.0.0.1:{port}',
+    ],
+    'async-asgi': [
+        'gunicorn', 'localseva_backend.asgi:application',
+        '--worker-class', 'uvicorn_worker.UvicornWorker',
+        '--workers', '{workers}', '--bind', '127.0.0.1:{port}',
+    ],
+}
+
+
+def wait_until_up(base_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(base_url + '/providers/?page_size=1', timeout=2)
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'Server at {base_url} did not come up within {timeout}s')
+
+
+@contextlib.contextmanager
+def running_server(name, workers, port, env=None):
+    """Run server `name` (a SERVERS key) until the block exits; yields its base URL"""
+    command = [part.format(workers=workers, port=port) for part in SERVERS[name]]
+    server = subprocess.Popen(command, cwd=BACKEND_DIR, env={**os.environ, **(env or {})},
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        wait_until_up(base_url)
+        yield base_url
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
@@ -0,0 +1,21 @@
+"""
+Settings for benchmark servers (DJANGO_SETTINGS_MODULE=benchmarks.settings).
+
+Same as production, reading the database from DB_* as usual, except media
+goes to an in-memory fake of Cloudinary and static files are served
+without the collectstatic manifest. All virtual users connect from one
+address, so the per-IP throttle is lifted (per-user limits still apply).
+"""
+from localseva_backend.settings import *  # noqa: F401,F403
+from localseva_backend.settings import STORAGES
+
+DEBUG = False
+
+STORAGES = {
+    **STORAGES,
+    "default": {"BACKEND": "benchmarks.fake_storage.FakeCloudinaryStorage"},
+    "image_variants": {"BACKEND": "benchmarks.fake_storage.FakeCloudinaryStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+THROTTLE_IP_RATE = THROTTLE_IP_BURST = 1e9
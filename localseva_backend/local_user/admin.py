@@ -1,6 +1,11 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import UserModel, Profile, Booking, Review, Report, Product, ProductComment
+from django.utils import timezone
+from .authentication import refresh_claims, revoke_user_tokens
+from .models import (
+    UserModel, Profile, Booking, Review, Report, Product, ProductComment, ServiceCategory, ServiceArea, Job, TokenDenylist,
+    AvailabilitySlot, ProviderCategory
+)
 
 
 class ProfileInline(admin.StackedInline):
@@ -9,7 +14,7 @@ class ProfileInline(admin.StackedInline):
     can_delete = False
     verbose_name_plural = 'Profile'
     fields = ('avatar', 'role', 'bio', 'phone', 'location', 'is_available')
-    readonly_fields = ('rating', 'total_reviews', 'created_at')
+    readonly_fields = ('rating', 'rating_count', 'created_at')
 
     # Don't show the form if profile already exists (created by signal)
     def has_add_permission(self, request, obj=None):
@@ -30,6 +35,7 @@ class CustomUserAdmin(UserAdmin):
     list_filter = ('is_service_provider', 'is_staff', 'is_active')
     search_fields = ('username', 'email')
     ordering = ('-date_joined',)
+    actions = ['revoke_tokens']
 
     # Only add inline for existing users, not new ones
     def get_inline_instances(self, request, obj=None):
@@ -61,6 +67,32 @@ class CustomUserAdmin(UserAdmin):
         if not change and not hasattr(obj, 'profile'):
             Profile.objects.create(user=obj)
 
+    @admin.action(description="Sign out everywhere (revoke issued tokens)")
+    def revoke_tokens(self, request, queryset):
+        for user in queryset:
+            revoke_user_tokens(user)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # The role may have changed; issued tokens carry the old one
+        if change:
+            refresh_claims(form.instance)
+
+
+class ProviderCategoryInline(admin.TabularInline):
+    """Categories the provider offers"""
+    model = ProviderCategory
+    fields = ('servicecategory', 'ranking_score')
+    readonly_fields = ('ranking_score',)
+    extra = 0
+    verbose_name = 'service category'
+
+
+class AvailabilitySlotInline(admin.TabularInline):
+    """A provider's weekly availability slots"""
+    model = AvailabilitySlot
+    extra = 0
+
 
 # ============= OTHER ADMINS (UNCHANGED) =============
 @admin.register(Profile)
@@ -70,6 +102,21 @@ class ProfileAdmin(admin.ModelAdmin):
     list_filter = ('role', 'is_available', 'pricing_type')
     search_fields = ('user__username', 'user__email', 'location', 'bio')
     list_editable = ('is_available',)
+    filter_horizontal = ('service_areas',)
+    inlines = [ProviderCategoryInline, AvailabilitySlotInline]
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and 'role' in form.changed_data:
+            refresh_claims(obj.user)
+
+
+@admin.register(ServiceCategory, ServiceArea)
+class TaxonomyTermAdmin(admin.ModelAdmin):
+    """Service category / service area admin"""
+    list_display = ('name', 'slug')
+    search_fields = ('name',)
+    prepopulated_fields = {'slug': ('name',)}
 
 
 @admin.register(Booking)
@@ -126,6 +173,28 @@ class ProductCommentAdmin(admin.ModelAdmin):
     list_editable = ('is_visible',)
 
 
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """Background jobs - mostly useful for inspecting failures"""
+    list_display = ('id', 'name', 'status', 'attempts', 'run_at', 'locked_by')
+    list_filter = ('status', 'name')
+    readonly_fields = ('attempts', 'locked_at', 'locked_by', 'last_error', 'created_at')
+    actions = ['retry_jobs']
+
+    @admin.action(description="Retry selected jobs now")
+    def retry_jobs(self, request, queryset):
+        queryset.filter(status='FAILED').update(status='QUEUED', attempts=0, run_at=timezone.now())
+
+
+@admin.register(TokenDenylist)
+class TokenDenylistAdmin(admin.ModelAdmin):
+    """Revoked tokens, and users whose token claims are out of date (see authentication.py)"""
+    list_display = ('id', 'user', 'jti', 'issued_before', 'claims_only', 'expires_at')
+    list_filter = ('claims_only',)
+    search_fields = ('user__username', 'jti')
+    raw_id_fields = ('user',)
+
+
 # ============= ADMIN SITE CONFIGURATION =============
 admin.site.site_header = "Service Booking Platform Admin"
 admin.site.site_title = "Service Booking Admin"
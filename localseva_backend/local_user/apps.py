@@ -5,4 +5,13 @@ class LocalUserConfig(AppConfig):
     name = 'local_user'
 
     def ready(self):
-        from . import signals
+        from . import signals, tasks
+        from .counters import connect_counters
+        from .ranking import connect_ranking
+        connect_counters()
+        # After the counters: scores are computed from them
+        connect_ranking()
+
+        from django.db.backends.signals import connection_created
+        from .metrics import install_query_timer
+        connection_created.connect(install_query_timer)
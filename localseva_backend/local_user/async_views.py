@@ -0,0 +1,145 @@
+"""
+Native async versions of the read-heavy endpoints, for ASGI deployments.
+
+Each async view wraps the existing DRF view in `view_class` and reuses it
+for everything that doesn't wait on the database: authentication,
+permissions, throttling, filters, ordering, pagination and serializers.
+The rows themselves are fetched with Django's async ORM, so a slow query
+no longer holds a worker while other requests wait.
+
+Only GET is served natively; any other method on the same URL (e.g. PUT on
+a product) is handed to the DRF view unchanged. Serializers must not lazy
+load anything - every view here already declares its query plan through
+`setup_eager_loading()`.
+
+urls.py switches to these views when `ASYNC_READ_VIEWS` is on, which asgi.py
+turns on by default.
+"""
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.http import Http404
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.response import Response
+
+from .response_cache import (
+    CachedResponseMixin, SingleFlight, acache_key, entry_response
+)
+from .view_counter import product_views
+from .views import (
+    ProductCommentListView, ProductDetailView, ProductListView,
+    ProviderReviewsListView, ServiceProviderListView, TopProvidersView
+)
+
+
+class AsyncReadView(View):
+    view_class = None
+    # Only dispatch() is defined, so tell Django explicitly
+    view_is_async = True
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Same as DRF: authentication is by token, not session cookie
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method != 'GET':
+            return await sync_to_async(self.view_class.as_view())(request, *args, **kwargs)
+
+        view = self.view_class()
+        view.args = args
+        view.kwargs = kwargs
+        view.request = view.initialize_request(request, *args, **kwargs)
+        view.headers = view.default_response_headers
+
+        try:
+            queryset = await sync_to_async(self.prepare)(view)
+            response = await self.fetch(view, queryset)
+        except Exception as exc:
+            response = view.handle_exception(exc)
+        return view.finalize_response(view.request, response, *args, **kwargs)
+
+    def prepare(self, view):
+        """
+        Run the DRF request checks and build the (lazy) queryset. Runs in a
+        worker thread: authentication may query the user table, throttling
+        waits on the SQLite throttle store, and some filters set
+        per-connection options.
+        """
+        view.initial(view.request, *view.args, **view.kwargs)
+        return view.filter_queryset(view.get_queryset())
+
+    async def fetch(self, view, queryset):
+        raise NotImplementedError
+
+
+class AsyncListView(AsyncReadView):
+    async def fetch(self, view, queryset):
+        if not isinstance(view, CachedResponseMixin):
+            return await self.list(view, queryset)
+
+        timeout = view.get_cache_timeout()
+        if not timeout:
+            return await self.list(view, queryset)
+
+        key = await acache_key(view.cache_namespace, view.request)
+        entry = await cache.aget(key)
+        if entry is not None:
+            return entry_response(entry, hit=True)
+
+        entry, response = await SingleFlight(key, timeout).aget_or_compute(
+            lambda: self.list(view, queryset)
+        )
+        if entry is None:
+            # Not cacheable (error status) - return it as is
+            return response
+        return entry_response(entry, hit=False)
+
+    async def list(self, view, queryset):
+        page = await view.paginator.apaginate_queryset(queryset, view.request, view=view)
+        serializer = view.get_serializer(page, many=True)
+        return view.get_paginated_response(serializer.data)
+
+
+class AsyncRetrieveView(AsyncReadView):
+    async def fetch(self, view, queryset):
+        lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+        try:
+            instance = await queryset.aget(**{view.lookup_field: view.kwargs[lookup_url_kwarg]})
+        except (ObjectDoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+        view.check_object_permissions(view.request, instance)
+        return await self.retrieve(view, instance)
+
+    async def retrieve(self, view, instance):
+        return Response(view.get_serializer(instance).data)
+
+
+class AsyncServiceProviderListView(AsyncListView):
+    view_class = ServiceProviderListView
+
+
+class AsyncTopProvidersView(AsyncListView):
+    view_class = TopProvidersView
+
+
+class AsyncProviderReviewsListView(AsyncListView):
+    view_class = ProviderReviewsListView
+
+
+class AsyncProductListView(AsyncListView):
+    view_class = ProductListView
+
+
+class AsyncProductCommentListView(AsyncListView):
+    view_class = ProductCommentListView
+
+
+class AsyncProductDetailView(AsyncRetrieveView):
+    view_class = ProductDetailView
+
+    async def retrieve(self, view, instance):
+        # Same as ProductDetailView.retrieve: buffered, no write on the request path
+        product_views.increment(instance.pk)
+        return await super().retrieve(view, instance)
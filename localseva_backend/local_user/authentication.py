@@ -0,0 +1,152 @@
+"""
+Stateless JWT authentication.
+
+Tokens from `token_for_user` carry what most views need to know about the
+user, next to simplejwt's own claims:
+
+    user_id, profile_id, is_service_provider, role, auth_time
+
+`StatelessJWTAuthentication` builds `request.user` and `request.user.profile`
+from them without a database query. Their other fields are deferred, and
+the first access to one loads the rest of the row (see
+`LoadDeferredTogether`), so views that only filter by the user or check its
+role, like /bookings/, skip both lookups.
+
+A token can't be changed once issued, so the claims are checked against a
+small denylist (`TokenDenylist`), cached for TOKEN_DENYLIST_CACHE_SECONDS:
+
+- `revoke_token` - one token (logout);
+- `revoke_user_tokens` - all of a user's tokens so far (password change,
+  deactivation);
+- `refresh_claims` - the user's tokens stay valid, but their claims are out
+  of date (role change), so they are authenticated with a database lookup
+  until they expire.
+
+Tokens without these claims (issued before them) get the lookup as well.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import Profile, TokenDenylist, UserModel
+
+CLAIMS = ('profile_id', 'is_service_provider', 'role', 'auth_time')
+DENYLIST_CACHE_KEY = 'jwt-denylist'
+
+REVOKED = 'revoked'
+STALE = 'stale'
+
+
+def token_for_user(user):
+    """Refresh token (and through it the access token) with the user claims"""
+    refresh = RefreshToken.for_user(user)
+    profile = getattr(user, 'profile', None)
+    if profile is not None:
+        refresh['profile_id'] = profile.pk
+        refresh['is_service_provider'] = user.is_service_provider
+        refresh['role'] = profile.role
+        # Unlike iat, copied into access tokens made from this refresh token
+        refresh['auth_time'] = refresh['iat']
+    return refresh
+
+
+def get_denylist():
+    """{str(user_id): [(jti, issued_before timestamp, claims_only)]} of the unexpired entries"""
+    entries = cache.get(DENYLIST_CACHE_KEY)
+    if entries is None:
+        entries = {}
+        rows = TokenDenylist.objects.filter(expires_at__gt=timezone.now()).values_list(
+            'user_id', 'jti', 'issued_before', 'claims_only'
+        )
+        for user_id, jti, issued_before, claims_only in rows:
+            entries.setdefault(str(user_id), []).append(
+                (jti, issued_before.timestamp() if issued_before else None, claims_only)
+            )
+        cache.set(DENYLIST_CACHE_KEY, entries, getattr(settings, 'TOKEN_DENYLIST_CACHE_SECONDS', 10))
+    return entries
+
+
+def denylist_status(user_id, token):
+    """REVOKED, STALE (claims out of date) or None"""
+    entries = get_denylist().get(str(user_id))
+    if not entries:
+        return None
+    issued = token.get('auth_time', token.get('iat'))
+    status = None
+    for jti, issued_before, claims_only in entries:
+        if jti:
+            matches = jti == token.get(api_settings.JTI_CLAIM)
+        else:
+            matches = issued is None or issued < issued_before
+        if matches:
+            if not claims_only:
+                return REVOKED
+            status = STALE
+    return status
+
+
+def deny(user_id, expires_at, jti='', issued_before=None, claims_only=False):
+    TokenDenylist.objects.filter(expires_at__lte=timezone.now()).delete()
+    TokenDenylist.objects.create(user_id=user_id, jti=jti, issued_before=issued_before,
+                                 claims_only=claims_only, expires_at=expires_at)
+    # Other workers see it once their cached copy expires (right away with a shared cache)
+    transaction.on_commit(lambda: cache.delete(DENYLIST_CACHE_KEY))
+
+
+def revoke_token(token):
+    expires_at = datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)
+    deny(token[api_settings.USER_ID_CLAIM], expires_at, jti=token[api_settings.JTI_CLAIM])
+
+
+def revoke_user_tokens(user):
+    # Token times are whole seconds; don't revoke one issued right after this (new login)
+    now = timezone.now().replace(microsecond=0)
+    deny(user.pk, now + api_settings.REFRESH_TOKEN_LIFETIME, issued_before=now)
+
+
+def refresh_claims(user):
+    now = timezone.now()
+    deny(user.pk, now + api_settings.REFRESH_TOKEN_LIFETIME, issued_before=now, claims_only=True)
+
+
+def from_claims(model, **values):
+    """An instance with only `values` loaded, as if fetched with .only()"""
+    names = [field.attname for field in model._meta.concrete_fields if field.attname in values]
+    # Deferred fields load from the primary, where any write to them goes too
+    return model.from_db(DEFAULT_DB_ALIAS, names, [values[name] for name in names])
+
+
+def claims_user(token):
+    # simplejwt puts the user id in the token as a string
+    user_id = UserModel._meta.pk.to_python(token[api_settings.USER_ID_CLAIM])
+    user = from_claims(UserModel, id=user_id,
+                       is_service_provider=token['is_service_provider'])
+    profile = from_claims(Profile, id=token['profile_id'], user_id=user.pk, role=token['role'])
+    UserModel.profile.related.set_cached_value(user, profile)
+    Profile.user.field.set_cached_value(profile, user)
+    return user
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """JWT authentication that takes the user from the token claims (see module docstring)"""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        status = denylist_status(user_id, validated_token)
+        if status == REVOKED:
+            raise AuthenticationFailed("Token has been revoked", code="token_revoked")
+        if status == STALE or any(claim not in validated_token for claim in CLAIMS):
+            return super().get_user(validated_token)
+        return claims_user(validated_token)
@@ -0,0 +1,164 @@
+"""
+Provider availability and double-booking prevention.
+
+Providers declare weekly `AvailabilitySlot`s (weekday, start and end time,
+local time). An active booking holds its provider for
+[scheduled_date, scheduled_date + duration_minutes), stored as a tstzrange
+in `BookingInterval`, whose exclusion constraint
+
+    EXCLUDE USING gist (provider_id WITH =, period WITH &&)
+
+makes PostgreSQL refuse a second booking overlapping one the provider
+already has, including one inserted by a concurrent request. Rejected and
+cancelled bookings give their interval up.
+
+A provider is free in a window when one of their slots covers it and none
+of their intervals overlaps it. `ProviderAvailabilityFilter` searches for
+that with two EXISTS subqueries, answered from the slot index and the
+constraint's GiST index. Providers who haven't declared slots can be
+booked at any time, but don't show up in the search.
+"""
+from datetime import datetime, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.backends.postgresql.psycopg_any import DateTimeTZRange
+from django.db.models import Count, Exists, OuterRef, Q
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .models import AvailabilitySlot, BookingInterval
+
+# Statuses in which a booking no longer holds its provider
+RELEASED_STATUSES = ('REJECTED', 'CANCELLED')
+
+EXCLUSION_VIOLATION = '23P01'
+
+
+def booking_period(start, duration_minutes):
+    return DateTimeTZRange(start, start + timedelta(minutes=duration_minutes))
+
+
+def local_window(start, end):
+    """(weekday, start time, end time) of the window in local time, or None if it spans days"""
+    start, end = timezone.localtime(start), timezone.localtime(end)
+    if start.date() != end.date():
+        return None
+    return start.weekday(), start.time(), end.time()
+
+
+def covering_slots(provider, start, end):
+    """Q for `provider`'s slots (OuterRef to a provider works too) covering [start, end)"""
+    window = local_window(start, end)
+    if window is None:
+        return None
+    weekday, start_time, end_time = window
+    return Q(provider=provider, weekday=weekday, start_time__lte=start_time, end_time__gte=end_time)
+
+
+def covered_by_slots(provider, start, end):
+    """Whether `provider` takes bookings in [start, end); providers without slots take any"""
+    slots = AvailabilitySlot.objects.filter(provider=provider)
+    covering = covering_slots(provider, start, end)
+    if covering is None:
+        return not slots.exists()
+    counts = slots.aggregate(total=Count('pk'), covering=Count('pk', filter=covering))
+    return counts['total'] == 0 or counts['covering'] > 0
+
+
+def is_exclusion_violation(exc):
+    cause = exc.__cause__
+    return getattr(cause, 'pgcode', None) == EXCLUSION_VIOLATION or \
+        getattr(cause, 'sqlstate', None) == EXCLUSION_VIOLATION
+
+
+def reserve(booking):
+    """Hold the provider for `booking`; a ValidationError if they're booked at that time"""
+    try:
+        # Savepoint, so a refusal leaves the surrounding transaction usable
+        with transaction.atomic():
+            BookingInterval.objects.create(
+                booking=booking,
+                provider_id=booking.service_provider_id,
+                period=booking_period(booking.scheduled_date, booking.duration_minutes),
+            )
+    except IntegrityError as exc:
+        if not is_exclusion_violation(exc):
+            raise
+        raise serializers.ValidationError({"scheduled_date": "The provider is already booked at this time"})
+
+
+def release(booking_ids):
+    """Free the time held by the given bookings"""
+    BookingInterval.objects.filter(booking_id__in=booking_ids).delete()
+
+
+def parse_datetime_param(name, value):
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValidationError({name: "Expected an ISO 8601 date and time, e.g. 2026-10-24T10:00"})
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class ProviderAvailabilityFilter(BaseFilterBackend):
+    """
+    `?available_from=<datetime>&available_to=<datetime>` - only available
+    providers with a slot covering the window and no booking overlapping it.
+    Datetimes without an offset are in local time.
+    """
+    from_param = 'available_from'
+    to_param = 'available_to'
+
+    def get_window(self, request):
+        start = request.query_params.get(self.from_param)
+        end = request.query_params.get(self.to_param)
+        if not start and not end:
+            return None
+        if not (start and end):
+            raise ValidationError({self.to_param if start else self.from_param:
+                                   f"{self.from_param} and {self.to_param} go together"})
+        start = parse_datetime_param(self.from_param, start)
+        end = parse_datetime_param(self.to_param, end)
+        if start >= end:
+            raise ValidationError({self.to_param: f"Must be after {self.from_param}"})
+        return start, end
+
+    def filter_queryset(self, request, queryset, view):
+        window = self.get_window(request)
+        if window is None:
+            return queryset
+        start, end = window
+        covering = covering_slots(OuterRef('pk'), start, end)
+        if covering is None:
+            # Slots don't cross midnight, so none can cover the window
+            return queryset.none()
+        booked = BookingInterval.objects.filter(
+            provider=OuterRef('pk'), period__overlap=DateTimeTZRange(start, end)
+        )
+        return queryset.filter(
+            Exists(AvailabilitySlot.objects.filter(covering)),
+            ~Exists(booked),
+            is_available=True,
+        )
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.from_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Only providers free from this date and time (with available_to).',
+                'schema': {'type': 'string', 'format': 'date-time'},
+            },
+            {
+                'name': self.to_param,
+                'required': False,
+                'in': 'query',
+                'description': 'End of the window for available_from.',
+                'schema': {'type': 'string', 'format': 'date-time'},
+            },
+        ]
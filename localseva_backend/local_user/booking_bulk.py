@@ -0,0 +1,162 @@
+"""
+Bulk booking transitions for providers (POST /bookings/bulk-update/).
+
+A provider sends a list of transitions for their bookings:
+
+    [{"id": 12, "quote_price": "450.00"},
+     {"id": 15, "status": "IN_PROGRESS"},
+     {"id": 16, "status": "COMPLETED", "final_price": "500.00"},
+     {"id": 17, "status": "REJECTED", "provider_notes": "Not in my area"}]
+
+A quote_price without a status is a quote, as with PATCH /bookings/<pk>/.
+Items are validated first with `BookingTransitionSerializer`, with no
+database access per item. Then, inside one transaction:
+
+- the provider's bookings among the ids are locked and read with one
+  SELECT ... FOR UPDATE, so every item gets its own result;
+- each target status is applied with one UPDATE for all its bookings,
+  conditional on the statuses it may be reached from (the provider's
+  transitions in booking_states.py), bumping their versions:
+
+      UPDATE ... SET status = 'IN_PROGRESS', started_at = COALESCE(started_at, now),
+                     version = version + 1, ...
+      WHERE id IN (...) AND service_provider_id = <provider> AND status IN ('ACCEPTED')
+
+  Values that differ per booking (prices, notes) are set with CASE.
+
+Items for other providers' bookings come back as not_found, items whose
+booking is in the wrong status as conflict; neither stops the others.
+
+QuerySet.update() skips `save()` and the model signals, so what those do
+for a single booking happens here once per request instead:
+- updated_at is set;
+- the provider's completed_bookings_count is bumped and their ranking
+  score recomputed;
+- rejected bookings free the provider's time;
+- the cached listings are invalidated.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework import serializers
+
+from .availability import RELEASED_STATUSES, release
+from .booking_states import PROVIDER, STATUS_TIMESTAMPS, sources
+from .counters import COUNTERS
+from .models import Booking
+from .ranking import refresh_ranking
+from .response_cache import invalidate_model
+from .serializers import BookingTransitionSerializer
+
+# Item fields written as they are; a missing one leaves the column unchanged
+ITEM_FIELDS = ('quote_price', 'provider_notes', 'price_distribution_note')
+
+
+def max_items():
+    return getattr(settings, 'BOOKING_BULK_UPDATE_MAX_ITEMS', 200)
+
+
+def validate_items(items):
+    """Returns (valid items as (index, validated data), results of the invalid ones by index)"""
+    if not isinstance(items, list):
+        raise serializers.ValidationError({"transitions": "Expected a JSON array of transitions"})
+    if not items:
+        raise serializers.ValidationError({"transitions": "No transitions given"})
+    if len(items) > max_items():
+        raise serializers.ValidationError({"transitions": f"At most {max_items()} transitions per request"})
+
+    serializer = BookingTransitionSerializer()
+    valid, errors, seen = [], {}, set()
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors[index] = {"result": "invalid", "errors": {"non_field_errors": ["Expected an object"]}}
+            continue
+        try:
+            data = serializer.run_validation(item)
+        except serializers.ValidationError as exc:
+            errors[index] = {"id": item.get('id'), "result": "invalid", "errors": exc.detail}
+            continue
+        if data['id'] in seen:
+            errors[index] = {"id": data['id'], "result": "invalid",
+                             "errors": {"id": ["Booking appears more than once"]}}
+            continue
+        seen.add(data['id'])
+        valid.append((index, data))
+    return valid, errors
+
+
+def per_booking(field, items, default):
+    """CASE id WHEN ... THEN <the item's value> ... ELSE default END"""
+    whens = [When(pk=item['id'], then=Value(item[field])) for item in items if field in item]
+    return Case(*whens, default=default, output_field=Booking._meta.get_field(field))
+
+
+def apply_transition(provider, target, items, now):
+    """One conditional UPDATE moving `items` to `target`; returns the number of rows changed"""
+    values = {'status': target, 'updated_at': now, 'version': F('version') + 1}
+    if target in STATUS_TIMESTAMPS:
+        timestamp = STATUS_TIMESTAMPS[target]
+        values[timestamp] = Coalesce(timestamp, Value(now))
+    for field in ITEM_FIELDS:
+        if any(field in item for item in items):
+            values[field] = per_booking(field, items, F(field))
+    if target == 'COMPLETED':
+        # Same default as a single completion: the final price is the quote
+        values['final_price'] = per_booking('final_price', items, F('quote_price'))
+
+    return Booking.objects.filter(
+        pk__in=[item['id'] for item in items],
+        service_provider=provider,
+        status__in=sources(target, PROVIDER),
+    ).update(**values)
+
+
+@transaction.atomic
+def transition_bookings(provider, items):
+    """Apply validated `items` to `provider`'s bookings; returns the results by item index"""
+    current = dict(
+        Booking.objects.select_for_update()
+        .filter(pk__in=[item['id'] for _, item in items], service_provider=provider)
+        .values_list('pk', 'status')
+    )
+
+    results, groups = {}, {}
+    for index, item in items:
+        status = current.get(item['id'])
+        if status is None:
+            results[index] = {"id": item['id'], "result": "not_found"}
+        elif status not in sources(item['status'], PROVIDER):
+            results[index] = {"id": item['id'], "result": "conflict", "status": status,
+                              "error": f"Cannot change status from {status} to {item['status']}"}
+        else:
+            results[index] = {"id": item['id'], "result": "updated", "status": item['status']}
+            groups.setdefault(item['status'], []).append(item)
+
+    now = timezone.now()
+    for target, group in groups.items():
+        # The rows are locked, so every one of them matches
+        apply_transition(provider, target, group, now)
+
+    released = [item['id'] for target in RELEASED_STATUSES for item in groups.get(target, ())]
+    if released:
+        release(released)
+    if 'COMPLETED' in groups:
+        COUNTERS['completed_bookings_count'].adjust(provider.pk, len(groups['COMPLETED']))
+        refresh_ranking(provider.pk)
+    if groups:
+        invalidate_model(Booking.__name__)
+    return results
+
+
+def bulk_transition(provider, items):
+    """Validate `items` and apply the valid ones"""
+    valid, errors = validate_items(items)
+    results = transition_bookings(provider, valid) if valid else {}
+    results.update(errors)
+    return {
+        "received": len(items),
+        "updated": sum(result['result'] == 'updated' for result in results.values()),
+        "results": [results[index] for index in sorted(results)],
+    }
@@ -0,0 +1,134 @@
+"""
+Booking state machine.
+
+Every status change of a booking is one of `TRANSITIONS`: who may make it
+(the provider or the customer), from which status, and which stage
+timestamp it stamps. Anything else is refused with a 400.
+
+`update_booking` writes a change - with or without a transition - as one
+conditional UPDATE that also bumps `Booking.version`:
+
+    UPDATE ... SET status = 'ACCEPTED', accepted_at = now, version = version + 1, ...
+    WHERE id = <id> AND version = <version the change was based on>
+
+If another request changed the booking in between (a customer accepting
+while the provider rejects), no row matches and the request gets 409
+Conflict instead of silently overwriting the other change. Clients may
+send the `version` they last read to be checked as well.
+
+The UPDATE skips `save()`, so post_save is sent by hand to keep the
+counter caches and cached listings in step. A rejection also frees the
+provider's time (availability.py).
+"""
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.exceptions import APIException
+
+from .availability import RELEASED_STATUSES, release
+from .models import Booking
+
+PROVIDER = 'provider'
+CUSTOMER = 'customer'
+
+# (from status, to status) -> who may make the change
+TRANSITIONS = {
+    ('PENDING', 'QUOTE_GIVEN'): PROVIDER,
+    ('QUOTE_GIVEN', 'QUOTE_GIVEN'): PROVIDER,  # a new quote before it is answered
+    ('PENDING', 'REJECTED'): PROVIDER,
+    ('QUOTE_GIVEN', 'ACCEPTED'): CUSTOMER,
+    ('QUOTE_GIVEN', 'REJECTED'): CUSTOMER,
+    ('ACCEPTED', 'IN_PROGRESS'): PROVIDER,
+    ('IN_PROGRESS', 'COMPLETED'): PROVIDER,
+}
+
+# Stage timestamps, only set the first time a booking reaches the stage
+STATUS_TIMESTAMPS = {
+    'QUOTE_GIVEN': 'quoted_at',
+    'ACCEPTED': 'accepted_at',
+    'IN_PROGRESS': 'started_at',
+    'COMPLETED': 'completed_at',
+}
+
+# Columns each side may write besides the status
+EDITABLE_FIELDS = {
+    PROVIDER: {'quote_price', 'final_price', 'provider_notes', 'price_distribution_note'},
+    CUSTOMER: {'user_notes'},
+}
+
+
+class BookingConflict(APIException):
+    status_code = 409
+    default_detail = "The booking was changed by someone else; reload it and try again"
+    default_code = 'conflict'
+
+
+def sources(target, actor):
+    """Statuses `actor` may move a booking to `target` from"""
+    return tuple(old for (old, new), who in TRANSITIONS.items() if new == target and who == actor)
+
+
+def actor_for(booking, user):
+    """PROVIDER, CUSTOMER or None for a user who may not change the booking"""
+    if booking.service_provider_id == user.profile.pk:
+        return PROVIDER
+    if booking.user_id == user.pk:
+        return CUSTOMER
+    return None
+
+
+def check_transition(booking, target, actor, fields):
+    if TRANSITIONS.get((booking.status, target)) != actor:
+        raise serializers.ValidationError(
+            {"status": f"Cannot change status from {booking.status} to {target}"}
+        )
+    if target == 'ACCEPTED' and not booking.quote_price:
+        raise serializers.ValidationError({"status": "Cannot accept booking without a quote price"})
+    if target == 'QUOTE_GIVEN' and not fields.get('quote_price'):
+        raise serializers.ValidationError({"quote_price": "A quote needs a price"})
+
+
+@transaction.atomic
+def update_booking(booking, actor, status=None, version=None, **fields):
+    """
+    Apply `fields` and the optional transition to `status` in one conditional
+    UPDATE; raises BookingConflict if the booking changed since it was loaded,
+    or since `version` if the client sent one.
+    """
+    if version is not None and version != booking.version:
+        raise BookingConflict()
+    now = timezone.now()
+    values = {'updated_at': now}
+    for field, value in fields.items():
+        if field not in EDITABLE_FIELDS[actor]:
+            raise serializers.ValidationError({field: "You can't change this field"})
+        values[field] = value
+
+    if status is not None:
+        check_transition(booking, status, actor, fields)
+        values['status'] = status
+        timestamp = STATUS_TIMESTAMPS.get(status)
+        if timestamp and getattr(booking, timestamp) is None:
+            values[timestamp] = now
+        if status == 'COMPLETED' and 'final_price' not in fields:
+            # Default final price same as quote
+            values['final_price'] = booking.quote_price
+
+    # The version guards the status too: the row is exactly as loaded, so
+    # the transition checked above is still valid
+    updated = Booking.objects.filter(pk=booking.pk, version=booking.version).update(
+        version=F('version') + 1, **values
+    )
+    if not updated:
+        raise BookingConflict()
+    if status in RELEASED_STATUSES:
+        release([booking.pk])
+
+    for field, value in values.items():
+        setattr(booking, field, value)
+    booking.version += 1
+    post_save.send(sender=Booking, instance=booking, created=False, raw=False,
+                   using=booking._state.db, update_fields=frozenset(values) | {'version'})
+    return booking
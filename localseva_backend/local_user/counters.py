@@ -0,0 +1,228 @@
+"""
+Counter caches - denormalized row counts kept on the parent row.
+
+A counter is declared once with `CounterCache(...)` and registered in
+`COUNTERS`. Signal handlers keep the column in step with `F()` increments
+whenever a counted row is created, changes in or out of the counted state,
+moves to another parent, or is deleted. `reconcile_counters` fixes any drift
+(e.g. rows written with QuerySet.update() or bulk_create(), which bypass
+signals).
+
+`AggregateCache` does the same for a running count and sum of a column,
+e.g. a provider's review count and rating total.
+"""
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_init, post_save
+
+
+def aggregate_subquery(queryset, outer_field, aggregate, outer_ref='pk'):
+    """
+    Correlated `(SELECT <aggregate> ...)` expression. Unlike an aggregate
+    over a JOIN + GROUP BY it is only evaluated for the rows it is attached to.
+    """
+    rows = queryset.filter(**{outer_field: OuterRef(outer_ref)}).order_by().values(outer_field)
+    return Coalesce(Subquery(rows.annotate(value=aggregate).values('value')[:1]), 0)
+
+
+def count_subquery(queryset, outer_field, outer_ref='pk'):
+    """Correlated `(SELECT COUNT(*) ...)` expression"""
+    return aggregate_subquery(queryset, outer_field, Count('pk'), outer_ref=outer_ref)
+
+
+class CounterCache:
+    """
+    Keep `target.<field>` equal to the number of `model` rows whose `fk`
+    points at it and which match `condition`.
+
+    `fk` is the attname on the counted model (e.g. 'product_id') and
+    `target_field` is the column on the target it refers to ('pk' for a
+    plain foreign key, 'user_id' when the counted rows point at the user
+    rather than the profile).
+    """
+
+    def __init__(self, name, model, fk, target, field, target_field='pk', condition=None):
+        self.name = name
+        self.model = model
+        self.fk = fk
+        self.target = target
+        self.field = field
+        self.target_field = target_field
+        self.condition = condition or {}
+        self.snapshot_attr = f'_counter_{name}'
+
+    def state(self, instance):
+        """Return (parent id, is counted) from already loaded values only"""
+        values = instance.__dict__
+        if self.fk not in values or any(key not in values for key in self.condition):
+            # Deferred field - don't trigger a query just to snapshot it
+            return None
+        counted = all(values[key] == value for key, value in self.condition.items())
+        return values[self.fk], counted
+
+    def adjust(self, target_id, delta):
+        if target_id is None or not delta:
+            return
+        self.target.objects.filter(**{self.target_field: target_id}).update(
+            **{self.field: F(self.field) + delta}
+        )
+
+    def actual_count(self):
+        return count_subquery(
+            self.model.objects.filter(**self.condition),
+            self.fk.removesuffix('_id'),
+            outer_ref=self.target_field,
+        )
+
+    def actual_values(self):
+        return {self.field: self.actual_count()}
+
+    def reconcile(self, batch_size=1000):
+        """Recompute the column for every target row, returning how many were wrong"""
+        fixed = 0
+        last_pk = None
+        while True:
+            batch = self.target.objects.order_by('pk')
+            if last_pk is not None:
+                batch = batch.filter(pk__gt=last_pk)
+            pks = list(batch.values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                return fixed
+            last_pk = pks[-1]
+            actual = self.actual_values()
+            fixed += self.target.objects.filter(pk__in=pks).exclude(**actual).update(**actual)
+
+    # Signal handlers
+
+    def on_init(self, sender, instance, **kwargs):
+        setattr(instance, self.snapshot_attr, self.state(instance))
+
+    def on_save(self, sender, instance, created, **kwargs):
+        new = self.state(instance)
+        old = None if created else getattr(instance, self.snapshot_attr, None)
+        setattr(instance, self.snapshot_attr, new)
+
+        if new is None:
+            return
+        if created:
+            if new[1]:
+                self.adjust(new[0], 1)
+            return
+        if old is None or old == new:
+            return
+
+        old_id, old_counted = old
+        new_id, new_counted = new
+        if old_counted:
+            self.adjust(old_id, -1)
+        if new_counted:
+            self.adjust(new_id, 1)
+
+    def on_delete(self, sender, instance, **kwargs):
+        state = self.state(instance)
+        if state and state[1]:
+            self.adjust(state[0], -1)
+
+    def connect(self):
+        uid = f'counter_cache_{self.name}'
+        post_init.connect(self.on_init, sender=self.model, weak=False, dispatch_uid=uid)
+        post_save.connect(self.on_save, sender=self.model, weak=False, dispatch_uid=uid)
+        post_delete.connect(self.on_delete, sender=self.model, weak=False, dispatch_uid=uid)
+
+
+class AggregateCache(CounterCache):
+    """
+    Keep `target.<field>` equal to the number of `model` rows pointing at it
+    and `target.<sum_field>` to the total of their `value` column.
+
+    Both columns move together in a single `UPDATE ... SET n = n + 1,
+    total = total + x`, so concurrent writers never lose an update and
+    readers never see one without the other.
+    """
+
+    def __init__(self, name, model, fk, value, target, field, sum_field, target_field='pk'):
+        super().__init__(name, model, fk, target, field, target_field=target_field)
+        self.value = value
+        self.sum_field = sum_field
+
+    def state(self, instance):
+        """Return (parent id, value) from already loaded values only"""
+        values = instance.__dict__
+        if self.fk not in values or self.value not in values:
+            return None
+        return values[self.fk], values[self.value]
+
+    def adjust(self, target_id, delta, amount=0):
+        if target_id is None or not (delta or amount):
+            return
+        self.target.objects.filter(**{self.target_field: target_id}).update(**{
+            self.field: F(self.field) + delta,
+            self.sum_field: F(self.sum_field) + amount,
+        })
+
+    def actual_values(self):
+        return {
+            self.field: self.actual_count(),
+            self.sum_field: aggregate_subquery(
+                self.model.objects.all(), self.fk.removesuffix('_id'),
+                Sum(self.value), outer_ref=self.target_field,
+            ),
+        }
+
+    def on_save(self, sender, instance, created, **kwargs):
+        new = self.state(instance)
+        old = None if created else getattr(instance, self.snapshot_attr, None)
+        setattr(instance, self.snapshot_attr, new)
+
+        if new is None:
+            return
+        if created:
+            self.adjust(new[0], 1, new[1])
+            return
+        if old is None or old == new:
+            return
+
+        old_id, old_value = old
+        new_id, new_value = new
+        if old_id == new_id:
+            self.adjust(new_id, 0, new_value - old_value)
+        else:
+            self.adjust(old_id, -1, -old_value)
+            self.adjust(new_id, 1, new_value)
+
+    def on_delete(self, sender, instance, **kwargs):
+        state = self.state(instance)
+        if state:
+            self.adjust(state[0], -1, -state[1])
+
+
+def get_counters():
+    from .models import Booking, Product, ProductComment, Profile, Review
+
+    return [
+        CounterCache(
+            'comment_count', ProductComment, 'product_id', Product, 'comment_count',
+            condition={'is_visible': True},
+        ),
+        CounterCache(
+            'completed_bookings_count', Booking, 'service_provider_id', Profile,
+            'completed_bookings_count', condition={'status': 'COMPLETED'},
+        ),
+        CounterCache(
+            'active_listings_count', Product, 'seller_id', Profile,
+            'active_listings_count', target_field='user_id', condition={'is_active': True},
+        ),
+        AggregateCache(
+            'provider_rating', Review, 'provider_id', 'rating', Profile,
+            'rating_count', 'rating_sum',
+        ),
+    ]
+
+
+COUNTERS = {}
+
+
+def connect_counters():
+    for counter in get_counters():
+        COUNTERS[counter.name] = counter
+        counter.connect()
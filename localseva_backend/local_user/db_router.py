@@ -0,0 +1,164 @@
+"""
+Read replicas, with read-your-writes for the client that just wrote.
+
+`PrimaryReplicaRouter` sends reads to a replica only while serving a
+GET/HEAD/OPTIONS request that `ReplicaRoutingMiddleware` found unpinned.
+It uses one replica per request, picked at random from
+`DATABASE_REPLICAS`, so a page and its related queries see the same
+snapshot. Everything else reads from `default`: writes, reads after a
+write in the same request, reads inside a transaction, and code outside a
+request (jobs, management commands).
+
+After any other request (POST, PUT, PATCH, DELETE) the client is pinned to
+the primary for `DB_PRIMARY_PIN_SECONDS`, so it doesn't read a replica
+that hasn't caught up with its own write yet. Two kinds of pin:
+
+- a cookie, for browsers and session clients;
+- a cache entry for the user, for API clients that send a JWT and don't
+  keep cookies.
+
+The cache pin needs a cache shared by all workers (CACHE_BACKEND=file, or
+anything non-local) to cover requests landing on another worker.
+"""
+import base64
+import binascii
+import json
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_COOKIE = 'db_primary_pin'
+
+routing_state = ContextVar('db_routing_state', default=None)
+
+
+class RoutingState:
+    __slots__ = ('use_replica', 'replica')
+
+    def __init__(self, use_replica):
+        self.use_replica = use_replica
+        self.replica = None
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def get_pin_seconds():
+    return getattr(settings, 'DB_PRIMARY_PIN_SECONDS', 15)
+
+
+def pin_cache_key(user_id):
+    return f'db-primary-pin:{user_id}'
+
+
+def token_user_id(request):
+    """
+    user_id claim of the request's JWT, without verifying it. Only used to
+    pick a database - a forged token can at most send its own reads to the
+    primary, and authentication still checks it properly.
+    """
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    scheme, _, token = header.partition(' ')
+    if scheme != 'Bearer' or token.count('.') != 2:
+        return None
+    payload = token.split('.')[1]
+    try:
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+    except (ValueError, binascii.Error):
+        return None
+    if not isinstance(claims, dict):
+        return None
+    return claims.get(settings.SIMPLE_JWT.get('USER_ID_CLAIM', 'user_id'))
+
+
+def is_pinned(request):
+    if PIN_COOKIE in request.COOKIES:
+        return True
+    user_id = token_user_id(request)
+    return user_id is not None and cache.get(pin_cache_key(user_id)) is not None
+
+
+def pin(request, response):
+    seconds = get_pin_seconds()
+    if not seconds:
+        return
+    response.set_cookie(PIN_COOKIE, '1', max_age=seconds, httponly=True, samesite='Lax')
+    # DRF sets the authenticated user on the underlying request too
+    user = getattr(request, 'user', None)
+    user_id = user.pk if user is not None and user.is_authenticated else token_user_id(request)
+    if user_id is not None:
+        cache.set(pin_cache_key(user_id), 1, seconds)
+
+
+class ReplicaRoutingMiddleware:
+    """Decides per request whether reads may use a replica (see module docstring)"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = routing_state.set(self.start(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            routing_state.reset(token)
+        return self.finish(request, response)
+
+    async def __acall__(self, request):
+        token = routing_state.set(self.start(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            routing_state.reset(token)
+        return self.finish(request, response)
+
+    def start(self, request):
+        use_replica = (
+            bool(get_replicas()) and request.method in SAFE_METHODS and not is_pinned(request)
+        )
+        return RoutingState(use_replica)
+
+    def finish(self, request, response):
+        if get_replicas() and request.method not in SAFE_METHODS:
+            pin(request, response)
+        return response
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = routing_state.get()
+        if state is None or not state.use_replica:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # Reads inside a transaction must see its writes
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # Related objects come from where their parent was loaded
+            return instance._state.db
+        if state.replica is None:
+            state.replica = random.choice(get_replicas())
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = routing_state.get()
+        if state is not None:
+            # The rest of this request reads its own writes
+            state.use_replica = False
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
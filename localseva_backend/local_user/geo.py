@@ -0,0 +1,200 @@
+"""
+Distance search on plain PostgreSQL (no PostGIS).
+
+Rows with coordinates also store their geohash, indexed for prefix
+matching. A `?near=lat,lng&radius=km` query is answered in three steps,
+cheapest first:
+
+1. geohash prefixes of the few cells covering the search box (index
+   range scans),
+2. the exact latitude/longitude bounding box,
+3. the great-circle (haversine) distance, which is also what the results
+   are ordered by.
+"""
+import math
+
+from django.db.models import Q
+from django.db.models.functions import ASin, Cos, Least, Power, Radians, Sin, Sqrt
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9  # ~5 m cells, plenty for a street address
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True  # even bits split longitude, odd bits latitude
+    while len(chars) < precision:
+        value, bounds = (longitude, lng_range) if even else (latitude, lat_range)
+        middle = (bounds[0] + bounds[1]) / 2
+        if value >= middle:
+            bits = bits * 2 + 1
+            bounds[0] = middle
+        else:
+            bits = bits * 2
+            bounds[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = bit_count = 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """(latitude degrees, longitude degrees) covered by one geohash cell"""
+    total_bits = 5 * precision
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """(min_lat, max_lat, min_lng, max_lng), longitudes may fall outside ±180"""
+    dlat = radius_km / KM_PER_DEGREE
+    cos_lat = math.cos(math.radians(latitude))
+    # Near the poles the box spans every longitude
+    dlng = 360.0 if cos_lat < 1e-6 else min(dlat / cos_lat, 360.0)
+    return (
+        max(latitude - dlat, -90.0), min(latitude + dlat, 90.0),
+        longitude - dlng, longitude + dlng,
+    )
+
+
+def _wrap_longitude(longitude):
+    return (longitude + 180.0) % 360.0 - 180.0
+
+
+def covering_geohashes(latitude, longitude, radius_km):
+    """
+    Geohash prefixes whose cells together cover the search box, or None when
+    the box is too large for a prefix filter to help. Uses the finest
+    precision whose cells are at least half as big as the box, so there are
+    at most 3 x 3 of them.
+    """
+    min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius_km)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        cell_lat, cell_lng = cell_size(precision)
+        if 2 * cell_lat >= max_lat - min_lat and 2 * cell_lng >= max_lng - min_lng:
+            break
+    else:
+        return None
+
+    def steps(low, high, step):
+        value = low
+        while value < high:
+            yield value
+            value += step
+        yield high
+
+    return sorted({
+        encode_geohash(lat, _wrap_longitude(lng), precision)
+        for lat in steps(min_lat, max_lat, cell_lat)
+        for lng in steps(min_lng, max_lng, cell_lng)
+    })
+
+
+def bounding_box_filter(latitude, longitude, radius_km):
+    min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius_km)
+    condition = Q(latitude__range=(min_lat, max_lat))
+    if max_lng - min_lng >= 360.0:
+        return condition
+    if min_lng < -180.0:
+        lng = Q(longitude__gte=min_lng + 360.0) | Q(longitude__lte=max_lng)
+    elif max_lng > 180.0:
+        lng = Q(longitude__gte=min_lng) | Q(longitude__lte=max_lng - 360.0)
+    else:
+        lng = Q(longitude__range=(min_lng, max_lng))
+    return condition & lng
+
+
+def distance_km(latitude, longitude):
+    """Haversine distance in km from (latitude, longitude) to each row"""
+    lat0 = math.radians(latitude)
+    half_dlat = Radians('latitude') / 2 - lat0 / 2
+    half_dlng = Radians('longitude') / 2 - math.radians(longitude) / 2
+    a = Power(Sin(half_dlat), 2) + math.cos(lat0) * Cos(Radians('latitude')) * Power(Sin(half_dlng), 2)
+    # Least() guards asin() against rounding just above 1
+    return 2 * EARTH_RADIUS_KM * ASin(Least(Sqrt(a), 1.0))
+
+
+def parse_near(value):
+    try:
+        latitude, longitude = (float(part) for part in value.split(','))
+    except ValueError:
+        raise ValidationError({'near': "Expected 'latitude,longitude', e.g. near=19.07,72.87"})
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValidationError({'near': "Latitude must be within ±90 and longitude within ±180"})
+    return latitude, longitude
+
+
+class NearbyFilter(BaseFilterBackend):
+    """
+    `?near=lat,lng&radius=km` - only rows within `radius` km (default 10),
+    annotated with `distance_km` and, unless `?ordering=` is given, nearest
+    first. Rows without coordinates never match.
+    """
+    near_param = 'near'
+    radius_param = 'radius'
+    ordering_param = 'ordering'
+    default_radius = 10.0
+    max_radius = 500.0
+
+    def get_radius(self, request):
+        try:
+            radius = float(request.query_params.get(self.radius_param, self.default_radius))
+        except ValueError:
+            raise ValidationError({'radius': "Expected a distance in km"})
+        if not 0 < radius <= self.max_radius:
+            raise ValidationError({'radius': f"Must be greater than 0 and at most {self.max_radius:g} km"})
+        return radius
+
+    def filter_queryset(self, request, queryset, view):
+        near = request.query_params.get(self.near_param)
+        if not near:
+            return queryset
+        latitude, longitude = parse_near(near)
+        radius = self.get_radius(request)
+
+        cells = covering_geohashes(latitude, longitude, radius)
+        if cells:
+            prefix = Q()
+            for cell in cells:
+                prefix |= Q(geohash__startswith=cell)
+            queryset = queryset.filter(prefix)
+
+        distance = distance_km(latitude, longitude)
+        return queryset.filter(bounding_box_filter(latitude, longitude, radius)).annotate(
+            distance_km=distance
+        ).filter(distance_km__lte=radius)
+
+    def get_ordering(self, request, queryset, view):
+        if request.query_params.get(self.ordering_param) or not request.query_params.get(self.near_param):
+            return None
+        return ['distance_km']
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.near_param,
+                'required': False,
+                'in': 'query',
+                'description': "Only results near 'latitude,longitude', nearest first.",
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.radius_param,
+                'required': False,
+                'in': 'query',
+                'description': f'Search radius in km for near (default {self.default_radius:g}).',
+                'schema': {'type': 'number'},
+            },
+        ]
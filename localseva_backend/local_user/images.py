@@ -0,0 +1,190 @@
+"""
+Resized variants of uploaded images (product photos, avatars, report
+evidence), so list pages don't download full-resolution originals.
+
+When a model with image fields is saved with a new or changed image,
+`schedule_variants()` queues a `generate_variants` job (see jobs.py), so
+the resizing never happens in the request. Each
+variant is a downscaled copy (aspect ratio kept, EXIF rotation applied) in
+`IMAGE_VARIANT_FORMAT` (WebP by default, or JPEG), written to the
+`image_variants` storage alias - Cloudinary in production, any Django
+storage (e.g. FileSystemStorage) locally.
+
+Uploads themselves are checked by `validate_upload` (size and format)
+before they are stored.
+
+Generated file names are recorded on the row in its `image_variants` JSON
+column:
+
+    {"main_image": {"source": "products/sofa.jpg",
+                    "thumb": "variants/products/sofa_thumb.webp",
+                    "medium": "variants/products/sofa_medium.webp"}}
+"""
+import logging
+import os
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.db import transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .jobs import enqueue, task
+from .response_cache import invalidate_model
+
+logger = logging.getLogger(__name__)
+
+STORAGE_ALIAS = 'image_variants'
+
+# Longest side in pixels
+VARIANT_SIZES = {
+    'thumb': 200,
+    'medium': 800,
+}
+
+FORMATS = {
+    'WEBP': ('webp', {'quality': 80, 'method': 4}),
+    'JPEG': ('jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# Formats accepted for upload, as detected by Pillow
+UPLOAD_FORMATS = {'JPEG', 'PNG', 'WEBP', 'GIF'}
+
+# Image fields that get variants, per model
+IMAGE_FIELDS = {
+    'local_user.Profile': ['avatar'],
+    'local_user.Product': ['main_image', 'image_2', 'image_3'],
+    'local_user.Report': ['evidence_image'],
+}
+
+
+def validate_upload(upload):
+    """Serializer validator for uploaded images; DRF's ImageField has already opened them with Pillow"""
+    max_size = getattr(settings, 'IMAGE_UPLOAD_MAX_SIZE', 10 * 1024 * 1024)
+    if upload.size > max_size:
+        raise ValidationError(f"Images can be at most {max_size // (1024 * 1024)} MB.")
+    image = getattr(upload, 'image', None)
+    if image is None or image.format not in UPLOAD_FORMATS:
+        raise ValidationError(f"Upload a {', '.join(sorted(UPLOAD_FORMATS))} image.")
+
+
+def get_storage():
+    return storages[STORAGE_ALIAS]
+
+
+def get_format():
+    return getattr(settings, 'IMAGE_VARIANT_FORMAT', 'WEBP').upper()
+
+
+def variant_name(source_name, variant):
+    extension = FORMATS[get_format()][0]
+    stem = os.path.splitext(source_name)[0]
+    return f'variants/{stem}_{variant}.{extension}'
+
+
+def variant_url(instance, field, variant):
+    """URL of a variant, or of the original while the variant isn't ready yet"""
+    image = getattr(instance, field)
+    if not image:
+        return None
+    entry = (instance.image_variants or {}).get(field) or {}
+    if entry.get('source') == image.name and entry.get(variant):
+        return get_storage().url(entry[variant])
+    return image.url
+
+
+def needs_variants(instance):
+    """True if some image field changed since its variants were generated"""
+    recorded = instance.image_variants or {}
+    for field in IMAGE_FIELDS[instance._meta.label]:
+        image = getattr(instance, field)
+        source = (recorded.get(field) or {}).get('source')
+        if (image.name or None) != source:
+            return True
+    return False
+
+
+def schedule_variants(instance):
+    if instance._meta.label not in IMAGE_FIELDS or not needs_variants(instance):
+        return
+    enqueue(generate_variants, label=instance._meta.label, pk=instance.pk)
+
+
+def render_variant(source_file, max_size, image_format):
+    extension, options = FORMATS[image_format]
+    with Image.open(source_file) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+        if image_format == 'JPEG':
+            image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA'):
+            transparent = 'A' in image.mode or 'transparency' in image.info
+            image = image.convert('RGBA' if transparent else 'RGB')
+        output = BytesIO()
+        image.save(output, format=image_format, **options)
+    return ContentFile(output.getvalue())
+
+
+@task
+def generate_variants(label, pk):
+    """Bring the variants of one row up to date with its current images"""
+    model = apps.get_model(label)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return
+
+    storage = get_storage()
+    image_format = get_format()
+    recorded = dict(instance.image_variants or {})
+    updated = {}
+    obsolete = []
+
+    for field in IMAGE_FIELDS[label]:
+        image = getattr(instance, field)
+        entry = recorded.get(field) or {}
+        if (image.name or None) == entry.get('source'):
+            if entry:
+                updated[field] = entry
+            continue
+        obsolete += [name for key, name in entry.items() if key != 'source']
+        if not image:
+            continue
+
+        # Storage errors propagate, so the job is retried
+        with image.open('rb') as source:
+            data = source.read()
+        entry = {'source': image.name}
+        try:
+            rendered = {
+                variant: render_variant(BytesIO(data), max_size, image_format)
+                for variant, max_size in VARIANT_SIZES.items()
+            }
+        except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+            # Not a readable image - remember it so it isn't retried on every save
+            logger.warning("Can't make variants of %s %s.%s (%s)", label, pk, field, image.name)
+            rendered = {}
+        for variant, content in rendered.items():
+            entry[variant] = storage.save(variant_name(image.name, variant), content)
+        updated[field] = entry
+
+    with transaction.atomic():
+        # Only write if the images are still the ones we just processed
+        current = model.objects.select_for_update().filter(pk=pk).values(*IMAGE_FIELDS[label]).first()
+        if current is None:
+            return
+        if any((current[field] or None) != (updated.get(field) or {}).get('source')
+               for field in IMAGE_FIELDS[label]):
+            # Changed again meanwhile; the save that changed it scheduled another run
+            return
+        model.objects.filter(pk=pk).update(image_variants=updated)
+        # update() sends no post_save, so drop cached listings here
+        invalidate_model(model.__name__)
+
+    for name in obsolete:
+        try:
+            storage.delete(name)
+        except Exception:
+            logger.warning("Couldn't delete old image variant %s", name)
@@ -0,0 +1,135 @@
+"""
+A small job queue in Postgres, for work that doesn't need to happen inside
+the request that caused it.
+
+Tasks are plain functions registered with `@task`. `enqueue()` inserts a
+`Job` row in the caller's transaction, so a job exists exactly when the
+writes that caused it were committed. Workers (`manage.py run_jobs`) claim
+due jobs with `SELECT ... FOR UPDATE SKIP LOCKED`: any number of them can
+poll the same table without blocking on, or double-running, each other's
+jobs.
+
+Each job runs in its own transaction and is deleted on success. A job that
+raises is retried with exponential backoff until `max_attempts`, then kept
+as FAILED with its traceback in `last_error`. A job whose worker died
+mid-run is claimed again once its lock is older than `JOB_LOCK_TIMEOUT`, so
+tasks must be safe to run more than once.
+
+With `JOB_QUEUE_EAGER` on (e.g. local development without a worker), jobs
+run in-process right after the enqueuing transaction commits instead.
+"""
+import logging
+import os
+import random
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+# Retry delays: RETRY_BASE_DELAY * 2 ** (attempt - 1), jittered, at most RETRY_MAX_DELAY
+RETRY_BASE_DELAY = 10
+RETRY_MAX_DELAY = 60 * 60
+
+
+def task(func=None, *, name=None, max_attempts=5):
+    """Register a function as a task, under its module-qualified name by default"""
+    def register(func):
+        func.task_name = name or f'{func.__module__}.{func.__name__}'
+        func.max_attempts = max_attempts
+        TASKS[func.task_name] = func
+        return func
+    return register(func) if func is not None else register
+
+
+def enqueue(func, *, delay=None, **payload):
+    """
+    Queue `func(**payload)` to run after the current transaction commits.
+    `payload` must be JSON serializable.
+    """
+    if getattr(settings, 'JOB_QUEUE_EAGER', False):
+        transaction.on_commit(lambda: run_eager(func, payload))
+        return None
+    run_at = timezone.now() + (delay or timedelta())
+    return Job.objects.create(name=func.task_name, payload=payload,
+                              max_attempts=func.max_attempts, run_at=run_at)
+
+
+def run_eager(func, payload):
+    try:
+        with transaction.atomic():
+            func(**payload)
+    except Exception:
+        logger.exception("Job %s failed", func.task_name)
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def lock_timeout():
+    return timedelta(seconds=getattr(settings, 'JOB_LOCK_TIMEOUT', 600))
+
+
+def claim(batch_size=10, worker=None):
+    """Lock up to `batch_size` due jobs for this worker and return them"""
+    now = timezone.now()
+    due = Q(status='QUEUED', run_at__lte=now) | Q(status='RUNNING', locked_at__lt=now - lock_timeout())
+    with transaction.atomic():
+        ids = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(due).order_by('run_at', 'id').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return []
+        Job.objects.filter(id__in=ids).update(
+            status='RUNNING', locked_at=now, locked_by=worker or worker_name(),
+            attempts=F('attempts') + 1,
+        )
+    return list(Job.objects.filter(id__in=ids).order_by('run_at', 'id'))
+
+
+def retry_delay(attempts):
+    delay = min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+    return timedelta(seconds=delay * random.uniform(0.5, 1.0))
+
+
+def run_job(job):
+    """Run one claimed job; returns True if it succeeded"""
+    func = TASKS.get(job.name)
+    try:
+        if func is None:
+            raise LookupError(f"No task registered as {job.name!r}")
+        with transaction.atomic():
+            func(**job.payload)
+            # Only if the task's writes commit
+            Job.objects.filter(id=job.id, locked_at=job.locked_at).delete()
+        return True
+    except Exception:
+        logger.exception("Job #%s (%s) failed, attempt %s of %s",
+                         job.id, job.name, job.attempts, job.max_attempts)
+        retry = func is not None and job.attempts < job.max_attempts
+        Job.objects.filter(id=job.id, locked_at=job.locked_at).update(
+            status='QUEUED' if retry else 'FAILED',
+            run_at=timezone.now() + retry_delay(job.attempts) if retry else job.run_at,
+            locked_at=None, locked_by='',
+            last_error=traceback.format_exc(),
+        )
+        return False
+
+
+def run_pending(batch_size=10, worker=None):
+    """Claim and run one batch; returns the number of jobs claimed"""
+    jobs = claim(batch_size, worker)
+    for job in jobs:
+        run_job(job)
+    return len(jobs)
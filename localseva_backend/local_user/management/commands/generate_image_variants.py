@@ -0,0 +1,30 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from local_user.images import IMAGE_FIELDS, generate_variants, needs_variants
+
+
+class Command(BaseCommand):
+    help = "Generate missing or outdated resized image variants"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'models', nargs='*',
+            help=f"Models to process (default: all). Choices: {', '.join(IMAGE_FIELDS)}"
+        )
+
+    def handle(self, *args, **options):
+        labels = options['models'] or list(IMAGE_FIELDS)
+        unknown = [label for label in labels if label not in IMAGE_FIELDS]
+        if unknown:
+            raise CommandError(f"Unknown model(s): {', '.join(unknown)}")
+
+        for label in labels:
+            model = apps.get_model(label)
+            generated = 0
+            queryset = model.objects.only('pk', 'image_variants', *IMAGE_FIELDS[label])
+            for instance in queryset.iterator(chunk_size=500):
+                if needs_variants(instance):
+                    generate_variants(label, instance.pk)
+                    generated += 1
+            self.stdout.write(f"{label}: {generated} row(s) updated")
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from local_user.counters import COUNTERS
+
+
+class Command(BaseCommand):
+    help = "Recompute denormalized counter columns and fix any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'counters', nargs='*',
+            help=f"Counters to reconcile (default: all). Choices: {', '.join(COUNTERS)}"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Number of parent rows updated per statement"
+        )
+
+    def handle(self, *args, **options):
+        names = options['counters'] or list(COUNTERS)
+        unknown = [name for name in names if name not in COUNTERS]
+        if unknown:
+            raise CommandError(f"Unknown counter(s): {', '.join(unknown)}")
+
+        for name in names:
+            fixed = COUNTERS[name].reconcile(batch_size=options['batch_size'])
+            self.stdout.write(f"{name}: {fixed} row(s) corrected")
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from local_user.ranking import refresh_rankings
+
+
+class Command(BaseCommand):
+    help = "Recompute every provider's ranking score (run daily, and after changing the RANKING_* weights)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Number of providers updated per statement"
+        )
+
+    def handle(self, *args, **options):
+        updated = refresh_rankings(batch_size=options['batch_size'])
+        self.stdout.write(f"{updated} provider(s) ranked")
@@ -0,0 +1,47 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from local_user.jobs import run_pending, worker_name
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (see local_user/jobs.py)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Run the jobs that are due now, then exit"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=10,
+            help="Number of jobs claimed at a time"
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help="Seconds to wait when the queue is empty"
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        # Finish the claimed batch on SIGTERM/SIGINT, then exit
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        worker = worker_name()
+        self.stdout.write(f"Job worker {worker} started")
+        total = 0
+        while not self.stopping:
+            close_old_connections()
+            claimed = run_pending(options['batch_size'], worker)
+            total += claimed
+            if not claimed:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+        self.stdout.write(f"Job worker {worker} stopped after {total} job(s)")
+
+    def stop(self, signum, frame):
+        self.stopping = True
@@ -0,0 +1,358 @@
+"""
+Per-request timings and per-route metrics.
+
+`RequestMetricsMiddleware` times every request and breaks it down into
+database time and query count, serializer time and response render time:
+
+    Server-Timing: db;dur=4.1;desc="6 queries", serialize;dur=2.3, render;dur=0.8, total;dur=9.7
+
+The same numbers are aggregated per route (URL name, e.g. `providers` or
+`booking-detail`) and method into latency and query count histograms,
+served in the Prometheus text format by `MetricsView` (staff only).
+
+The bookkeeping is a handful of perf_counter() calls per request and per
+query plus one dict update under a lock, so it stays on in production:
+
+- Queries are timed by a wrapper installed on every database connection,
+  which only records while a request is being measured. The per-request
+  state lives in a context variable, so it follows the request into
+  sync_to_async threads.
+- Serializer time is measured around `.data`, the point where DRF
+  serializers do their work, for the serializers of views that use
+  `SerializerTimingMixin` (all the generic views); any queries that
+  triggers count in `db` too.
+
+Each gunicorn worker aggregates in memory. With `METRICS_DIR` set, workers
+also write their totals there (after a response has been sent, at most
+every `METRICS_FLUSH_INTERVAL` seconds). /metrics then adds up the files,
+so one scrape covers all workers. Without it, each worker reports only its
+own requests.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from rest_framework.authentication import BasicAuthentication
+from rest_framework.permissions import IsAdminUser
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+
+# Upper bounds (le) of the histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+current_timings = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    __slots__ = ('started', 'db', 'queries', 'serialize', 'serializing', 'render', 'render_started')
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.db = self.serialize = self.render = 0.0
+        self.queries = 0
+        self.serializing = False
+        self.render_started = None
+
+
+def time_query(execute, sql, params, many, context):
+    """Database execute wrapper: adds the query to the current request's timings"""
+    timings = current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.db += perf_counter() - started
+        timings.queries += 1
+
+
+def install_query_timer(sender, connection, **kwargs):
+    # connection_created receiver
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+@functools.cache
+def timed_serializer_class(serializer_class):
+    """`serializer_class` with `.data` timed (top level only - nested serializers are part of it)"""
+    if getattr(serializer_class, 'timed', False):
+        return serializer_class
+
+    class TimedSerializer(serializer_class):
+        timed = True
+
+        @property
+        def data(self):
+            timings = current_timings.get()
+            if timings is None or timings.serializing:
+                return super().data
+            timings.serializing = True
+            started = perf_counter()
+            try:
+                return super().data
+            finally:
+                timings.serialize += perf_counter() - started
+                timings.serializing = False
+
+    # Same name, so schemas and error messages don't change
+    TimedSerializer.__name__ = serializer_class.__name__
+    TimedSerializer.__qualname__ = serializer_class.__qualname__
+    TimedSerializer.__module__ = serializer_class.__module__
+    return TimedSerializer
+
+
+class SerializerTimingMixin:
+    """For generic views: the time their serializers take to produce `.data` counts as serialize time"""
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        serializer.__class__ = timed_serializer_class(type(serializer))
+        return serializer
+
+
+class Histogram:
+    """Per-bucket counts plus sum and count, kept as plain dicts so they serialize to JSON"""
+
+    @staticmethod
+    def empty(buckets):
+        return {'buckets': [0] * (len(buckets) + 1), 'sum': 0.0, 'count': 0}
+
+    @staticmethod
+    def observe(histogram, buckets, value):
+        histogram['buckets'][bisect_left(buckets, value)] += 1
+        histogram['sum'] += value
+        histogram['count'] += 1
+
+    @staticmethod
+    def merge(into, other):
+        into['buckets'] = [a + b for a, b in zip(into['buckets'], other['buckets'])]
+        into['sum'] += other['sum']
+        into['count'] += other['count']
+
+
+def empty_route():
+    return {
+        'duration': Histogram.empty(DURATION_BUCKETS),
+        'queries': Histogram.empty(QUERY_BUCKETS),
+        'db_seconds': 0.0,
+        'serialize_seconds': 0.0,
+        'render_seconds': 0.0,
+        'statuses': {},
+    }
+
+
+class MetricsRegistry:
+    """This process's per-route totals, shared with other workers through METRICS_DIR"""
+
+    def __init__(self):
+        self._routes = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._dirty = False
+
+    def observe(self, route, method, status, duration, timings):
+        key = f'{route} {method}'
+        with self._lock:
+            stats = self._routes.get(key)
+            if stats is None:
+                stats = self._routes[key] = empty_route()
+            Histogram.observe(stats['duration'], DURATION_BUCKETS, duration)
+            Histogram.observe(stats['queries'], QUERY_BUCKETS, timings.queries)
+            stats['db_seconds'] += timings.db
+            stats['serialize_seconds'] += timings.serialize
+            stats['render_seconds'] += timings.render
+            status = str(status)
+            stats['statuses'][status] = stats['statuses'].get(status, 0) + 1
+            self._dirty = True
+
+    def snapshot(self):
+        with self._lock:
+            return json.loads(json.dumps(self._routes))
+
+    def directory(self):
+        return getattr(settings, 'METRICS_DIR', None)
+
+    def flush_if_due(self):
+        # Called once the response has been sent (request_finished signal)
+        interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 10)
+        if self._dirty and self.directory() and time.monotonic() - self._last_flush >= interval:
+            self.flush()
+
+    def flush(self):
+        directory = self.directory()
+        if not directory:
+            return
+        self._last_flush = time.monotonic()
+        self._dirty = False
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{os.getpid()}.json')
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(f'{path}.tmp', path)
+
+    def collect(self):
+        """Totals of all workers (or of this one without METRICS_DIR)"""
+        directory = self.directory()
+        if not directory:
+            return self.snapshot()
+        self.flush()
+        merged = {}
+        for name in os.listdir(directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(directory, name)) as f:
+                    routes = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for key, stats in routes.items():
+                into = merged.setdefault(key, empty_route())
+                Histogram.merge(into['duration'], stats['duration'])
+                Histogram.merge(into['queries'], stats['queries'])
+                for field in ('db_seconds', 'serialize_seconds', 'render_seconds'):
+                    into[field] += stats[field]
+                for status, count in stats['statuses'].items():
+                    into['statuses'][status] = into['statuses'].get(status, 0) + count
+        return merged
+
+
+request_metrics = MetricsRegistry()
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        # Unresolved URLs all share one label, so they can't blow up the series count
+        return 'unmatched'
+    return match.url_name or match.route or 'unnamed'
+
+
+def server_timing(timings, total):
+    return (
+        f'db;dur={timings.db * 1000:.1f};desc="{timings.queries} queries", '
+        f'serialize;dur={timings.serialize * 1000:.1f}, '
+        f'render;dur={timings.render * 1000:.1f}, '
+        f'total;dur={total * 1000:.1f}'
+    )
+
+
+class RequestMetricsMiddleware:
+    """Server-Timing header and per-route metrics for every request (see module docstring)"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_METRICS', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.finish(request, response, timings)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.finish(request, response, timings)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time that too
+        timings = current_timings.get()
+        if timings is not None:
+            timings.render_started = perf_counter()
+
+            def rendered(response):
+                timings.render += perf_counter() - timings.render_started
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def finish(self, request, response, timings):
+        total = perf_counter() - timings.started
+        request_metrics.observe(route_name(request), request.method, response.status_code, total, timings)
+        if getattr(settings, 'SERVER_TIMING', True):
+            response['Server-Timing'] = server_timing(timings, total)
+        return response
+
+
+def escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def render_histogram(lines, name, labels, histogram, buckets):
+    cumulative = 0
+    for bound, count in zip(list(buckets) + [None], histogram['buckets']):
+        cumulative += count
+        le = '+Inf' if bound is None else f'{bound:g}'
+        lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+    lines.append(f'{name}_sum{{{labels}}} {histogram["sum"]:.6f}')
+    lines.append(f'{name}_count{{{labels}}} {histogram["count"]}')
+
+
+# (name, type, help, key in the route totals)
+SERIES = [
+    ('localseva_http_request_duration_seconds', 'histogram', 'Request latency by route', 'duration'),
+    ('localseva_http_request_queries', 'histogram', 'Database queries per request by route', 'queries'),
+    ('localseva_http_requests_total', 'counter', 'Requests by route and status', 'statuses'),
+    ('localseva_http_request_db_seconds_total', 'counter', 'Time spent in database queries', 'db_seconds'),
+    ('localseva_http_request_serialize_seconds_total', 'counter', 'Time spent in serializers',
+     'serialize_seconds'),
+    ('localseva_http_request_render_seconds_total', 'counter', 'Time spent rendering responses',
+     'render_seconds'),
+]
+HISTOGRAM_BUCKETS = {'duration': DURATION_BUCKETS, 'queries': QUERY_BUCKETS}
+
+
+def render_prometheus(routes):
+    """Prometheus text exposition format (0.0.4)"""
+    items = sorted(routes.items())
+    lines = []
+    for name, kind, help_text, key in SERIES:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for route_key, stats in items:
+            route, _, method = route_key.rpartition(' ')
+            labels = f'route="{escape(route)}",method="{escape(method)}"'
+            if kind == 'histogram':
+                render_histogram(lines, name, labels, stats[key], HISTOGRAM_BUCKETS[key])
+            elif key == 'statuses':
+                for status, count in sorted(stats[key].items()):
+                    lines.append(f'{name}{{{labels},status="{escape(status)}"}} {count}')
+            else:
+                lines.append(f'{name}{{{labels}}} {stats[key]:.6f}')
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsView(APIView):
+    """Per-route request metrics in the Prometheus text format, for staff"""
+    # Basic auth lets a Prometheus scraper log in as a staff account
+    authentication_classes = [*api_settings.DEFAULT_AUTHENTICATION_CLASSES, BasicAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(render_prometheus(request_metrics.collect()),
+                            content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,77 @@
+# Generated by Django 6.0.1 on 2026-10-17 02:34
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _count(queryset, outer_field, outer_ref='pk'):
+    counted = queryset.filter(**{outer_field: OuterRef(outer_ref)}).order_by().values(outer_field)
+    return Coalesce(Subquery(counted.annotate(count=Count('pk')).values('count')[:1]), 0)
+
+
+def backfill_counters(apps, schema_editor):
+    Product = apps.get_model('local_user', 'Product')
+    ProductComment = apps.get_model('local_user', 'ProductComment')
+    Profile = apps.get_model('local_user', 'Profile')
+    Booking = apps.get_model('local_user', 'Booking')
+    db_alias = schema_editor.connection.alias
+
+    Product.objects.using(db_alias).update(
+        comment_count=_count(ProductComment.objects.filter(is_visible=True), 'product')
+    )
+    Profile.objects.using(db_alias).update(
+        completed_bookings_count=_count(Booking.objects.filter(status='COMPLETED'), 'service_provider'),
+        active_listings_count=_count(Product.objects.filter(is_active=True), 'seller', 'user_id'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('local_user', '0002_booking_price_distribution_note'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='active_listings_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='completed_bookings_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='image_2',
+            field=models.ImageField(blank=True, null=True, upload_to='products/'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='image_3',
+            field=models.ImageField(blank=True, null=True, upload_to='products/'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='main_image',
+            field=models.ImageField(blank=True, null=True, upload_to='products/'),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='avatar',
+            field=models.ImageField(blank=True, null=True, upload_to='profiles/'),
+        ),
+        migrations.AlterField(
+            model_name='report',
+            name='evidence_image',
+            field=models.ImageField(blank=True, null=True, upload_to='reports/'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
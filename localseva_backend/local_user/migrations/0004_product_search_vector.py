@@ -0,0 +1,69 @@
+# Generated by Django 6.0.1 on 2026-10-17 02:35
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+SEARCH_DOCUMENT = """
+    setweight(to_tsvector('english', coalesce({row}.title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce({row}.description, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(
+        (SELECT username FROM local_user_usermodel WHERE id = {row}.seller_id), ''
+    )), 'C')
+"""
+
+CREATE_TRIGGER = f"""
+CREATE OR REPLACE FUNCTION local_user_product_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := {SEARCH_DOCUMENT.format(row='NEW')};
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER local_user_product_search_vector_update
+    BEFORE INSERT OR UPDATE OF title, description, seller_id ON local_user_product
+    FOR EACH ROW EXECUTE FUNCTION local_user_product_search_vector();
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER IF EXISTS local_user_product_search_vector_update ON local_user_product;
+DROP FUNCTION IF EXISTS local_user_product_search_vector();
+"""
+
+BACKFILL_BATCH_SIZE = 10000
+
+
+def backfill_search_vector(apps, schema_editor):
+    # Batched by id so each UPDATE commits on its own (the migration is non-atomic)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT coalesce(max(id), 0) FROM local_user_product")
+        max_id = cursor.fetchone()[0]
+        for start in range(0, max_id + 1, BACKFILL_BATCH_SIZE):
+            cursor.execute(
+                f"UPDATE local_user_product p SET search_vector = {SEARCH_DOCUMENT.format(row='p')} "
+                "WHERE p.id >= %s AND p.id < %s",
+                [start, start + BACKFILL_BATCH_SIZE],
+            )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('local_user', '0003_counter_caches'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER, DROP_TRIGGER),
+        migrations.RunPython(backfill_search_vector, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='product_search_vector_gin'),
+        ),
+    ]
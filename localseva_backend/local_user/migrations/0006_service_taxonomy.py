@@ -0,0 +1,118 @@
+# Generated by Django 6.0.1 on 2026-10-17 02:38
+
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+def _split(value):
+    # Older clients stored a comma separated string instead of a list
+    if isinstance(value, str):
+        value = value.split(',')
+    names = {}
+    for name in value or []:
+        # Both columns are 100 characters
+        name = str(name).strip()[:100]
+        slug = slugify(name)[:100]
+        if slug and slug not in names:
+            names[slug] = name
+    return names
+
+
+def copy_json_to_taxonomy(apps, schema_editor):
+    Profile = apps.get_model('local_user', 'Profile')
+    db_alias = schema_editor.connection.alias
+
+    for json_field, m2m_field, model_name in [
+        ('categories', 'service_categories', 'ServiceCategory'),
+        ('service_locations', 'service_areas', 'ServiceArea'),
+    ]:
+        Term = apps.get_model('local_user', model_name)
+        Through = getattr(Profile, m2m_field).through
+        term_fk = f'{model_name.lower()}_id'
+
+        per_profile = {
+            profile_id: _split(value)
+            for profile_id, value in Profile.objects.using(db_alias).values_list('id', json_field).iterator()
+        }
+
+        all_terms = {}
+        for names in per_profile.values():
+            for slug, name in names.items():
+                all_terms.setdefault(slug, name)
+        Term.objects.using(db_alias).bulk_create(
+            [Term(name=name, slug=slug) for slug, name in all_terms.items()],
+            ignore_conflicts=True, batch_size=1000
+        )
+        term_ids = dict(Term.objects.using(db_alias).values_list('slug', 'id'))
+
+        Through.objects.using(db_alias).bulk_create(
+            [
+                Through(profile_id=profile_id, **{term_fk: term_ids[slug]})
+                for profile_id, names in per_profile.items()
+                for slug in names
+            ],
+            ignore_conflicts=True, batch_size=1000
+        )
+
+
+def copy_taxonomy_to_json(apps, schema_editor):
+    Profile = apps.get_model('local_user', 'Profile')
+    db_alias = schema_editor.connection.alias
+    for profile in Profile.objects.using(db_alias).prefetch_related('service_categories', 'service_areas'):
+        profile.categories = [term.name for term in profile.service_categories.all()]
+        profile.service_locations = [term.name for term in profile.service_areas.all()]
+        profile.save(using=db_alias, update_fields=['categories', 'service_locations'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('local_user', '0005_provider_trigram_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ServiceArea',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('slug', models.SlugField(max_length=100, unique=True)),
+            ],
+            options={
+                'ordering': ['name'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ServiceCategory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('slug', models.SlugField(max_length=100, unique=True)),
+            ],
+            options={
+                'verbose_name_plural': 'service categories',
+                'ordering': ['name'],
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='service_areas',
+            field=models.ManyToManyField(blank=True, related_name='providers', to='local_user.servicearea'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='service_categories',
+            field=models.ManyToManyField(blank=True, related_name='providers', to='local_user.servicecategory'),
+        ),
+        migrations.RunPython(copy_json_to_taxonomy, copy_taxonomy_to_json),
+        migrations.RemoveField(
+            model_name='profile',
+            name='categories',
+        ),
+        migrations.RemoveField(
+            model_name='profile',
+            name='service_locations',
+        ),
+    ]
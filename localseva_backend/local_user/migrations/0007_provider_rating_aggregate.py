@@ -0,0 +1,66 @@
+# Generated by Django 6.0.1 on 2026-10-17 02:42
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+from django.db import migrations, models
+from django.db.models import Count, FloatField, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce
+
+
+def _review_aggregate(Review, aggregate):
+    reviews = Review.objects.filter(provider=OuterRef('pk')).order_by().values('provider')
+    return Coalesce(Subquery(reviews.annotate(value=aggregate).values('value')[:1]), 0)
+
+
+def backfill_rating_aggregate(apps, schema_editor):
+    # Recount from the reviews themselves rather than trusting total_reviews,
+    # which could drift under concurrent writes
+    Profile = apps.get_model('local_user', 'Profile')
+    Review = apps.get_model('local_user', 'Review')
+    Profile.objects.using(schema_editor.connection.alias).update(
+        rating_count=_review_aggregate(Review, Count('pk')),
+        rating_sum=_review_aggregate(Review, Sum('rating')),
+    )
+
+
+def restore_rating(apps, schema_editor):
+    Profile = apps.get_model('local_user', 'Profile')
+    Profile.objects.using(schema_editor.connection.alias).filter(rating_count__gt=0).update(
+        rating=Cast('rating_sum', FloatField()) / models.F('rating_count')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('local_user', '0006_service_taxonomy'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='profile',
+            old_name='total_reviews',
+            new_name='rating_count',
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_rating_aggregate, restore_rating),
+        # A column can't be altered into a generated one, so drop and re-add it
+        migrations.RemoveField(
+            model_name='profile',
+            name='rating',
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='rating',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(rating_count=0, then=models.Value(0.0)), default=django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast('rating_sum', models.FloatField()), '/', models.F('rating_count'))), output_field=models.FloatField()),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 6.0.1 on 2026-10-17 03:20
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('local_user', '0008_geolocation'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='booking',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='booking_user_created'),
+        ),
+        AddIndexConcurrently(
+            model_name='booking',
+            index=models.Index(fields=['user', 'status', '-created_at', '-id'], name='booking_user_status_created'),
+        ),
+        AddIndexConcurrently(
+            model_name='booking',
+            index=models.Index(fields=['service_provider', '-created_at', '-id'], name='booking_provider_created'),
+        ),
+        AddIndexConcurrently(
+            model_name='booking',
+            index=models.Index(fields=['service_provider', 'status', '-created_at', '-id'], name='booking_provider_status_crtd'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-created_at', '-id'], name='product_active_created'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['category', '-created_at', '-id'], name='product_active_category'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['city', '-created_at', '-id'], name='product_active_city'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['is_sold', '-created_at', '-id'], name='product_active_sold'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['price', 'id'], name='product_active_price'),
+        ),
+        AddIndexConcurrently(
+            model_name='productcomment',
+            index=models.Index(condition=models.Q(('is_visible', True)), fields=['product', '-created_at', '-id'], name='comment_visible_created'),
+        ),
+        AddIndexConcurrently(
+            model_name='report',
+            index=models.Index(fields=['reporter', '-created_at', '-id'], name='report_reporter_created'),
+        ),
+        AddIndexConcurrently(
+            model_name='review',
+            index=models.Index(fields=['provider', '-created_at', '-id'], name='review_provider_created'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 6.0.1 on 2026-10-17 05:40
+
+import django.contrib.postgres.constraints
+import django.contrib.postgres.fields.ranges
+import django.core.validators
+import django.db.models.deletion
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations, models
+
+# Intervals for the bookings that still hold their provider. Bookings that
+# already overlap each other keep only the earliest made one's interval
+BACKFILL_INTERVALS = """
+INSERT INTO local_user_bookinginterval (booking_id, provider_id, period)
+SELECT id, service_provider_id,
+       tstzrange(scheduled_date, scheduled_date + make_interval(mins => duration_minutes))
+FROM local_user_booking
+WHERE status NOT IN ('REJECTED', 'CANCELLED')
+ORDER BY created_at, id
+ON CONFLICT DO NOTHING
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('local_user', '0013_booking_version'),
+    ]
+
+    operations = [
+        # = on the provider id in the GiST exclusion constraint
+        BtreeGistExtension(),
+        migrations.AddField(
+            model_name='booking',
+            name='duration_minutes',
+            field=models.PositiveSmallIntegerField(default=120, validators=[django.core.validators.MinValueValidator(15), django.core.validators.MaxValueValidator(720)]),
+        ),
+        migrations.CreateModel(
+            name='AvailabilitySlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')])),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability_slots', to='local_user.profile')),
+            ],
+            options={
+                'ordering': ['weekday', 'start_time'],
+                'indexes': [models.Index(fields=['weekday', 'start_time', 'end_time', 'provider'], name='availability_slot_window')],
+                'constraints': [models.CheckConstraint(condition=models.Q(('start_time__lt', models.F('end_time'))), name='availability_slot_start_before_end')],
+            },
+        ),
+        migrations.CreateModel(
+            name='BookingInterval',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', django.contrib.postgres.fields.ranges.DateTimeRangeField()),
+                ('booking', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='interval', to='local_user.booking')),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booked_intervals', to='local_user.profile')),
+            ],
+            options={
+                'constraints': [django.contrib.postgres.constraints.ExclusionConstraint(expressions=[('provider', '='), ('period', '&&')], name='booking_interval_no_overlap')],
+            },
+        ),
+        migrations.RunSQL(BACKFILL_INTERVALS, migrations.RunSQL.noop),
+    ]
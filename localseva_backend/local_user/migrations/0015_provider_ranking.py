@@ -0,0 +1,87 @@
+# Generated by Django 6.0.1 on 2026-10-17 06:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, FloatField, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Extract, Ln
+from django.utils import timezone
+
+# local_user.ranking with its default weights
+PRIOR_RATING, PRIOR_WEIGHT = 3.5, 10.0
+REVIEW_WEIGHT, BOOKING_WEIGHT, RECENCY_WEIGHT, RECENCY_DAYS = 0.25, 0.25, 1.0, 90.0
+
+
+def backfill_ranking(apps, schema_editor):
+    Profile = apps.get_model('local_user', 'Profile')
+    Booking = apps.get_model('local_user', 'Booking')
+    ProviderCategory = apps.get_model('local_user', 'ProviderCategory')
+    db_alias = schema_editor.connection.alias
+
+    # Not after now, so the age is never negative
+    now = timezone.now()
+    last_completed = Booking.objects.filter(
+        service_provider=OuterRef('pk'), status='COMPLETED', completed_at__lte=now
+    ).order_by().values('service_provider').annotate(last=Max('completed_at')).values('last')[:1]
+    age_days = (
+        Value(now.timestamp()) - Extract(Subquery(last_completed), 'epoch', output_field=FloatField())
+    ) / Value(86400.0)
+    Profile.objects.using(db_alias).filter(role='SERVICE').update(ranking_score=(
+        (Value(PRIOR_RATING * PRIOR_WEIGHT) + F('rating_sum')) / (Value(PRIOR_WEIGHT) + F('rating_count'))
+        + Value(REVIEW_WEIGHT) * Ln(F('rating_count') + 1)
+        + Value(BOOKING_WEIGHT) * Ln(F('completed_bookings_count') + 1)
+        + Coalesce(Value(RECENCY_WEIGHT) / (Value(1.0) + age_days / Value(RECENCY_DAYS)), Value(0.0))
+    ))
+    ProviderCategory.objects.using(db_alias).update(
+        ranking_score=Subquery(Profile.objects.filter(pk=OuterRef('profile_id')).values('ranking_score')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('local_user', '0014_booking_availability'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='ranking_score',
+            field=models.FloatField(default=0.0, editable=False),
+        ),
+        # Profile.service_categories gets an explicit model for its existing table
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='ProviderCategory',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='local_user.profile')),
+                        ('servicecategory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='local_user.servicecategory')),
+                    ],
+                    options={
+                        'db_table': 'local_user_profile_service_categories',
+                        'unique_together': {('profile', 'servicecategory')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='profile',
+                    name='service_categories',
+                    field=models.ManyToManyField(blank=True, related_name='providers', through='local_user.ProviderCategory', to='local_user.servicecategory'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='providercategory',
+            name='ranking_score',
+            field=models.FloatField(default=0.0, editable=False),
+        ),
+        migrations.RunPython(backfill_ranking, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['role', '-ranking_score', '-id'], name='profile_ranking'),
+        ),
+        migrations.AddIndex(
+            model_name='providercategory',
+            index=models.Index(fields=['servicecategory', '-ranking_score', '-profile'], name='provider_category_ranking'),
+        ),
+    ]
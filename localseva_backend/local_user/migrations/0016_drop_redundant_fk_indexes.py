@@ -0,0 +1,69 @@
+# Generated by Django 6.0.1 on 2026-10-17 04:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Foreign keys whose own index duplicates the leading column of a 0009 index
+COVERED_FOREIGN_KEYS = [
+    ('booking', 'user'),
+    ('booking', 'service_provider'),
+    ('review', 'provider'),
+    ('report', 'reporter'),
+]
+
+
+def drop_fk_indexes(apps, schema_editor):
+    for model_name, field_name in COVERED_FOREIGN_KEYS:
+        model = apps.get_model('local_user', model_name)
+        column = model._meta.get_field(field_name).column
+        with schema_editor.connection.cursor() as cursor:
+            constraints = schema_editor.connection.introspection.get_constraints(cursor, model._meta.db_table)
+        for name, constraint in constraints.items():
+            if constraint['index'] and not constraint['unique'] and constraint['columns'] == [column]:
+                schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {schema_editor.quote_name(name)}')
+
+
+def create_fk_indexes(apps, schema_editor):
+    for model_name, field_name in COVERED_FOREIGN_KEYS:
+        model = apps.get_model('local_user', model_name)
+        field = model._meta.get_field(field_name)
+        schema_editor.execute(schema_editor._create_index_sql(model, fields=[field], concurrently=True))
+
+
+class Migration(migrations.Migration):
+    # DROP INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('local_user', '0015_provider_ranking'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            # Runs before the state change, so the reverse sees db_index=True
+            database_operations=[migrations.RunPython(drop_fk_indexes, create_fk_indexes)],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='booking',
+                    name='service_provider',
+                    field=models.ForeignKey(db_index=False, limit_choices_to={'role': 'SERVICE'}, on_delete=django.db.models.deletion.CASCADE, related_name='bookings_received', to='local_user.profile'),
+                ),
+                migrations.AlterField(
+                    model_name='booking',
+                    name='user',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='bookings_made', to=settings.AUTH_USER_MODEL),
+                ),
+                migrations.AlterField(
+                    model_name='report',
+                    name='reporter',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='reports_made', to=settings.AUTH_USER_MODEL),
+                ),
+                migrations.AlterField(
+                    model_name='review',
+                    name='provider',
+                    field=models.ForeignKey(db_index=False, limit_choices_to={'role': 'SERVICE'}, on_delete=django.db.models.deletion.CASCADE, related_name='reviews_received', to='local_user.profile'),
+                ),
+            ],
+        ),
+    ]
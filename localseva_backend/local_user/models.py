@@ -1,18 +1,226 @@
+import copy
+
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateTimeRangeField, RangeOperators
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.fields.files import FieldFile
+from django.db.models.functions import Cast
+from django.utils.text import slugify
+from django.utils import timezone
+
+from .geo import encode_geohash
+
+
+def term_slug(name):
+    """The slug a taxonomy term is stored and looked up under, cut to the column's 100 characters"""
+    return slugify(name)[:100]
+
+
+def split_terms(value):
+    """
+    Normalize a list of taxonomy names. Accepts a list or a comma separated
+    string ("Plumbing, Electrical") and drops blanks and duplicates.
+    """
+    if isinstance(value, str):
+        value = value.split(',')
+    names = {}
+    for name in value or []:
+        name = str(name).strip()
+        slug = term_slug(name)
+        if slug and slug not in names:
+            names[slug] = name
+    return list(names.values())
+
+
+class TaxonomyManager(models.Manager):
+    def resolve(self, names):
+        """Return terms for the given names (matched by slug), creating missing ones"""
+        names = split_terms(names)
+        by_slug = {term_slug(name): name for name in names}
+        existing = {term.slug: term for term in self.filter(slug__in=by_slug)}
+        missing = [self.model(name=name, slug=slug) for slug, name in by_slug.items() if slug not in existing]
+        if missing:
+            self.bulk_create(missing, ignore_conflicts=True)
+            existing = {term.slug: term for term in self.filter(slug__in=by_slug)}
+        return [existing[slug] for slug in by_slug if slug in existing]
+
+
+class TaxonomyTerm(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    slug = models.SlugField(max_length=100, unique=True)
+
+    objects = TaxonomyManager()
+
+    class Meta:
+        abstract = True
+        ordering = ['name']
 
-
-class UserModel(AbstractUser):
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def catalog_cache_key(cls):
+        return f'catalog:{cls._meta.model_name}'
+
+
+class GeoLocated(models.Model):
+    """Optional coordinates, plus their geohash for ?near= searches (see geo.py)"""
+    latitude = models.FloatField(null=True, blank=True,
+                                 validators=[MinValueValidator(-90), MaxValueValidator(90)])
+    longitude = models.FloatField(null=True, blank=True,
+                                  validators=[MinValueValidator(-180), MaxValueValidator(180)])
+    geohash = models.CharField(max_length=12, blank=True, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def has_coordinates(self):
+        return self.latitude is not None and self.longitude is not None
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'latitude', 'longitude'} & set(update_fields):
+            self.geohash = encode_geohash(self.latitude, self.longitude) if self.has_coordinates() else ''
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'geohash'}
+        super().save(*args, **kwargs)
+
+
+class ServiceCategory(TaxonomyTerm):
+    """Kind of service a provider offers, e.g. Plumbing"""
+
+    class Meta(TaxonomyTerm.Meta):
+        verbose_name_plural = 'service categories'
+
+
+class ServiceArea(TaxonomyTerm):
+    """Locality a provider serves"""
+
+
+class LoadDeferredTogether:
+    """
+    Loading one deferred field loads all of them, in one query, instead of one
+    query per field. Users and profiles built from token claims
+    (local_user.authentication) have everything but a few fields deferred.
+    """
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred and deferred.issuperset(fields):
+            fields = deferred
+        super().refresh_from_db(using, fields, from_queryset)
+
+
+class TrackChanges:
+    """
+    Saving a row loaded from the database writes only the columns that
+    changed since it was loaded (as save(update_fields=...)), and nothing at
+    all if none did. A full save would also write back every column it
+    didn't touch, e.g. a counter cache bumped by another request since.
+
+    Values are compared with the ones loaded; saves with explicit
+    update_fields and instances not loaded from the database (new ones, or
+    built with a pk by hand) save as usual.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {}
+        instance._remember_values()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        present = set(self.__dict__)
+        super().refresh_from_db(using, fields, from_queryset)
+        if getattr(self, '_loaded_values', None) is None:
+            return
+        if fields is None:
+            self._remember_values()
+        else:
+            # The requested fields, plus any deferred ones loaded with them
+            names = {self._meta.get_field(name).attname for name in fields}
+            self._remember_values(lambda attname: attname in names or attname not in present)
+
+    @classmethod
+    def tracked_fields(cls):
+        return [field for field in cls._meta.concrete_fields if not field.primary_key and not field.generated]
+
+    @staticmethod
+    def _comparable(value):
+        if isinstance(value, FieldFile):
+            # Saving a new file renames the same FieldFile object in place
+            return value.name
+        if isinstance(value, (dict, list)):
+            # JSON values can be changed in place too
+            return copy.deepcopy(value)
+        return value
+
+    def _remember_values(self, include=None):
+        for field in self.tracked_fields():
+            if field.attname not in self.__dict__ or (include and not include(field.attname)):
+                continue
+            value = self.__dict__[field.attname]
+            if hasattr(value, 'resolve_expression'):
+                # Resolved by the database, e.g. F('views') + 1: value unknown
+                self._loaded_values.pop(field.attname, None)
+            else:
+                self._loaded_values[field.attname] = self._comparable(value)
+
+    def changed_fields(self):
+        """Names of the fields whose values differ from the ones loaded"""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return None
+        return [
+            field.name for field in self.tracked_fields()
+            if field.attname in self.__dict__ and (
+                field.attname not in loaded or self.__dict__[field.attname] != loaded[field.attname]
+            )
+        ]
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None and not args and not self._state.adding and not kwargs.get('force_insert'):
+            changed = self.changed_fields()
+            if changed == []:
+                return
+            if changed is not None:
+                auto_now = [field.name for field in self.tracked_fields() if getattr(field, 'auto_now', False)]
+                kwargs['update_fields'] = {*changed, *auto_now}
+        super().save(*args, **kwargs)
+
+        if getattr(self, '_loaded_values', None) is None:
+            self._loaded_values = {}
+        if update_fields is None:
+            # Everything loaded now matches the row (save() may have set more, e.g. geohash)
+            self._remember_values()
+        else:
+            names = {self._meta.get_field(name).attname for name in update_fields}
+            self._remember_values(lambda attname: attname in names)
+
+
+class UserModel(TrackChanges, LoadDeferredTogether, AbstractUser):
     username = models.CharField(max_length=50, blank=False, null=False, unique=True)
     email = models.EmailField(max_length=50, unique=True)
     is_service_provider = models.BooleanField(default=False)
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Fuzzy provider search (pg_trgm)
+            GinIndex(fields=['username'], opclasses=['gin_trgm_ops'], name='user_username_trgm'),
+        ]
+
     def __str__(self):
         return self.username
 
 #changes here
-class Profile(models.Model):
+class Profile(TrackChanges, LoadDeferredTogether, GeoLocated):
     ROLE_CHOICES = [
         ("USER", "User"),
         ("SERVICE", "Service Provider"),
@@ -27,6 +235,8 @@ class Profile(models.Model):
 
     # Basic info for all users
     avatar = models.ImageField(upload_to="profiles/", blank=True, null=True)
+    # Resized copies of the images, maintained by local_user.images
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default="USER")
     bio = models.TextField(max_length=500, blank=True)
     phone = models.CharField(max_length=15, blank=True, null=True)
@@ -39,20 +249,49 @@ class Profile(models.Model):
     base_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True,
                                      help_text="Average base/visiting charge")
     is_available = models.BooleanField(default=True)
-    rating = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(5)])
-    total_reviews = models.IntegerField(default=0)
+    # Running review totals, maintained by local_user.counters; rating is
+    # derived from them by the database
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating = models.GeneratedField(
+        expression=Case(
+            When(rating_count=0, then=Value(0.0)),
+            default=Cast('rating_sum', models.FloatField()) / F('rating_count'),
+        ),
+        output_field=models.FloatField(),
+        db_persist=True,
+    )
 
     # Categories and other details
-    categories = models.JSONField(default=list, blank=True)
+    service_categories = models.ManyToManyField(ServiceCategory, through='ProviderCategory',
+                                                related_name="providers", blank=True)
     availability = models.CharField(max_length=100, blank=True)
     description = models.TextField(max_length=200, blank=True)
-    service_locations = models.JSONField(default=list, blank=True)
+    service_areas = models.ManyToManyField(ServiceArea, related_name="providers", blank=True)
 
     # Marketplace fields (for all users)
     is_marketplace_seller = models.BooleanField(default=False)
     marketplace_rating = models.FloatField(default=0.0, validators=[MinValueValidator(0), MaxValueValidator(5)])
     marketplace_reviews = models.IntegerField(default=0)
 
+    # Counter caches, maintained by local_user.counters
+    completed_bookings_count = models.PositiveIntegerField(default=0, editable=False)
+    active_listings_count = models.PositiveIntegerField(default=0, editable=False)
+    # Maintained by local_user.ranking, from the rating and booking counters
+    ranking_score = models.FloatField(default=0.0, editable=False)
+
+    class Meta:
+        indexes = [
+            # Provider listings, best ranked first
+            models.Index(fields=['role', '-ranking_score', '-id'], name='profile_ranking'),
+            # Fuzzy provider search (pg_trgm)
+            GinIndex(fields=['location'], opclasses=['gin_trgm_ops'], name='profile_location_trgm'),
+            GinIndex(fields=['bio'], opclasses=['gin_trgm_ops'], name='profile_bio_trgm'),
+            GinIndex(fields=['description'], opclasses=['gin_trgm_ops'], name='profile_description_trgm'),
+            # ?near= searches filter on geohash prefixes (LIKE 'abc%')
+            models.Index(fields=['geohash'], opclasses=['varchar_pattern_ops'], name='profile_geohash'),
+        ]
+
     def __str__(self):
         return self.user.username
 
@@ -60,15 +299,29 @@ class Profile(models.Model):
     def is_service_provider(self):
         return self.role == "SERVICE"
 
-    @property
-    def completed_bookings_count(self):
-        """Get the number of completed bookings for this service provider"""
-        if self.role != "SERVICE":
-            return 0
-        return self.bookings_received.filter(status='COMPLETED').count()
 
+class ProviderCategory(models.Model):
+    """
+    A category a provider offers (the Profile.service_categories table), with
+    a copy of the provider's ranking score so each category's best providers
+    are read in order from one index (see ranking.py)
+    """
+    profile = models.ForeignKey(Profile, on_delete=models.CASCADE)
+    servicecategory = models.ForeignKey(ServiceCategory, on_delete=models.CASCADE)
+    ranking_score = models.FloatField(default=0.0, editable=False)
+
+    class Meta:
+        db_table = 'local_user_profile_service_categories'
+        unique_together = [('profile', 'servicecategory')]
+        indexes = [
+            models.Index(fields=['servicecategory', '-ranking_score', '-profile'], name='provider_category_ranking'),
+        ]
+
+    def __str__(self):
+        return f"{self.profile} - {self.servicecategory}"
 
-class Booking(models.Model):
+
+class Booking(TrackChanges, models.Model):
     STATUS_CHOICES = [
         ('PENDING', 'Pending'),  # User created booking, waiting for provider response
         ('QUOTE_GIVEN', 'Quote Given'),  # Provider has given a quote with base_price
@@ -79,13 +332,17 @@ class Booking(models.Model):
         ('CANCELLED', 'Cancelled'),  # Cancelled after quote acceptance
     ]
 
-    user = models.ForeignKey(UserModel, on_delete=models.CASCADE, related_name="bookings_made")
+    # No single-column indexes: the (user, ...) and (service_provider, ...) indexes below cover them
+    user = models.ForeignKey(UserModel, on_delete=models.CASCADE, related_name="bookings_made", db_index=False)
     service_provider = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name="bookings_received",
-                                         limit_choices_to={'role': 'SERVICE'})
+                                         limit_choices_to={'role': 'SERVICE'}, db_index=False)
     service_category = models.TextField()
     description = models.TextField()
     address = models.TextField()
     scheduled_date = models.DateTimeField()
+    # How long the provider is booked for from scheduled_date (see availability.py)
+    duration_minutes = models.PositiveSmallIntegerField(default=120, validators=[MinValueValidator(15),
+                                                                                 MaxValueValidator(12 * 60)])
 
     # Price tracking
     quote_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True,
@@ -105,24 +362,108 @@ class Booking(models.Model):
     started_at = models.DateTimeField(null=True, blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Bumped by every write, so concurrent changes can be detected (see booking_states.py)
+    version = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        # Booking lists: a user's or a provider's bookings, optionally by
+        # status, newest first (id breaks ties for keyset pagination)
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='booking_user_created'),
+            models.Index(fields=['user', 'status', '-created_at', '-id'], name='booking_user_status_created'),
+            models.Index(fields=['service_provider', '-created_at', '-id'], name='booking_provider_created'),
+            models.Index(fields=['service_provider', 'status', '-created_at', '-id'],
+                         name='booking_provider_status_crtd'),
+        ]
 
     def __str__(self):
         return f"Booking #{self.id} - {self.user.username} to {self.service_provider.user.username}"
 
-class Review(models.Model):
+    def save(self, *args, **kwargs):
+        # Plain saves (admin, scripts) move the version on too, unless they change nothing
+        if not self._state.adding and (kwargs.get('update_fields') is not None or self.changed_fields() != []):
+            self.version += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+        super().save(*args, **kwargs)
+
+class AvailabilitySlot(models.Model):
+    """A weekly window in which a provider takes bookings, e.g. Saturday 10:00-14:00 (see availability.py)"""
+    WEEKDAY_CHOICES = [
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    ]
+
+    provider = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name="availability_slots")
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES)
+    # Local time (TIME_ZONE)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+
+    class Meta:
+        ordering = ['weekday', 'start_time']
+        constraints = [
+            models.CheckConstraint(condition=Q(start_time__lt=F('end_time')), name='availability_slot_start_before_end'),
+        ]
+        indexes = [
+            # "Who is free on Saturday 10-12": slots of that day starting by 10, provider
+            # included so the search doesn't need the table
+            models.Index(fields=['weekday', 'start_time', 'end_time', 'provider'], name='availability_slot_window'),
+        ]
+
+    def __str__(self):
+        return f"{self.provider} - {self.get_weekday_display()} {self.start_time:%H:%M}-{self.end_time:%H:%M}"
+
+
+class BookingInterval(models.Model):
+    """
+    The time an active booking holds its provider for. No two intervals of a
+    provider may overlap (exclusion constraint), so the same time can't be
+    booked twice, not even by concurrent requests.
+    """
+    booking = models.OneToOneField(Booking, on_delete=models.CASCADE, related_name="interval")
+    provider = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name="booked_intervals")
+    # [scheduled_date, scheduled_date + duration): back to back bookings don't overlap
+    period = DateTimeRangeField()
+
+    class Meta:
+        constraints = [
+            # Its GiST index on (provider, period) also serves the availability search
+            ExclusionConstraint(
+                name='booking_interval_no_overlap',
+                expressions=[('provider', RangeOperators.EQUAL), ('period', RangeOperators.OVERLAPS)],
+            ),
+        ]
+
+    def __str__(self):
+        return f"Booking #{self.booking_id}: {self.period.lower} - {self.period.upper}"
+
+
+class Review(TrackChanges, models.Model):
     booking = models.OneToOneField(Booking, on_delete=models.CASCADE, related_name="review")
     user = models.ForeignKey(UserModel, on_delete=models.CASCADE, related_name="reviews_given")
+    # Indexed by review_provider_created
     provider = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name="reviews_received",
-                                 limit_choices_to={'role': 'SERVICE'})
+                                 limit_choices_to={'role': 'SERVICE'}, db_index=False)
     rating = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)])
     comment = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['provider', '-created_at', '-id'], name='review_provider_created'),
+        ]
+
     def __str__(self):
         return f"Review by {self.user.username} - {self.rating} stars"
 
 
-class Report(models.Model):
+class Report(TrackChanges, models.Model):
     REPORT_TYPE_CHOICES = [
         ('FRAUD', 'Fraud/Scam'),
         ('BAD_SERVICE', 'Poor Service Quality'),
@@ -139,7 +480,8 @@ class Report(models.Model):
         ('DISMISSED', 'Dismissed'),
     ]
 
-    reporter = models.ForeignKey(UserModel, on_delete=models.CASCADE, related_name="reports_made")
+    # Indexed by report_reporter_created
+    reporter = models.ForeignKey(UserModel, on_delete=models.CASCADE, related_name="reports_made", db_index=False)
     reported_user = models.ForeignKey(UserModel, on_delete=models.CASCADE, related_name="reports_received")
     reported_profile = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name="reported_as_provider",
                                          null=True, blank=True)
@@ -148,16 +490,22 @@ class Report(models.Model):
     report_type = models.CharField(max_length=50, choices=REPORT_TYPE_CHOICES)
     description = models.TextField()
     evidence_image = models.ImageField(upload_to="reports/", blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
     admin_notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     resolved_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['reporter', '-created_at', '-id'], name='report_reporter_created'),
+        ]
+
     def __str__(self):
         return f"Report #{self.id} - {self.reporter.username} vs {self.reported_user.username}"
 
 
-class Product(models.Model):
+class Product(TrackChanges, GeoLocated):
     PRODUCT_CATEGORY_CHOICES = [
         ('FURNITURE', 'Furniture'),
         ('ELECTRONICS', 'Electronics'),
@@ -193,6 +541,7 @@ class Product(models.Model):
     main_image = models.ImageField(upload_to="products/", blank=True, null=True)
     image_2 = models.ImageField(upload_to="products/", blank=True, null=True)
     image_3 = models.ImageField(upload_to="products/", blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     # Contact preferences
     contact_phone = models.CharField(max_length=15, blank=True)
@@ -208,11 +557,36 @@ class Product(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     views = models.IntegerField(default=0)
 
+    # Counter cache of visible comments, maintained by local_user.counters
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+
+    # Full-text search document (title A, description B, seller username C).
+    # Maintained by a database trigger, see migration 0004.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='product_search_vector_gin'),
+            models.Index(fields=['geohash'], opclasses=['varchar_pattern_ops'], name='product_geohash'),
+            # Marketplace listing only ever shows active products, so these
+            # are partial; one per filter it offers, in its default order
+            models.Index(fields=['-created_at', '-id'], name='product_active_created',
+                         condition=models.Q(is_active=True)),
+            models.Index(fields=['category', '-created_at', '-id'], name='product_active_category',
+                         condition=models.Q(is_active=True)),
+            models.Index(fields=['city', '-created_at', '-id'], name='product_active_city',
+                         condition=models.Q(is_active=True)),
+            models.Index(fields=['is_sold', '-created_at', '-id'], name='product_active_sold',
+                         condition=models.Q(is_active=True)),
+            models.Index(fields=['price', 'id'], name='product_active_price',
+                         condition=models.Q(is_active=True)),
+        ]
+
     def __str__(self):
         return f"{self.title} - {self.seller.username}"
 
 
-class ProductComment(models.Model):
+class ProductComment(TrackChanges, models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="comments")
     user = models.ForeignKey(UserModel, on_delete=models.CASCADE, related_name="product_comments")
     comment = models.TextField()
@@ -223,5 +597,61 @@ class ProductComment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', '-created_at', '-id'], name='comment_visible_created',
+                         condition=models.Q(is_visible=True)),
+        ]
+
+    def __str__(self):
+        return f"Comment on {self.product.title} by {self.user.username}"
+
+class Job(models.Model):
+    """A unit of deferred work, run by `manage.py run_jobs` (see jobs.py)"""
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),  # Waiting for run_at
+        ('RUNNING', 'Running'),  # Claimed by a worker
+        ('FAILED', 'Failed'),  # Out of attempts; kept for inspection
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='QUEUED')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # What the workers poll for
+            models.Index(fields=['status', 'run_at', 'id'], name='job_status_run_at'),
+        ]
+
+    def __str__(self):
+        return f"Job #{self.id} - {self.name} ({self.status})"
+
+
+class TokenDenylist(models.Model):
+    """
+    Access tokens the stateless JWT authentication (local_user.authentication)
+    must not take at face value: one token (jti), or all of a user's tokens
+    issued before `issued_before`. With `claims_only` the tokens stay valid but
+    their claims are out of date, so the user is loaded from the database.
+    """
+    user = models.ForeignKey(UserModel, on_delete=models.CASCADE, related_name='+')
+    jti = models.CharField(max_length=255, blank=True)
+    issued_before = models.DateTimeField(null=True, blank=True)
+    claims_only = models.BooleanField(default=False)
+    # No token the entry matches is valid after this; expired entries are deleted
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = 'token denylist'
+
     def __str__(self):
-        return f"Comment on {self.product.title} by {self.user.username}"
\ No newline at end of file
+        return f"{'Stale claims' if self.claims_only else 'Revoked'}: user #{self.user_id} {self.jti or 'all tokens'}"
@@ -0,0 +1,258 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination for list endpoints.
+
+    Rows are ordered by the requested ordering with `id` appended as a tie
+    breaker, and the cursor stores the values of those columns for the last
+    row of the page. The next page is fetched with a `WHERE (a, id) < (x, y)`
+    style predicate, so no OFFSET is scanned and no COUNT(*) is issued -
+    page 10,000 costs the same as page 1.
+
+    The response body stays a plain JSON array (as documented in the API docs)
+    and the neighbouring pages are advertised in an RFC 8288 `Link` header:
+
+        Link: <...?cursor=abc>; rel="next", <...?cursor=def>; rel="prev"
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    invalid_cursor_message = 'Invalid cursor'
+
+    # Used when neither the view nor an OrderingFilter provides an ordering
+    ordering = ('-created_at',)
+
+    def __init__(self):
+        self.page_size = api_settings.PAGE_SIZE or 50
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.get_page_queryset(queryset, request, view)
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() for async views, fetching with the async ORM"""
+        queryset = self.get_page_queryset(queryset, request, view)
+        return self.set_page([obj async for obj in queryset])
+
+    def get_page_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.model = queryset.model
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.nullable = self.get_nullable_fields(queryset.model)
+
+        self.cursor_values, self.reverse = self.decode_cursor(request)
+
+        if self.cursor_values is not None:
+            queryset = queryset.filter(self.seek_predicate(self.cursor_values, self.reverse))
+        queryset = queryset.order_by(*self.order_by_expressions(self.reverse))
+
+        # Fetch one extra row to know if there is another page in this direction
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+
+        self.page = results
+        started = self.cursor_values is not None
+        self.has_next = has_more if not self.reverse else started
+        self.has_previous = has_more if self.reverse else started
+        return results
+
+    def get_paginated_response(self, data):
+        headers = {}
+        links = []
+        next_link = self.get_next_link()
+        previous_link = self.get_previous_link()
+        if next_link:
+            links.append(f'<{next_link}>; rel="next"')
+        if previous_link:
+            links.append(f'<{previous_link}>; rel="prev"')
+        if links:
+            headers['Link'] = ', '.join(links)
+        return Response(data, headers=headers)
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                return _positive_int(
+                    request.query_params[self.page_size_query_param],
+                    strict=True,
+                    cutoff=self.max_page_size
+                )
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_ordering(self, request, queryset, view):
+        """
+        Ordering comes from the first filter backend that provides one (e.g.
+        OrderingFilter, so `?ordering=-price` keeps working), otherwise from
+        `view.ordering`. `id` is always appended so the keyset is unique.
+        """
+        ordering = getattr(view, 'ordering', None) or self.ordering
+
+        for backend in getattr(view, 'filter_backends', []):
+            if hasattr(backend, 'get_ordering'):
+                backend_ordering = backend().get_ordering(request, queryset, view)
+                if backend_ordering:
+                    ordering = backend_ordering
+                    break
+
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+
+        fields = []
+        for item in ordering:
+            name = item.lstrip('-')
+            if name == 'pk':
+                name = 'id'
+            if name not in [field for field, _ in fields]:
+                fields.append((name, item.startswith('-')))
+
+        if 'id' not in [field for field, _ in fields]:
+            # Break ties in the same direction as the leading column
+            fields.append(('id', fields[0][1] if fields else True))
+
+        return fields
+
+    def get_nullable_fields(self, model):
+        nullable = set()
+        for name, _ in self.ordering:
+            try:
+                if model._meta.get_field(name).null:
+                    nullable.add(name)
+            except FieldDoesNotExist:
+                # Annotations are expected to be non-null
+                pass
+        return nullable
+
+    def order_by_expressions(self, reverse=False):
+        return [
+            ('-' if descending != reverse else '') + name
+            for name, descending in self.ordering
+        ]
+
+    def seek_predicate(self, values, reverse=False):
+        """
+        Build `(a > x) OR (a = x AND b > y) OR ...` for the ordering columns.
+        NULLs follow PostgreSQL's default placement (they sort as the largest
+        value), so the plain ORDER BY can still be served from an index.
+        """
+        predicate = Q(pk__in=[])
+        equal_so_far = Q()
+
+        for (name, descending), value in zip(self.ordering, values):
+            lookup = 'lt' if descending != reverse else 'gt'
+            predicate |= equal_so_far & self._beyond(name, lookup, value)
+            if value is None:
+                equal_so_far &= Q(**{f'{name}__isnull': True})
+            else:
+                equal_so_far &= Q(**{name: value})
+
+        return predicate
+
+    def _beyond(self, name, lookup, value):
+        if lookup == 'gt':
+            if value is None:
+                # Nothing sorts after NULL
+                return Q(pk__in=[])
+            condition = Q(**{f'{name}__gt': value})
+            if name in self.nullable:
+                condition |= Q(**{f'{name}__isnull': True})
+            return condition
+
+        if value is None:
+            return Q(**{f'{name}__isnull': False})
+        return Q(**{f'{name}__lt': value})
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def encode_cursor(self, obj, reverse):
+        values = [self._dump_value(getattr(obj, name)) for name, _ in self.ordering]
+        payload = {'o': self._signature(), 'v': values}
+        if reverse:
+            payload['r'] = 1
+        encoded = urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+
+        try:
+            payload = json.loads(urlsafe_b64decode(encoded.encode()).decode())
+            # A cursor is only valid for the ordering it was generated with
+            if payload['o'] != self._signature() or len(payload['v']) != len(self.ordering):
+                raise ValueError
+            values = [
+                self._load_value(name, value)
+                for (name, _), value in zip(self.ordering, payload['v'])
+            ]
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return values, bool(payload.get('r'))
+
+    def _signature(self):
+        return ','.join(('-' if descending else '') + name for name, descending in self.ordering)
+
+    def _dump_value(self, value):
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        return value
+
+    def _load_value(self, name, value):
+        if value is None:
+            return None
+        try:
+            field = self.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return value
+        return field.to_python(value)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Opaque cursor taken from the Link header.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Number of results to return per page.',
+                'schema': {'type': 'integer'},
+            },
+        ]
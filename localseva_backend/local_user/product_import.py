@@ -0,0 +1,115 @@
+"""
+Bulk import of marketplace products from a JSON array or a CSV file.
+
+All rows are validated first, with `ProductImportSerializer` and no
+database access per row. If they are all valid they are inserted with
+bulk_create in chunks, inside one transaction; otherwise nothing is, and
+the invalid rows are reported back by index (0-based, not counting the CSV
+header), so a corrected file can simply be sent again.
+
+bulk_create skips `save()` and the model signals, so everything those do
+for a single product happens here once per import instead:
+- geohash is set on each row;
+- the seller's active_listings_count is bumped by the number of rows;
+- the marketplace response cache is invalidated;
+- the seller is marked as marketplace seller.
+"""
+import csv
+import io
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+
+from .counters import COUNTERS
+from .geo import encode_geohash
+from .jobs import enqueue
+from .models import Product
+from .response_cache import invalidate_model
+from .serializers import ProductImportSerializer
+from .tasks import mark_marketplace_seller
+
+CHUNK_SIZE = 1000
+
+
+def max_rows():
+    return getattr(settings, 'PRODUCT_IMPORT_MAX_ROWS', 5000)
+
+
+def read_csv(upload):
+    """Rows of an uploaded CSV file as dicts; empty cells are left out so defaults apply"""
+    try:
+        text = io.TextIOWrapper(upload.file, encoding='utf-8-sig')
+        reader = csv.DictReader(text)
+        if not reader.fieldnames:
+            raise serializers.ValidationError({"file": "The CSV file is empty"})
+        return [
+            {
+                key.strip(): value.strip() for key, value in row.items()
+                # Extra cells past the header come as a list under key None
+                if key and isinstance(value, str) and value.strip()
+            }
+            for row in reader
+        ]
+    except (UnicodeDecodeError, csv.Error) as exc:
+        raise serializers.ValidationError({"file": f"Can't read the CSV file: {exc}"})
+
+
+def validate_rows(rows):
+    """Returns (valid rows as (index, validated data), errors as {'row', 'errors'})"""
+    if not isinstance(rows, list):
+        raise serializers.ValidationError({"products": "Expected a JSON array of products"})
+    if not rows:
+        raise serializers.ValidationError({"products": "No products to import"})
+    if len(rows) > max_rows():
+        raise serializers.ValidationError({"products": f"At most {max_rows()} products per import"})
+
+    # One serializer validates every row; nothing in it queries the database
+    serializer = ProductImportSerializer()
+    valid, errors = [], []
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            errors.append({"row": index, "errors": {"non_field_errors": ["Expected an object"]}})
+            continue
+        try:
+            valid.append((index, serializer.run_validation(row)))
+        except serializers.ValidationError as exc:
+            errors.append({"row": index, "errors": exc.detail})
+    return valid, errors
+
+
+def build_product(seller, data):
+    product = Product(seller=seller, is_active=True, **data)
+    if product.has_coordinates():
+        product.geohash = encode_geohash(product.latitude, product.longitude)
+    return product
+
+
+@transaction.atomic
+def create_products(seller, rows, chunk_size=CHUNK_SIZE):
+    """Insert validated rows for `seller`; returns the created products"""
+    if not rows:
+        return []
+    created = []
+    for start in range(0, len(rows), chunk_size):
+        chunk = [build_product(seller, data) for data in rows[start:start + chunk_size]]
+        created += Product.objects.bulk_create(chunk)
+
+    COUNTERS['active_listings_count'].adjust(seller.pk, len(created))
+    invalidate_model(Product.__name__)
+    if not seller.profile.is_marketplace_seller:
+        enqueue(mark_marketplace_seller, profile_id=seller.profile.pk)
+    return created
+
+
+def import_products(seller, rows, dry_run=False):
+    """Validate `rows` and, unless `dry_run` or any of them is invalid, insert them all"""
+    valid, errors = validate_rows(rows)
+    created = [] if dry_run or errors else create_products(seller, [data for _, data in valid])
+    return {
+        "received": len(rows),
+        "valid": len(valid),
+        "created": len(created),
+        "ids": [product.pk for product in created],
+        "errors": errors,
+    }
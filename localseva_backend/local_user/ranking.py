@@ -0,0 +1,139 @@
+"""
+Provider ranking score.
+
+Each provider's `ranking_score` blends, in one number stored on the profile:
+
+- the Bayesian average rating: the reviews averaged together with
+  RANKING_PRIOR_WEIGHT imaginary reviews of RANKING_PRIOR_RATING, so one
+  5-star review counts for little and hundreds of reviews for a lot;
+- review volume and completed bookings, on a log scale;
+- recency: up to RANKING_RECENCY_WEIGHT points for the provider's latest
+  completed booking, halved when it is RANKING_RECENCY_DAYS old, a third
+  at twice that, and so on. Bounded, so it can tip the balance between
+  similar providers but never outweighs the reviews; nothing for
+  providers who haven't completed a booking yet.
+
+The score is recomputed for a single provider, in the database, whenever
+their reviews or completed bookings change (`connect_ranking`), right
+after the counter caches it is computed from (counters.py). It is copied
+to the provider's `ProviderCategory` rows, whose (category, score) index
+serves the per-category leaderboards. Recency depends on the date, so
+`refresh_rankings` recomputes everything once a day (and after a change of
+the weights) to let idle providers' scores decay.
+"""
+from django.conf import settings
+from django.db.models import F, FloatField, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Extract, Ln
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.utils import timezone
+
+DEFAULTS = {
+    'RANKING_PRIOR_RATING': 3.5,
+    'RANKING_PRIOR_WEIGHT': 10,
+    'RANKING_REVIEW_WEIGHT': 0.25,
+    'RANKING_BOOKING_WEIGHT': 0.25,
+    'RANKING_RECENCY_WEIGHT': 1.0,
+    'RANKING_RECENCY_DAYS': 90,
+}
+
+
+def weight(name):
+    return float(getattr(settings, name, DEFAULTS[name]))
+
+
+def score_expression():
+    """The ranking score of each profile row as of now, from its own columns and its latest completed booking"""
+    from .models import Booking
+
+    prior_rating, prior_weight = weight('RANKING_PRIOR_RATING'), weight('RANKING_PRIOR_WEIGHT')
+    rating = (Value(prior_rating * prior_weight) + F('rating_sum')) / (Value(prior_weight) + F('rating_count'))
+    volume = Value(weight('RANKING_REVIEW_WEIGHT')) * Ln(F('rating_count') + 1)
+    bookings = Value(weight('RANKING_BOOKING_WEIGHT')) * Ln(F('completed_bookings_count') + 1)
+
+    # Not after now, so the age is never negative
+    now = timezone.now()
+    last_completed = Booking.objects.filter(
+        service_provider=OuterRef('pk'), status='COMPLETED', completed_at__lte=now
+    ).order_by().values('service_provider').annotate(last=Max('completed_at')).values('last')[:1]
+    age_days = (
+        Value(now.timestamp()) - Extract(Subquery(last_completed), 'epoch', output_field=FloatField())
+    ) / Value(86400.0)
+    # NULL without a completed booking
+    recency = Coalesce(
+        Value(weight('RANKING_RECENCY_WEIGHT')) / (Value(1.0) + age_days / Value(weight('RANKING_RECENCY_DAYS'))),
+        Value(0.0),
+    )
+    return rating + volume + bookings + recency
+
+
+def update_scores(profiles):
+    """Recompute the score of the `profiles` queryset and copy it to their categories"""
+    from .models import Profile, ProviderCategory
+
+    profiles.update(ranking_score=score_expression())
+    ProviderCategory.objects.filter(profile__in=profiles.values('pk')).update(
+        ranking_score=Subquery(Profile.objects.filter(pk=OuterRef('profile_id')).values('ranking_score')[:1])
+    )
+
+
+def refresh_ranking(*profile_ids):
+    from .models import Profile
+
+    profile_ids = [pk for pk in profile_ids if pk is not None]
+    if profile_ids:
+        update_scores(Profile.objects.filter(pk__in=profile_ids))
+
+
+def refresh_rankings(batch_size=1000):
+    """Recompute every provider's score, in batches; returns how many were updated"""
+    from .models import Profile
+
+    updated = 0
+    last_pk = 0
+    while True:
+        pks = list(Profile.objects.filter(role='SERVICE', pk__gt=last_pk).order_by('pk')
+                   .values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return updated
+        last_pk = pks[-1]
+        update_scores(Profile.objects.filter(pk__in=pks))
+        updated += len(pks)
+
+
+# Signal handlers, connected after the counter caches so they see the new counts
+
+def on_review_change(sender, instance, **kwargs):
+    refresh_ranking(instance.provider_id)
+
+
+def on_booking_change(sender, instance, **kwargs):
+    # Only completed bookings count; one leaving COMPLETED isn't a transition
+    # the state machine allows
+    if instance.status == 'COMPLETED':
+        refresh_ranking(instance.service_provider_id)
+
+
+def on_category_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action != 'post_add':
+        return
+    if reverse:
+        refresh_ranking(*pk_set)
+    else:
+        refresh_ranking(instance.pk)
+
+
+def on_provider_category_save(sender, instance, created, **kwargs):
+    if created:
+        refresh_ranking(instance.profile_id)
+
+
+def connect_ranking():
+    from .models import Booking, Profile, ProviderCategory, Review
+
+    post_save.connect(on_review_change, sender=Review, dispatch_uid='ranking_review_save')
+    post_delete.connect(on_review_change, sender=Review, dispatch_uid='ranking_review_delete')
+    post_save.connect(on_booking_change, sender=Booking, dispatch_uid='ranking_booking_save')
+    post_delete.connect(on_booking_change, sender=Booking, dispatch_uid='ranking_booking_delete')
+    m2m_changed.connect(on_category_change, sender=Profile.service_categories.through,
+                        dispatch_uid='ranking_categories')
+    post_save.connect(on_provider_category_save, sender=ProviderCategory, dispatch_uid='ranking_category_save')
@@ -0,0 +1,223 @@
+"""
+Response cache for the public, read-heavy listing endpoints.
+
+Entries are keyed on the namespace's current *generation*, the host, the
+path and the normalized query string. Invalidation doesn't delete anything:
+signal handlers bump the generation of every namespace that depends on the
+changed model (see `DEPENDENCIES` and signals.py), so all old keys become
+unreachable at once and simply expire.
+
+A miss is recomputed by one request at a time per key (single-flight): the
+first request takes a short lock with `cache.add()` and the others wait for
+its result instead of all hitting the database together.
+
+Works with any Django cache backend, including local memory and file based.
+"""
+import asyncio
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+KEY_PREFIX = 'response-cache'
+
+# Namespace -> models whose changes make its cached responses stale
+DEPENDENCIES = {
+    # Provider cards show rating (reviews), completed_bookings_count and the
+    # availability slots; bookings also decide ?available_from= results
+    'providers': ['Profile', 'Review', 'Booking', 'AvailabilitySlot'],
+    # Ranking scores move with reviews and completed bookings (ranking.py)
+    'top-providers': ['Profile', 'Review', 'Booking', 'AvailabilitySlot'],
+    # Listings show comment_count and the seller's profile
+    'marketplace': ['Product', 'Profile', 'ProductComment'],
+    'provider-reviews': ['Review', 'Profile'],
+}
+
+# Headers worth keeping with the cached body (pagination cursors)
+CACHED_HEADERS = ('Link',)
+
+
+def _generation_key(namespace):
+    return f'{KEY_PREFIX}:{namespace}:generation'
+
+
+def get_generation(namespace):
+    generation = cache.get(_generation_key(namespace))
+    if generation is None:
+        # Start from the clock, so a generation key that was evicted can't
+        # come back with a number that old entries were stored under
+        cache.add(_generation_key(namespace), time.time_ns(), None)
+        generation = cache.get(_generation_key(namespace), 0)
+    return generation
+
+
+async def aget_generation(namespace):
+    generation = await cache.aget(_generation_key(namespace))
+    if generation is None:
+        await cache.aadd(_generation_key(namespace), time.time_ns(), None)
+        generation = await cache.aget(_generation_key(namespace), 0)
+    return generation
+
+
+def bump_generation(namespace):
+    try:
+        cache.incr(_generation_key(namespace))
+    except ValueError:
+        cache.add(_generation_key(namespace), time.time_ns(), None)
+
+
+def invalidate_model(model_name):
+    """Invalidate every namespace that depends on `model_name`, after commit"""
+    namespaces = [ns for ns, models in DEPENDENCIES.items() if model_name in models]
+
+    def bump():
+        for namespace in namespaces:
+            bump_generation(namespace)
+
+    # Bumping before commit would let a concurrent request cache the old rows
+    # under the new generation
+    transaction.on_commit(bump)
+
+
+def normalize_query(query_params):
+    """Sorted, empty-values-dropped query string, so ?a=1&b=2 and ?b=2&a=1 share an entry"""
+    items = sorted(
+        (key, value)
+        for key, values in query_params.lists()
+        for value in values if value != ''
+    )
+    return urlencode(items)
+
+
+def _request_digest(request):
+    raw = f'{request.get_host()}{request.path}?{normalize_query(request.query_params)}'
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def cache_key(namespace, request):
+    return f'{KEY_PREFIX}:{namespace}:{get_generation(namespace)}:{_request_digest(request)}'
+
+
+async def acache_key(namespace, request):
+    return f'{KEY_PREFIX}:{namespace}:{await aget_generation(namespace)}:{_request_digest(request)}'
+
+
+def make_entry(response):
+    """(data, headers) to cache for a response, or None if it shouldn't be cached"""
+    if response.status_code != 200:
+        return None
+    return (
+        list(response.data) if isinstance(response.data, list) else dict(response.data),
+        {name: response[name] for name in CACHED_HEADERS if response.has_header(name)},
+    )
+
+
+def entry_response(entry, hit):
+    data, headers = entry
+    response = Response(data, headers=headers)
+    response['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response
+
+
+class SingleFlight:
+    """
+    Lock around recomputing one cache entry. Waiters poll for the entry
+    instead of stampeding the database, but never longer than the lock lives.
+    """
+    lock_timeout = 10
+    poll_interval = 0.05
+
+    def __init__(self, key, timeout):
+        self.key = key
+        self.lock_key = f'{key}:lock'
+        self.timeout = timeout
+
+    def get_or_compute(self, compute):
+        """Return (entry, None), or (None, response) when the response isn't cacheable"""
+        deadline = time.monotonic() + self.lock_timeout
+        locked = cache.add(self.lock_key, 1, self.lock_timeout)
+        while not locked:
+            time.sleep(self.poll_interval)
+            entry = cache.get(self.key)
+            if entry is not None:
+                return entry, None
+            if time.monotonic() >= deadline:
+                break
+            locked = cache.add(self.lock_key, 1, self.lock_timeout)
+
+        try:
+            response = compute()
+            entry = make_entry(response)
+            if entry is None:
+                return None, response
+            cache.set(self.key, entry, self.timeout)
+            return entry, None
+        finally:
+            if locked:
+                cache.delete(self.lock_key)
+
+    async def aget_or_compute(self, compute):
+        """get_or_compute() for async views; `compute` is a coroutine function"""
+        deadline = time.monotonic() + self.lock_timeout
+        locked = await cache.aadd(self.lock_key, 1, self.lock_timeout)
+        while not locked:
+            await asyncio.sleep(self.poll_interval)
+            entry = await cache.aget(self.key)
+            if entry is not None:
+                return entry, None
+            if time.monotonic() >= deadline:
+                break
+            locked = await cache.aadd(self.lock_key, 1, self.lock_timeout)
+
+        try:
+            response = await compute()
+            entry = make_entry(response)
+            if entry is None:
+                return None, response
+            await cache.aset(self.key, entry, self.timeout)
+            return entry, None
+        finally:
+            if locked:
+                await cache.adelete(self.lock_key)
+
+
+def get_cache_timeout():
+    return getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 60)
+
+
+class CachedResponseMixin:
+    """
+    Cache successful GET list responses of a view.
+
+    Set `cache_namespace` to one of `DEPENDENCIES`; only use it on views
+    whose output doesn't depend on who is asking.
+    """
+    cache_namespace = None
+    cache_timeout = None
+
+    def get_cache_timeout(self):
+        if self.cache_timeout is not None:
+            return self.cache_timeout
+        return get_cache_timeout()
+
+    def list(self, request, *args, **kwargs):
+        timeout = self.get_cache_timeout()
+        if request.method != 'GET' or not timeout:
+            return super().list(request, *args, **kwargs)
+
+        key = cache_key(self.cache_namespace, request)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry_response(entry, hit=True)
+
+        entry, response = SingleFlight(key, timeout).get_or_compute(
+            lambda: super(CachedResponseMixin, self).list(request, *args, **kwargs)
+        )
+        if entry is None:
+            # Not cacheable (error status) - return it as is
+            return response
+        return entry_response(entry, hit=False)
@@ -0,0 +1,199 @@
+import math
+import re
+
+from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, TrigramSimilarity, TrigramWordSimilarity
+)
+from django.db import DatabaseError, connections
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast, Greatest
+from rest_framework.filters import BaseFilterBackend, SearchFilter
+
+# Quoted phrases, or single terms with an optional trailing '*' (prefix
+# match). A '-' at the start of a word excludes it; inside a word ("wi-fi")
+# it is just a separator.
+QUERY_TOKEN_RE = re.compile(r'(?:(?<!\S)(-))?"([^"]+)"|(?:(?<!\S)(-))?(\w+)(\*?)')
+
+
+def parse_search_query(text, config='english'):
+    """
+    Turn user input into a tsquery, supporting:
+
+        sofa wooden       -> both terms (AND)
+        "leather sofa"    -> exact phrase
+        sof*              -> prefix match
+        -broken           -> exclude term
+
+    Terms are re-extracted with a whitelist regex, so nothing the user types
+    reaches to_tsquery() unescaped.
+    """
+    query = None
+    for negate_phrase, phrase, negate_term, term, prefix in QUERY_TOKEN_RE.findall(text):
+        if phrase:
+            words = re.findall(r'\w+', phrase)
+            if not words:
+                continue
+            part = SearchQuery(' '.join(words), search_type='phrase', config=config)
+            negate = negate_phrase
+        elif prefix:
+            part = SearchQuery(f'{term}:*', search_type='raw', config=config)
+            negate = negate_term
+        else:
+            part = SearchQuery(term, search_type='plain', config=config)
+            negate = negate_term
+
+        if negate:
+            part = ~part
+        query = part if query is None else query & part
+    return query
+
+
+class ProductSearchFilter(BaseFilterBackend):
+    """
+    Full-text search over Product.search_vector (title weighted A,
+    description B, seller username C), backed by a GIN index.
+
+    Matching rows are annotated with `search_rank` (ts_rank) and, unless the
+    client asked for an explicit `?ordering=`, returned best match first.
+    """
+    search_param = 'search'
+    ordering_param = 'ordering'
+    search_config = 'english'
+
+    def get_search_query(self, request):
+        text = request.query_params.get(self.search_param, '')
+        return parse_search_query(text, config=self.search_config) if text.strip() else None
+
+    def filter_queryset(self, request, queryset, view):
+        query = self.get_search_query(request)
+        if query is None:
+            return queryset
+        # ts_rank() returns real; cast so the value survives the keyset cursor
+        # round trip exactly
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=Cast(SearchRank(F('search_vector'), query), FloatField())
+        )
+
+    def get_ordering(self, request, queryset, view):
+        if request.query_params.get(self.ordering_param):
+            return None
+        if self.get_search_query(request) is None:
+            return None
+        return ['-search_rank']
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.search_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Full-text search. Supports "phrases", prefix* and -exclusions.',
+            'schema': {'type': 'string'},
+        }]
+
+
+def set_similarity_threshold(threshold, using='default'):
+    """
+    Set the pg_trgm thresholds used by the `%` / `%>` operators for this
+    connection. Filtering through the operators (rather than comparing
+    similarity() > x) is what lets PostgreSQL use the trigram GIN indexes.
+
+    The setting lasts for the session, as the queryset runs later, outside
+    any transaction; `reset_similarity_thresholds()` puts it back when the
+    request finishes, so a persistent connection doesn't carry it over.
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT set_config('pg_trgm.similarity_threshold', %s, false), "
+            "set_config('pg_trgm.word_similarity_threshold', %s, false)",
+            [str(threshold), str(threshold)]
+        )
+    connection.similarity_threshold_set = True
+
+
+def reset_similarity_thresholds():
+    """Undo set_similarity_threshold() on every connection it was used on"""
+    for connection in connections.all(initialized_only=True):
+        if not getattr(connection, 'similarity_threshold_set', False):
+            continue
+        connection.similarity_threshold_set = False
+        if connection.connection is None:
+            # Already closed; a new session starts from the defaults
+            continue
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("RESET pg_trgm.similarity_threshold")
+                cursor.execute("RESET pg_trgm.word_similarity_threshold")
+        except DatabaseError:
+            # E.g. an aborted transaction: drop the session rather than keep its settings
+            connection.close()
+
+
+def is_fuzzy_search(request):
+    return request.query_params.get(ProviderSearchFilter.mode_param) == 'fuzzy'
+
+
+class ProviderSearchFilter(SearchFilter):
+    """
+    Service provider search.
+
+    By default this is DRF's SearchFilter over `search_fields`. With
+    `?search_mode=fuzzy` it switches to typo-tolerant pg_trgm matching:
+    username and location by trigram similarity, bio and description by
+    word similarity (the best matching part of the text), all served by
+    trigram GIN indexes. Results are annotated with `similarity` and
+    ordered by it unless `?ordering=` is given. `?similarity=0.2` lowers or
+    raises the match threshold (default 0.3).
+    """
+    mode_param = 'search_mode'
+    threshold_param = 'similarity'
+    default_threshold = 0.3
+    min_threshold = 0.05
+
+    def get_threshold(self, request):
+        try:
+            threshold = float(request.query_params.get(self.threshold_param, self.default_threshold))
+        except ValueError:
+            return self.default_threshold
+        if not math.isfinite(threshold):
+            # min()/max() would let NaN through
+            return self.default_threshold
+        return min(max(threshold, self.min_threshold), 1.0)
+
+    def get_search_term(self, request):
+        return request.query_params.get(self.search_param, '').strip()
+
+    def filter_queryset(self, request, queryset, view):
+        if not is_fuzzy_search(request):
+            return super().filter_queryset(request, queryset, view)
+
+        # Also applies to the fuzzy ?location= filter in the view
+        set_similarity_threshold(self.get_threshold(request), using=queryset.db)
+
+        term = self.get_search_term(request)
+        if not term:
+            return queryset
+
+        users = get_user_model().objects.filter(username__trigram_similar=term).values('pk')
+        matches = (
+            Q(user__in=users) |
+            Q(location__trigram_similar=term) |
+            Q(bio__trigram_word_similar=term) |
+            Q(description__trigram_word_similar=term)
+        )
+        similarity = Greatest(
+            TrigramSimilarity('user__username', term),
+            TrigramSimilarity('location', term),
+            TrigramWordSimilarity(term, 'bio'),
+            TrigramWordSimilarity(term, 'description'),
+        )
+        # similarity() returns real; cast so keyset cursors round trip exactly
+        return queryset.filter(matches).annotate(similarity=Cast(similarity, FloatField()))
+
+    def get_ordering(self, request, queryset, view):
+        if request.query_params.get('ordering'):
+            return None
+        if not is_fuzzy_search(request) or not self.get_search_term(request):
+            return None
+        return ['-similarity']
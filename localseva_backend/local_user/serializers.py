@@ -1,12 +1,29 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
-from .models import Profile, Booking, Review, Report, Product, ProductComment
+from .view_counter import product_views
+from .images import validate_upload, variant_url
+from .booking_states import update_booking
+from .availability import booking_period, covered_by_slots
+from .models import (
+    Profile, Booking, Review, Report, Product, ProductComment,
+    ServiceCategory, ServiceArea, AvailabilitySlot, split_terms, term_slug
+)
 from rest_framework.validators import UniqueValidator
 from django.contrib.auth.password_validation import validate_password
 
 User = get_user_model()
 
 
+def validate_coordinates(data, instance=None):
+    """latitude and longitude are only meaningful together"""
+    latitude = data.get('latitude', getattr(instance, 'latitude', None))
+    longitude = data.get('longitude', getattr(instance, 'longitude', None))
+    if (latitude is None) != (longitude is None):
+        raise serializers.ValidationError(
+            {"latitude": "Provide both latitude and longitude, or neither"}
+        )
+
+
 class RegisterSerializer(serializers.ModelSerializer):
     email = serializers.EmailField(
         required=True,
@@ -37,6 +54,60 @@ class RegisterSerializer(serializers.ModelSerializer):
         return user
 
 
+class TaxonomyListField(serializers.Field):
+    """
+    A category / service area many-to-many exposed as a list of names.
+    Accepts a JSON list or a comma separated string; unknown names are added
+    to the catalog.
+    """
+    default_error_messages = {
+        'invalid': 'Expected a list of names or a comma separated string.',
+        'max_length': 'Names must be at most 100 characters.',
+    }
+
+    def __init__(self, model, **kwargs):
+        self.model = model
+        super().__init__(**kwargs)
+
+    def to_representation(self, manager):
+        return [term.name for term in manager.all()]
+
+    def to_internal_value(self, data):
+        if not isinstance(data, (str, list)):
+            self.fail('invalid')
+        names = split_terms(data)
+        if any(len(name) > 100 for name in names):
+            self.fail('max_length')
+        return self.model.objects.resolve(names)
+
+
+class ImageVariantField(serializers.Field):
+    """
+    URL of a resized variant of an image field (see images.py); the
+    original's URL until the variant has been generated.
+    """
+
+    def __init__(self, image_field, variant, **kwargs):
+        self.image_field = image_field
+        self.variant = variant
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        url = variant_url(instance, self.image_field, self.variant)
+        request = self.context.get('request')
+        if url and request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+
+class TaxonomyTermSerializer(serializers.Serializer):
+    name = serializers.CharField()
+    slug = serializers.SlugField()
+    provider_count = serializers.IntegerField()
+
+
 class LoginSerializer(serializers.Serializer):
     username = serializers.CharField()
     password = serializers.CharField(write_only=True)
@@ -46,6 +117,11 @@ class ProfileSerializer(serializers.ModelSerializer):
     email = serializers.EmailField(source='user.email', read_only=True)
     username = serializers.CharField(source='user.username', read_only=True)
     is_service_provider = serializers.BooleanField(source='user.is_service_provider', read_only=True)
+    categories = TaxonomyListField(ServiceCategory, source='service_categories', required=False)
+    service_locations = TaxonomyListField(ServiceArea, source='service_areas', required=False)
+    total_reviews = serializers.IntegerField(source='rating_count', read_only=True)
+    avatar_thumb = ImageVariantField('avatar', 'thumb')
+    avatar_medium = ImageVariantField('avatar', 'medium')
 
     class Meta:
         model = Profile
@@ -54,15 +130,20 @@ class ProfileSerializer(serializers.ModelSerializer):
             "experience_years", "pricing_type", "base_price", "is_available",
             "rating", "total_reviews",'completed_bookings_count', "created_at", "is_service_provider",
             "categories", "availability", "description", "service_locations",
-            "is_marketplace_seller", "marketplace_rating", "marketplace_reviews"
+            "is_marketplace_seller", "marketplace_rating", "marketplace_reviews",
+            "active_listings_count", "latitude", "longitude",
+            "avatar_thumb", "avatar_medium"
         ]
         read_only_fields = [
-            'completed_bookings_count',
+            'completed_bookings_count', 'active_listings_count',
             "rating", "total_reviews", "created_at", "is_service_provider",
             "marketplace_rating", "marketplace_reviews"
         ]
+        extra_kwargs = {'avatar': {'validators': [validate_upload]}}
 
     def validate(self, data):
+        validate_coordinates(data, self.instance)
+
         # If user is trying to become a service provider
         if 'role' in data and data['role'] == 'SERVICE':
             # Check if this is a new service provider (role is changing from USER to SERVICE)
@@ -82,11 +163,37 @@ class ProfileSerializer(serializers.ModelSerializer):
 
         return data
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Query plan for the fields this serializer reads"""
+        return queryset.select_related('user').prefetch_related('service_categories', 'service_areas')
+
 #changes here
+class AvailabilitySlotSerializer(serializers.ModelSerializer):
+    weekday_name = serializers.CharField(source='get_weekday_display', read_only=True)
+
+    class Meta:
+        model = AvailabilitySlot
+        fields = ['weekday', 'weekday_name', 'start_time', 'end_time']
+
+    def validate(self, data):
+        if data['start_time'] >= data['end_time']:
+            raise serializers.ValidationError({"end_time": "A slot must end after it starts"})
+        return data
+
+
 class ServiceProviderSerializer(serializers.ModelSerializer):
     """For listing service providers - uses Profile model"""
     username = serializers.CharField(source='user.username', read_only=True)
     email = serializers.EmailField(source='user.email', read_only=True)
+    categories = TaxonomyListField(ServiceCategory, source='service_categories', read_only=True)
+    service_locations = TaxonomyListField(ServiceArea, source='service_areas', read_only=True)
+    total_reviews = serializers.IntegerField(source='rating_count', read_only=True)
+    avatar_thumb = ImageVariantField('avatar', 'thumb')
+    avatar_medium = ImageVariantField('avatar', 'medium')
+    availability_slots = AvailabilitySlotSerializer(many=True, read_only=True)
+    # Only present with ?near=
+    distance_km = serializers.FloatField(read_only=True)
 
     class Meta:
         model = Profile
@@ -94,10 +201,19 @@ class ServiceProviderSerializer(serializers.ModelSerializer):
             "id", "username", "email", "avatar", "role", "bio", "phone", "location",
             "experience_years", "pricing_type", "base_price", "is_available",
             "rating", "total_reviews", "created_at", "is_service_provider",
-            "categories", "availability", "description", "service_locations",'completed_bookings_count'
+            "categories", "availability", "description", "service_locations",'completed_bookings_count',
+            "latitude", "longitude", "distance_km", "avatar_thumb", "avatar_medium", "availability_slots",
+            "ranking_score"
         ]
         read_only_fields = fields
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Query plan for the fields this serializer reads"""
+        return queryset.select_related('user').prefetch_related(
+            'service_categories', 'service_areas', 'availability_slots'
+        )
+
 
 class BookingSerializer(serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(read_only=True)
@@ -112,16 +228,22 @@ class BookingSerializer(serializers.ModelSerializer):
         model = Booking
         fields = [
             'id', 'user', 'user_name', 'provider_id', 'provider_name',
-            'service_category', 'description', 'address', 'scheduled_date','price_distribution_note',
-            'quote_price', 'final_price', 'status', 'provider_notes', 'user_notes',
+            'service_category', 'description', 'address', 'scheduled_date', 'duration_minutes',
+            'price_distribution_note', 'quote_price', 'final_price', 'status', 'provider_notes', 'user_notes',
             'created_at', 'updated_at', 'quoted_at', 'accepted_at', 'started_at',
-            'completed_at'
+            'completed_at', 'version'
         ]
+        # New bookings start as PENDING; the status only moves through booking_states.py
         read_only_fields = [
             'user', 'user_name', 'provider_name', 'created_at', 'updated_at',
-            'quoted_at', 'accepted_at', 'started_at', 'completed_at'
+            'quoted_at', 'accepted_at', 'started_at', 'completed_at', 'status', 'version'
         ]
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Query plan for the fields this serializer reads"""
+        return queryset.select_related('user', 'service_provider__user')
+
     def validate(self, data):
         from django.utils import timezone
 
@@ -144,17 +266,27 @@ class BookingSerializer(serializers.ModelSerializer):
                 {"service_provider": "Selected user is not a service provider"}
             )
 
+        # Ensure the time is within the provider's availability slots; whether
+        # it is still free is checked when the booking is saved (availability.py)
+        if service_provider and data.get('scheduled_date'):
+            duration = data.get('duration_minutes', Booking._meta.get_field('duration_minutes').default)
+            period = booking_period(data['scheduled_date'], duration)
+            if not covered_by_slots(service_provider, period.lower, period.upper):
+                raise serializers.ValidationError(
+                    {"scheduled_date": "The service provider doesn't take bookings at this time"}
+                )
+
         # Ensure user has selected a category that the provider offers
         if 'service_category' in data and service_provider:
-            # Get provider's categories (stored as JSONField/list)
-            provider_categories = service_provider.categories or []
+            # Provider's categories as {slug: name}
+            provider_categories = dict(service_provider.service_categories.values_list('slug', 'name'))
 
             # If provider has specified categories, validate against them
             if provider_categories:
-                if data['service_category'] not in provider_categories:
+                if term_slug(data['service_category']) not in provider_categories:
                     raise serializers.ValidationError({
                         "service_category": f"Service provider does not offer this category. "
-                                            f"Available categories: {', '.join(provider_categories)}"
+                                            f"Available categories: {', '.join(provider_categories.values())}"
                     })
 
         # Additional validation for service_category if not checking against provider
@@ -168,83 +300,61 @@ class BookingSerializer(serializers.ModelSerializer):
 
 #changes here
 class BookingUpdateSerializer(serializers.ModelSerializer):
-    """Separate serializer for updating bookings (provider gives quote, user accepts, etc.)"""
+    """
+    Separate serializer for updating bookings (provider gives quote, user accepts, etc.).
+    Needs `actor` in the context; status rules and the write are in booking_states.py
+    """
 
     class Meta:
         model = Booking
-        fields = ['quote_price', 'provider_notes', 'status', "final_price","price_distribution_note"]
+        fields = ['quote_price', 'provider_notes', 'status', "final_price", "price_distribution_note",
+                  'user_notes', 'version']
         extra_kwargs = {
             'quote_price': {'required': False},
             'provider_notes': {'required': False},
+            # The version the client last read, to refuse the change if the booking moved on
+            'version': {'required': False},
         }
 
     def validate(self, data):
-        request = self.context.get('request')
-        instance = self.instance
-
-        if not request:
-            return data
-
-        # Provider can only give quote or update status
-        if request.user.profile == instance.service_provider:
-            if 'quote_price' in data:
-                if data['quote_price'] and data['quote_price'] <= 0:
-                    raise serializers.ValidationError(
-                        {"quote_price": "Quote price must be positive"}
-                    )
-                data['status'] = 'QUOTE_GIVEN'
-
-            if 'status' in data and data['status'] in ['REJECTED', 'IN_PROGRESS', 'COMPLETED']:
-                # Validate state transitions
-                if instance.status == 'PENDING' and data['status'] == 'REJECTED':
-                    pass  # Valid
-                elif instance.status == 'ACCEPTED' and data['status'] == 'IN_PROGRESS':
-                    pass  # valid coz user has accepted and provider is working on it.
-                elif instance.status == 'IN_PROGRESS' and data['status'] == 'COMPLETED':
-                    pass  # Valid
-                else:
-                    raise serializers.ValidationError(
-                        {"status": f"Cannot change status from {instance.status} to {data['status']}"}
-                    )
-
-        # User can accept or reject quote
-        if request.user == instance.user:
-            if 'status' in data and data['status'] in ['ACCEPTED', 'REJECTED']:
-                if instance.status != 'QUOTE_GIVEN':
-                    raise serializers.ValidationError(
-                        {"status": "Can only accept or reject a booking that has a quote"}
-                    )
-                if data['status'] == 'ACCEPTED' and not instance.quote_price:
-                    raise serializers.ValidationError(
-                        {"status": "Cannot accept booking without a quote price"}
-                    )
-                # For REJECTED, no additional validation needed
-
+        if 'quote_price' in data:
+            if data['quote_price'] is not None and data['quote_price'] <= 0:
+                raise serializers.ValidationError(
+                    {"quote_price": "Quote price must be positive"}
+                )
+            # Giving a price is giving a quote
+            data['status'] = 'QUOTE_GIVEN'
         return data
 
     def update(self, instance, validated_data):
-        from django.utils import timezone
+        return update_booking(instance, self.context['actor'], **validated_data)
 
-        # Update timestamps based on status changes
-        if 'status' in validated_data:
-            if validated_data['status'] == 'QUOTE_GIVEN' and not instance.quoted_at:
-                instance.quoted_at = timezone.now()
-            elif validated_data['status'] == 'ACCEPTED' and not instance.accepted_at:
-                instance.accepted_at = timezone.now()
-            elif validated_data['status'] == 'IN_PROGRESS' and not instance.started_at:
-                instance.started_at = timezone.now()
-            elif validated_data['status'] == 'COMPLETED' and not instance.completed_at:
-                instance.completed_at = timezone.now()
-                if 'final_price' in validated_data:
-                    print(validated_data['final_price'])
-                    instance.final_price = validated_data['final_price']
-                else:
-                    instance.final_price = instance.quote_price #Default final price same as quote
-                if validated_data['price_distribution_note']:
-                    instance.price_distribution_note = validated_data['price_distribution_note']
 
+class BookingTransitionSerializer(serializers.Serializer):
+    """One item of a provider's bulk booking update (see booking_bulk.py)"""
+    id = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=['QUOTE_GIVEN', 'REJECTED', 'IN_PROGRESS', 'COMPLETED'],
+                                     required=False)
+    quote_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    final_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    provider_notes = serializers.CharField(required=False, allow_blank=True)
+    price_distribution_note = serializers.CharField(required=False, allow_blank=True)
 
-        return super().update(instance, validated_data)
+    def validate(self, data):
+        if 'quote_price' in data:
+            if data['quote_price'] <= 0:
+                raise serializers.ValidationError({"quote_price": "Quote price must be positive"})
+            if data.setdefault('status', 'QUOTE_GIVEN') != 'QUOTE_GIVEN':
+                raise serializers.ValidationError({"quote_price": "A quote can't change the status to anything else"})
+        elif data.get('status') == 'QUOTE_GIVEN':
+            raise serializers.ValidationError({"quote_price": "A quote needs a price"})
+        if 'status' not in data:
+            raise serializers.ValidationError({"status": "Give a status or a quote_price"})
+        if data['status'] != 'COMPLETED':
+            for field in ('final_price', 'price_distribution_note'):
+                if field in data:
+                    raise serializers.ValidationError({field: "Only set when completing a booking"})
+        return data
 
 
 class ReviewSerializer(serializers.ModelSerializer):
@@ -263,6 +373,11 @@ class ReviewSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['user', 'user_name', 'provider_name', 'created_at']
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Query plan for the fields this serializer reads"""
+        return queryset.select_related('user', 'provider__user')
+
     def validate(self, data):
         # Ensure booking is completed before reviewing
         booking = data.get('booking')
@@ -310,6 +425,12 @@ class ReportSerializer(serializers.ModelSerializer):
             'reporter', 'reporter_name', 'reported_user_name', 'status',
             'admin_notes', 'created_at', 'resolved_at'
         ]
+        extra_kwargs = {'evidence_image': {'validators': [validate_upload]}}
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Query plan for the fields this serializer reads"""
+        return queryset.select_related('reporter', 'reported_user')
 
     def validate(self, data):
         request = self.context.get('request')
@@ -336,8 +457,12 @@ class ProductSerializer(serializers.ModelSerializer):
     seller_name = serializers.CharField(source='seller.username', read_only=True)
     seller_avatar = serializers.ImageField(source='seller.profile.avatar', read_only=True)
     seller_rating = serializers.FloatField(source='seller.profile.marketplace_rating', read_only=True)
-    comment_count = serializers.SerializerMethodField()
     email = serializers.EmailField(source='product.seller.email', read_only=True)
+    views = serializers.SerializerMethodField()
+    thumb = ImageVariantField('main_image', 'thumb')
+    medium = ImageVariantField('main_image', 'medium')
+    # Only present with ?near=
+    distance_km = serializers.FloatField(read_only=True)
 
     class Meta:
         model = Product
@@ -347,15 +472,43 @@ class ProductSerializer(serializers.ModelSerializer):
             'address', 'city', 'main_image', 'image_2', 'image_3',
             'contact_phone', 'contact_whatsapp', 'contact_email',
             'is_sold', 'is_active', 'created_at', 'updated_at', 'views',
-            'comment_count'
+            'comment_count', 'latitude', 'longitude', 'distance_km',
+            'thumb', 'medium'
         ]
         read_only_fields = [
             'seller', 'seller_name', 'seller_avatar', 'seller_rating',
             'created_at', 'updated_at', 'views', 'comment_count','email'
         ]
+        extra_kwargs = {field: {'validators': [validate_upload]} for field in ('main_image', 'image_2', 'image_3')}
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Query plan for the fields this serializer reads"""
+        return queryset.select_related('seller__profile').defer('search_vector')
+
+    def validate(self, data):
+        validate_coordinates(data, self.instance)
+        return data
+
+    def get_views(self, obj):
+        # Stored count plus this process's not yet flushed views
+        return obj.views + product_views.pending(obj.pk)
+
+
+class ProductImportSerializer(serializers.ModelSerializer):
+    """One row of a bulk product import (see product_import.py) - no images"""
+
+    class Meta:
+        model = Product
+        fields = [
+            'title', 'description', 'category', 'condition', 'price',
+            'address', 'city', 'contact_phone', 'contact_whatsapp', 'contact_email',
+            'is_sold', 'latitude', 'longitude'
+        ]
 
-    def get_comment_count(self, obj):
-        return obj.comments.filter(is_visible=True).count()
+    def validate(self, data):
+        validate_coordinates(data)
+        return data
 
 
 class ProductCommentSerializer(serializers.ModelSerializer):
@@ -368,4 +521,9 @@ class ProductCommentSerializer(serializers.ModelSerializer):
             'id', 'product', 'user', 'user_name', 'user_avatar',
             'comment', 'contact_info', 'is_visible', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['user', 'user_name', 'user_avatar', 'created_at', 'updated_at']
\ No newline at end of file
+        read_only_fields = ['user', 'user_name', 'user_avatar', 'created_at', 'updated_at']
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Query plan for the fields this serializer reads"""
+        return queryset.select_related('user__profile')
@@ -1,8 +1,101 @@
-from django.db.models.signals import post_save
+from django.core.cache import cache
+from django.core.signals import request_finished
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
-from .models import UserModel, Profile
+from .models import (
+    UserModel, Profile, Booking, Review, Report, Product, ProductComment, ServiceCategory, ServiceArea,
+    AvailabilitySlot, ProviderCategory
+)
+from .authentication import revoke_user_tokens
+from .images import schedule_variants
+from .metrics import request_metrics
+from .response_cache import invalidate_model
+from .search import reset_similarity_thresholds
+from .view_counter import product_views
 
 @receiver(post_save, sender=UserModel)
 def create_profile(sender, instance, created, **kwargs):
     if created:
         Profile.objects.create(user=instance)
+
+
+# Issued tokens stay valid until revoked (see authentication.py)
+@receiver(post_save, sender=UserModel)
+def revoke_tokens_on_credentials_change(sender, instance, created, update_fields, **kwargs):
+    if created:
+        return
+    password_changed = instance._password is not None
+    deactivated = (update_fields is None or 'is_active' in update_fields) and not instance.is_active
+    if password_changed or deactivated:
+        revoke_user_tokens(instance)
+
+
+# Profile.service_categories.through is ProviderCategory; rows saved on
+# their own (admin inline) send post_save/post_delete instead of m2m_changed
+@receiver(m2m_changed, sender=Profile.service_categories.through)
+@receiver(post_save, sender=ProviderCategory)
+@receiver(post_delete, sender=ProviderCategory)
+@receiver(post_save, sender=ServiceCategory)
+@receiver(post_delete, sender=ServiceCategory)
+def invalidate_category_catalog(sender, **kwargs):
+    cache.delete(ServiceCategory.catalog_cache_key())
+
+
+@receiver(m2m_changed, sender=Profile.service_areas.through)
+@receiver(post_save, sender=ServiceArea)
+@receiver(post_delete, sender=ServiceArea)
+def invalidate_area_catalog(sender, **kwargs):
+    cache.delete(ServiceArea.catalog_cache_key())
+
+
+# Cached listing responses (see response_cache.DEPENDENCIES)
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+@receiver(post_save, sender=ProductComment)
+@receiver(post_delete, sender=ProductComment)
+@receiver(post_save, sender=AvailabilitySlot)
+@receiver(post_delete, sender=AvailabilitySlot)
+def invalidate_response_cache(sender, **kwargs):
+    invalidate_model(sender.__name__)
+
+
+@receiver(m2m_changed, sender=Profile.service_categories.through)
+@receiver(m2m_changed, sender=Profile.service_areas.through)
+def invalidate_provider_taxonomy_cache(sender, action, **kwargs):
+    if action.startswith('post_'):
+        invalidate_model(Profile.__name__)
+
+
+@receiver(post_save, sender=ProviderCategory)
+@receiver(post_delete, sender=ProviderCategory)
+def invalidate_provider_category_cache(sender, **kwargs):
+    invalidate_model(Profile.__name__)
+
+
+# Resized image variants, generated after commit (see images.py)
+@receiver(post_save, sender=Profile)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Report)
+def generate_image_variants(sender, instance, **kwargs):
+    schedule_variants(instance)
+
+
+@receiver(request_finished)
+def flush_product_views(sender, **kwargs):
+    product_views.flush_if_due()
+
+
+@receiver(request_finished)
+def flush_request_metrics(sender, **kwargs):
+    request_metrics.flush_if_due()
+
+
+@receiver(request_finished)
+def reset_search_thresholds(sender, **kwargs):
+    reset_similarity_thresholds()
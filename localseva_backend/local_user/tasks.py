@@ -0,0 +1,14 @@
+"""Background tasks run by the job queue (see jobs.py)"""
+from .jobs import task
+from .models import Profile
+from .response_cache import invalidate_model
+
+
+@task
+def mark_marketplace_seller(profile_id):
+    updated = Profile.objects.filter(pk=profile_id, is_marketplace_seller=False).update(
+        is_marketplace_seller=True
+    )
+    if updated:
+        # update() sends no post_save
+        invalidate_model(Profile.__name__)
@@ -1,3 +1,1794 @@
-from django.test import TestCase
+import base64
+import importlib.util
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import BytesIO
+from unittest import mock, skipUnless
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import F
+from django.test import AsyncClient, AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .async_views import AsyncProductDetailView, AsyncReadView, AsyncServiceProviderListView
+from .authentication import token_for_user
+from .booking_states import PROVIDER, BookingConflict, update_booking
+from .counters import COUNTERS
+from .db_router import PIN_COOKIE, PrimaryReplicaRouter, RoutingState, routing_state
+from .geo import encode_geohash
+from .images import get_storage, variant_name
+from .jobs import claim, enqueue, run_job, run_pending, task
+from .metrics import request_metrics
+from .models import (
+    AvailabilitySlot, Booking, BookingInterval, Job, Product, ProductComment, Profile, ProviderCategory, Report,
+    Review, ServiceArea, ServiceCategory, UserModel, split_terms
+)
+from .pagination import KeysetPagination
+from .ranking import refresh_rankings
+from .search import ProviderSearchFilter, parse_search_query
+from .throttling import LoadSheddingMiddleware, store
+from .view_counter import ViewCounter, product_views
+
+REPLICAS = getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def separate_test_replica():
+    return bool(REPLICAS) and not settings.DATABASES[REPLICAS[0]]['TEST'].get('MIRROR')
+
+
+def asgi_urlconf():
+    """local_user.urls as loaded under ASGI (asgi.py), with the native async read views"""
+    spec = importlib.util.find_spec('local_user.urls')
+    urlconf = importlib.util.module_from_spec(spec)
+    with override_settings(ASYNC_READ_VIEWS=True):
+        spec.loader.exec_module(urlconf)
+    return urlconf
+
+
+ASGI_URLCONF = asgi_urlconf()
+
+
+class ASGIClient:
+    """AsyncClient for sync tests: requests go through the ASGI handler and async middleware"""
+
+    def __init__(self, headers=None):
+        self.client = AsyncClient()
+        # AsyncClient(headers=...) doesn't reach the ASGI scope; pass them per request
+        self.headers = headers
+
+    def get(self, path, data=None):
+        return async_to_sync(self.client.get)(path, data, headers=self.headers)
+
+    def post(self, path, data=None):
+        return async_to_sync(self.client.post)(path, data, headers=self.headers)
+
+
+# Needs a replica with its own test database, e.g. against one local Postgres:
+#   DB_REPLICA_HOSTS=localhost DB_REPLICA_TEST_SEPARATE=True python manage.py test local_user
+@skipUnless(separate_test_replica(), "Set DB_REPLICA_HOSTS and DB_REPLICA_TEST_SEPARATE=True")
+@override_settings(RESPONSE_CACHE_TIMEOUT=0, DATABASE_REPLICAS=REPLICAS[:1])
+class PrimaryReplicaRoutingTests(TransactionTestCase):
+    # Not TestCase: reads inside its per-test transaction always go to the primary
+    databases = {'default', *REPLICAS}
+
+    def setUp(self):
+        self.replica = REPLICAS[0]
+        self.seller = UserModel.objects.create_user(username='seller', email='seller@example.com', password='x')
+        self.buyer = UserModel.objects.create_user(username='buyer', email='buyer@example.com', password='x')
+        # Same rows on the replica, except the product title, so each response shows
+        # which database it was read from. bulk_create sends no signals to the primary
+        UserModel.objects.using(self.replica).bulk_create(UserModel.objects.all())
+        Profile.objects.using(self.replica).bulk_create(Profile.objects.all())
+        product = Product(seller=self.seller, title='Primary sofa', description='Sofa',
+                          category='FURNITURE', price=100, address='1 Street', city='Pune',
+                          contact_phone='9999999999')
+        self.product = Product.objects.bulk_create([product])[0]
+        product.title = 'Replica sofa'
+        Product.objects.using(self.replica).bulk_create([product])
+        # Pins are kept in the cache
+        cache.clear()
+
+    def client_for(self, user=None):
+        client = APIClient()
+        if user is not None:
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        return client
+
+    def title(self, client):
+        response = client.get(f'/marketplace/{self.product.pk}/')
+        self.assertEqual(response.status_code, 200)
+        return response.data['title']
+
+    def comment(self, client):
+        response = client.post('/marketplace/comments/create/', {'product': self.product.pk, 'comment': 'Hi'})
+        self.assertEqual(response.status_code, 201)
+        return response
+
+    def test_safe_requests_read_from_the_replica(self):
+        self.assertEqual(self.title(self.client_for()), 'Replica sofa')
+        response = self.client_for().get('/marketplace/')
+        self.assertEqual([product['title'] for product in response.data], ['Replica sofa'])
+
+    def test_writer_reads_from_the_primary_with_the_cookie(self):
+        client = self.client_for(self.buyer)
+        response = self.comment(client)
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], settings.DB_PRIMARY_PIN_SECONDS)
+        self.assertEqual(self.title(client), 'Primary sofa')
+
+    def test_writer_reads_from_the_primary_without_cookies(self):
+        self.comment(self.client_for(self.buyer))
+        # A new client with the same user's token, e.g. another app instance
+        self.assertEqual(self.title(self.client_for(self.buyer)), 'Primary sofa')
+        # Other users aren't affected
+        self.assertEqual(self.title(self.client_for(self.seller)), 'Replica sofa')
+
+    @override_settings(DB_PRIMARY_PIN_SECONDS=0)
+    def test_no_pin_without_a_window(self):
+        client = self.client_for(self.buyer)
+        self.assertNotIn(PIN_COOKIE, self.comment(client).cookies)
+        self.assertEqual(self.title(client), 'Replica sofa')
+
+    def test_reads_after_a_write_in_the_same_request_use_the_primary(self):
+        router = PrimaryReplicaRouter()
+        token = routing_state.set(RoutingState(use_replica=True))
+        try:
+            self.assertEqual(router.db_for_read(Product), self.replica)
+            self.assertEqual(router.db_for_write(Product), 'default')
+            self.assertEqual(router.db_for_read(Product), 'default')
+        finally:
+            routing_state.reset(token)
+
+    def test_reads_outside_requests_use_the_primary(self):
+        self.assertEqual(Product.objects.get(pk=self.product.pk).title, 'Primary sofa')
+
+
+@skipUnless(separate_test_replica(), "Set DB_REPLICA_HOSTS and DB_REPLICA_TEST_SEPARATE=True")
+@override_settings(ROOT_URLCONF=ASGI_URLCONF)
+class AsyncPrimaryReplicaRoutingTests(PrimaryReplicaRoutingTests):
+    """The same routing under ASGI: async middleware, async views, context copied to ORM threads"""
+
+    def client_for(self, user=None):
+        if user is None:
+            return ASGIClient()
+        return ASGIClient(headers={'Authorization': f'Bearer {AccessToken.for_user(user)}'})
+
+    def test_reads_are_served_by_the_async_views(self):
+        response = self.client_for().get(f'/marketplace/{self.product.pk}/')
+        self.assertIs(response.resolver_match.func.view_class, AsyncProductDetailView)
+
+
+@override_settings(REST_FRAMEWORK={
+    **settings.REST_FRAMEWORK,
+    'DEFAULT_AUTHENTICATION_CLASSES': ['local_user.authentication.StatelessJWTAuthentication'],
+})
+class StatelessJWTAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = UserModel.objects.create_user(username='customer', email='customer@example.com',
+                                                     password='x')
+        cls.provider = UserModel.objects.create_user(username='provider', email='provider@example.com',
+                                                     password='x', is_service_provider=True)
+        Profile.objects.filter(user=cls.provider).update(role='SERVICE')
+        Booking.objects.create(user=cls.customer, service_provider=cls.provider.profile,
+                               service_category='Plumbing', description='Leak', address='1 Street',
+                               scheduled_date='2026-11-01T10:00:00Z')
+
+    def setUp(self):
+        # The denylist is cached
+        cache.clear()
+
+    def client_for(self, user, issued_ago=0):
+        token = token_for_user(user).access_token
+        token['auth_time'] -= issued_ago
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return client
+
+    def bookings(self, client, query=''):
+        response = client.get(f'/bookings/{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_user_and_profile_come_from_the_token(self):
+        client = self.client_for(self.provider)
+        self.bookings(client)  # loads the (empty) denylist into the cache
+        # Only the bookings query: no user lookup and no profile lookup
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.bookings(client, '?type=provider')), 1)
+
+    def test_other_fields_load_in_one_query(self):
+        self.client_for(self.customer).get('/bookings/')
+        user = self.client_for(self.customer).get('/bookings/').wsgi_request.user
+        with self.assertNumQueries(1):
+            self.assertEqual((user.username, user.email), ('customer', 'customer@example.com'))
+
+    def test_logout_revokes_the_token(self):
+        client = self.client_for(self.customer)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(client.post('/logout/').status_code, 200)
+        self.assertEqual(client.get('/bookings/').status_code, 401)
+        # Other tokens of the user still work
+        self.bookings(self.client_for(self.customer))
+
+    def test_password_change_revokes_issued_tokens(self):
+        client = self.client_for(self.customer, issued_ago=60)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customer.set_password('changed')
+            self.customer.save()
+        self.assertEqual(client.get('/bookings/').status_code, 401)
+        # Logging in again works
+        self.bookings(self.client_for(self.customer))
+
+    def test_role_change_is_seen_by_issued_tokens(self):
+        client = self.client_for(self.customer)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(client.post('/profile/become-provider/').status_code, 200)
+        self.customer.profile.role = 'SERVICE'
+        self.customer.profile.save()
+        self.customer.bookings_made.update(service_provider=self.customer.profile)
+        # The token still says "not a provider"; the user is loaded from the database instead
+        self.assertEqual(len(self.bookings(client, '?type=provider')), 1)
+
+
+class ThrottlingTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(THROTTLE_STORE=f'{directory.name}/throttle.sqlite3',
+                                              RESPONSE_CACHE_TIMEOUT=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # Reconnect to the new file
+        store._local.__dict__.clear()
+        self.addCleanup(store._local.__dict__.clear)
+
+    @override_settings(THROTTLE_IP_RATE=1, THROTTLE_IP_BURST=50)
+    def test_login_costs_more_than_a_read(self):
+        client = APIClient()
+        credentials = {'username': 'nobody', 'password': 'wrong'}
+        self.assertEqual(client.post('/login/', credentials, format='json').status_code, 401)
+        self.assertEqual(client.post('/login/', credentials, format='json').status_code, 401)
+        response = client.post('/login/', credentials, format='json')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        # Cheap requests still fit in what is left of the bucket
+        self.assertEqual(client.get('/categories/').status_code, 200)
+
+    @override_settings(THROTTLE_IP_RATE=1000, THROTTLE_IP_BURST=1000, SHED_MAX_IN_FLIGHT=1)
+    def test_requests_over_the_in_flight_limit_are_shed(self):
+        # Another worker busy with a request
+        store.connection().execute('INSERT INTO workers VALUES (0, 1, 0, ?)', (time.time(),))
+        response = APIClient().get('/categories/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '2')
+        # Operators can still look in
+        self.assertEqual(APIClient().get('/metrics').status_code, 401)
+
+        store.connection().execute('DELETE FROM workers WHERE pid = 0')
+        self.assertEqual(APIClient().get('/categories/').status_code, 200)
+
+    @override_settings(THROTTLE_IP_RATE=1000, THROTTLE_IP_BURST=1000)
+    async def test_async_requests_use_the_store_off_the_event_loop(self):
+        loop_thread = threading.get_ident()
+        threads = []
+
+        def recorded(method):
+            def wrapper(*args):
+                threads.append(threading.get_ident())
+                return method(*args)
+            return wrapper
+
+        handler = LoadSheddingMiddleware(AsyncServiceProviderListView.as_view())
+        with mock.patch.object(store, 'take', recorded(store.take)), \
+                mock.patch.object(store, 'publish', recorded(store.publish)):
+            response = await handler(AsyncRequestFactory().get('/providers/'))
+        self.assertEqual(response.status_code, 200)
+        # Shedder in and out, plus the IP throttle of the async view
+        self.assertEqual(len(threads), 3)
+        self.assertNotIn(loop_thread, threads)
+
+
+class BookingBulkUpdateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = UserModel.objects.create_user(username='customer', email='customer@example.com',
+                                                     password='x')
+        cls.provider = UserModel.objects.create_user(username='provider', email='provider@example.com',
+                                                     password='x', is_service_provider=True)
+        cls.other = UserModel.objects.create_user(username='other', email='other@example.com',
+                                                  password='x', is_service_provider=True)
+        Profile.objects.filter(user__in=[cls.provider, cls.other]).update(role='SERVICE')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.provider)
+
+    def booking(self, status, provider=None, **fields):
+        return Booking.objects.create(user=self.customer, service_provider=(provider or self.provider).profile,
+                                      service_category='Plumbing', description='Leak', address='1 Street',
+                                      scheduled_date='2026-11-01T10:00:00Z', status=status, **fields)
+
+    def test_each_transition_gets_its_own_result(self):
+        pending = self.booking('PENDING')
+        accepted = self.booking('ACCEPTED', quote_price=400)
+        started = self.booking('IN_PROGRESS', quote_price=300)
+        finished = self.booking('IN_PROGRESS', quote_price=200)
+        late = self.booking('PENDING')
+        others = self.booking('ACCEPTED', provider=self.other)
+        score = Profile.objects.get(pk=self.provider.profile.pk).ranking_score
+
+        response = self.client.post('/bookings/bulk-update/', [
+            {'id': pending.pk, 'quote_price': '450.00', 'provider_notes': 'Two hours'},
+            {'id': accepted.pk, 'status': 'IN_PROGRESS'},
+            {'id': started.pk, 'status': 'COMPLETED', 'final_price': '350.00'},
+            {'id': finished.pk, 'status': 'COMPLETED'},
+            {'id': late.pk, 'status': 'COMPLETED'},
+            {'id': others.pk, 'status': 'IN_PROGRESS'},
+            {'id': late.pk, 'status': 'SOLD'},
+        ], format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 4)
+        self.assertEqual([result['result'] for result in response.data['results']],
+                         ['updated'] * 4 + ['conflict', 'not_found', 'invalid'])
+        pending.refresh_from_db()
+        self.assertEqual((pending.status, pending.quote_price, pending.provider_notes),
+                         ('QUOTE_GIVEN', 450, 'Two hours'))
+        self.assertIsNotNone(pending.quoted_at)
+        accepted.refresh_from_db()
+        self.assertEqual(accepted.status, 'IN_PROGRESS')
+        self.assertIsNotNone(accepted.started_at)
+        started.refresh_from_db()
+        finished.refresh_from_db()
+        self.assertEqual((started.status, started.final_price), ('COMPLETED', 350))
+        self.assertEqual((finished.status, finished.final_price), ('COMPLETED', 200))
+        self.assertEqual(Booking.objects.get(pk=late.pk).status, 'PENDING')
+        self.assertEqual(Booking.objects.get(pk=others.pk).status, 'ACCEPTED')
+        self.provider.profile.refresh_from_db()
+        self.assertEqual(self.provider.profile.completed_bookings_count, 2)
+        # Ranked on the new count
+        self.assertGreater(self.provider.profile.ranking_score, score)
+
+    def test_one_update_per_target_status(self):
+        bookings = [self.booking('ACCEPTED') for _ in range(10)]
+        items = [{'id': booking.pk, 'status': 'IN_PROGRESS'} for booking in bookings]
+        # Savepoint, lock, one UPDATE, release
+        with self.assertNumQueries(4):
+            response = self.client.post('/bookings/bulk-update/', items, format='json')
+        self.assertEqual(response.data['updated'], 10)
+
+    def test_customers_cannot_use_it(self):
+        self.client.force_authenticate(self.customer)
+        response = self.client.post('/bookings/bulk-update/', [{'id': 1, 'status': 'REJECTED'}], format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class BookingStateMachineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = UserModel.objects.create_user(username='customer', email='customer@example.com',
+                                                     password='x')
+        cls.provider = UserModel.objects.create_user(username='provider', email='provider@example.com',
+                                                     password='x', is_service_provider=True)
+        Profile.objects.filter(user=cls.provider).update(role='SERVICE')
+
+    def setUp(self):
+        self.booking = Booking.objects.create(
+            user=self.customer, service_provider=self.provider.profile, service_category='Plumbing',
+            description='Leak', address='1 Street', scheduled_date='2026-11-01T10:00:00Z'
+        )
+
+    def patch(self, user, data):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.patch(f'/bookings/{self.booking.pk}/', data, format='json')
+
+    def test_a_transition_is_one_conditional_update(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.patch(self.provider, {'quote_price': '450.00'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['status'], response.data['version']), ('QUOTE_GIVEN', 1))
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"quoted_at"', updates[0])
+        # Only written if the booking is still at the version it was loaded with
+        self.assertIn('"local_user_booking"."version" = 0', updates[0].split('WHERE')[1])
+
+        self.assertEqual(self.patch(self.customer, {'status': 'ACCEPTED'}).status_code, 200)
+        self.booking.refresh_from_db()
+        self.assertEqual((self.booking.status, self.booking.version), ('ACCEPTED', 2))
+        self.assertIsNotNone(self.booking.quoted_at)
+        self.assertIsNotNone(self.booking.accepted_at)
+
+    def test_transitions_are_checked_per_side(self):
+        # Only the customer accepts, and only a quote
+        self.assertEqual(self.patch(self.provider, {'status': 'ACCEPTED'}).status_code, 400)
+        self.assertEqual(self.patch(self.customer, {'status': 'ACCEPTED'}).status_code, 400)
+        self.assertEqual(self.patch(self.customer, {'quote_price': '1.00'}).status_code, 400)
+        self.assertEqual(Booking.objects.get(pk=self.booking.pk).status, 'PENDING')
+
+    def test_a_stale_version_gets_409(self):
+        self.assertEqual(self.patch(self.provider, {'quote_price': '450.00'}).status_code, 200)
+        # The customer accepts the quote they saw; the provider re-quoted in the meantime
+        self.assertEqual(self.patch(self.provider, {'quote_price': '900.00', 'version': 1}).status_code, 200)
+        response = self.patch(self.customer, {'status': 'ACCEPTED', 'version': 1})
+        self.assertEqual(response.status_code, 409)
+        self.booking.refresh_from_db()
+        self.assertEqual((self.booking.status, self.booking.quote_price), ('QUOTE_GIVEN', 900))
+
+    def test_a_concurrent_change_gets_409(self):
+        booking = Booking.objects.get(pk=self.booking.pk)
+        Booking.objects.filter(pk=booking.pk).update(status='REJECTED', version=1)
+        with self.assertRaises(BookingConflict):
+            update_booking(booking, PROVIDER, status='QUOTE_GIVEN', quote_price=450)
+        self.assertEqual(Booking.objects.get(pk=booking.pk).status, 'REJECTED')
+
+    def test_completion_counts_for_the_provider(self):
+        Booking.objects.filter(pk=self.booking.pk).update(status='IN_PROGRESS', quote_price=300)
+        self.assertEqual(self.patch(self.provider, {'status': 'COMPLETED'}).status_code, 200)
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.final_price, 300)
+        self.provider.profile.refresh_from_db()
+        self.assertEqual(self.provider.profile.completed_bookings_count, 1)
+
+
+class TrackChangesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserModel.objects.create_user(username='seller', email='seller@example.com', password='x')
+        cls.product = Product.objects.create(seller=cls.user, title='Sofa', description='Sofa',
+                                             category='FURNITURE', condition='GOOD', price=100,
+                                             address='1 Street', city='Pune')
+
+    def updates(self, instance):
+        """UPDATEs of the instance's table run by instance.save()"""
+        with CaptureQueriesContext(connection) as queries:
+            instance.save()
+        prefix = f'UPDATE "{instance._meta.db_table}"'
+        return [query['sql'] for query in queries if query['sql'].startswith(prefix)]
+
+    def set_clause(self, sql):
+        return sql.split(' SET ')[1].split(' WHERE ')[0]
+
+    def test_only_changed_columns_are_written(self):
+        profile = Profile.objects.get(user=self.user)
+        profile.bio = 'Carpenter'
+        [sql] = self.updates(profile)
+        self.assertEqual(self.set_clause(sql), '"bio" = \'Carpenter\'')
+        self.assertNotIn('"completed_bookings_count"', sql)
+        self.assertNotIn('"rating_sum"', sql)
+
+    def test_unchanged_saves_write_nothing(self):
+        profile = Profile.objects.get(user=self.user)
+        with self.assertNumQueries(0):
+            profile.save()
+        profile.bio = 'Carpenter'
+        profile.save()
+        # Saved values are the new baseline
+        with self.assertNumQueries(0):
+            profile.save()
+
+    def test_counters_bumped_meanwhile_survive_a_save(self):
+        profile = Profile.objects.get(user=self.user)
+        # Another request completes a booking after this one loaded the profile
+        Profile.objects.filter(pk=profile.pk).update(completed_bookings_count=F('completed_bookings_count') + 1)
+        profile.location = 'Pune'
+        profile.save()
+        profile.refresh_from_db()
+        self.assertEqual((profile.location, profile.completed_bookings_count), ('Pune', 1))
+
+    def test_auto_now_and_derived_columns_come_along(self):
+        product = Product.objects.get(pk=self.product.pk)
+        product.is_active = False
+        product.latitude, product.longitude = 18.52, 73.85
+        [sql] = self.updates(product)
+        columns = self.set_clause(sql)
+        for column in ('"is_active"', '"latitude"', '"longitude"', '"geohash"', '"updated_at"'):
+            self.assertIn(column, columns)
+        self.assertNotIn('"title"', columns)
+        self.assertNotIn('"comment_count"', columns)
+
+    def test_deferred_fields_are_not_written(self):
+        user = UserModel.objects.only('id').get(pk=self.user.pk)
+        user.is_service_provider = True
+        [sql] = self.updates(user)
+        self.assertEqual(self.set_clause(sql), '"is_service_provider" = true')
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class AvailabilityTests(TestCase):
+    # A Saturday
+    SATURDAY = '2030-06-01'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = UserModel.objects.create_user(username='customer', email='customer@example.com',
+                                                     password='x')
+        cls.other_customer = UserModel.objects.create_user(username='other', email='other@example.com',
+                                                           password='x')
+        cls.provider = UserModel.objects.create_user(username='provider', email='provider@example.com',
+                                                     password='x', is_service_provider=True)
+        cls.idle = UserModel.objects.create_user(username='idle', email='idle@example.com',
+                                                 password='x', is_service_provider=True)
+        for user in (cls.provider, cls.idle):
+            user.profile.role = 'SERVICE'
+            user.profile.save()
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def book(self, user, time, provider=None, **extra):
+        return self.client_for(user).post('/bookings/create/', {
+            'provider_id': (provider or self.provider).profile.pk, 'service_category': 'Plumbing',
+            'description': 'Leak', 'address': '1 Street', 'scheduled_date': f'{self.SATURDAY}T{time}Z', **extra,
+        }, format='json')
+
+    def set_slots(self, user, slots):
+        return self.client_for(user).put('/profile/availability/', slots, format='json')
+
+    def free_providers(self, start, end):
+        response = APIClient().get('/providers/', {'available_from': f'{self.SATURDAY}T{start}Z',
+                                                   'available_to': f'{self.SATURDAY}T{end}Z'})
+        self.assertEqual(response.status_code, 200)
+        return [provider['username'] for provider in response.data]
+
+    def test_overlapping_bookings_are_refused(self):
+        self.assertEqual(self.book(self.customer, '10:00').status_code, 201)
+        response = self.book(self.other_customer, '11:00')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('scheduled_date', response.data)
+        # Back to back is fine, and so is another provider at the same time
+        self.assertEqual(self.book(self.other_customer, '12:00', duration_minutes=60).status_code, 201)
+        self.assertEqual(self.book(self.other_customer, '11:00', provider=self.idle).status_code, 201)
+        self.assertEqual(Booking.objects.count(), 3)
+
+    def test_the_database_refuses_overlaps(self):
+        self.assertEqual(self.book(self.customer, '10:00').status_code, 201)
+        booking = Booking.objects.create(
+            user=self.other_customer, service_provider=self.provider.profile, service_category='Plumbing',
+            description='Leak', address='1 Street', scheduled_date=f'{self.SATURDAY}T09:00:00Z'
+        )
+        with self.assertRaises(IntegrityError):
+            BookingInterval.objects.create(booking=booking, provider=self.provider.profile,
+                                           period=(booking.scheduled_date, f'{self.SATURDAY}T10:30:00Z'))
+
+    def test_rejection_frees_the_time(self):
+        booking_id = self.book(self.customer, '10:00').data['id']
+        response = self.client_for(self.provider).patch(f'/bookings/{booking_id}/', {'status': 'REJECTED'},
+                                                        format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(BookingInterval.objects.filter(booking_id=booking_id).exists())
+        self.assertEqual(self.book(self.other_customer, '10:00').status_code, 201)
+
+    def test_bookings_must_fall_in_a_slot(self):
+        response = self.set_slots(self.provider, [{'weekday': 5, 'start_time': '09:00', 'end_time': '13:00'}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['weekday_name'], 'Saturday')
+        self.assertEqual(self.book(self.customer, '12:00').status_code, 400)
+        self.assertEqual(self.book(self.customer, '09:30').status_code, 201)
+        # Customers have no slots to set
+        self.assertEqual(self.set_slots(self.customer, []).status_code, 403)
+        self.assertEqual(self.set_slots(self.provider, [{'weekday': 5, 'start_time': '13:00',
+                                                         'end_time': '09:00'}]).status_code, 400)
+
+    def test_search_by_time_window(self):
+        self.set_slots(self.provider, [{'weekday': 5, 'start_time': '09:00', 'end_time': '18:00'}])
+        self.assertEqual(self.free_providers('10:00', '12:00'), ['provider'])
+        # Outside the slot; the idle provider declared none
+        self.assertEqual(self.free_providers('18:00', '19:00'), [])
+
+        self.assertEqual(self.book(self.customer, '11:00', duration_minutes=60).status_code, 201)
+        self.assertEqual(self.free_providers('10:00', '12:00'), [])
+        self.assertEqual(self.free_providers('12:00', '14:00'), ['provider'])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.free_providers('12:00', '14:00')
+        [search] = [query['sql'] for query in queries if 'local_user_bookinginterval' in query['sql']]
+        self.assertIn('NOT EXISTS', search)
+
+    def test_window_is_validated(self):
+        response = APIClient().get('/providers/', {'available_from': f'{self.SATURDAY}T10:00Z'})
+        self.assertEqual(response.status_code, 400)
+        response = APIClient().get('/providers/', {'available_from': f'{self.SATURDAY}T10:00Z',
+                                                   'available_to': f'{self.SATURDAY}T09:00Z'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class RankingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = UserModel.objects.create_user(username='customer', email='customer@example.com',
+                                                     password='x')
+        cls.plumbing, cls.painting = ServiceCategory.objects.resolve(['Plumbing', 'Painting'])
+        cls.veteran = cls.provider('veteran', [cls.plumbing])
+        cls.newcomer = cls.provider('newcomer', [cls.plumbing, cls.painting])
+        cls.veteran.service_areas.set(ServiceArea.objects.resolve(['Andheri']))
+        for rating in [5, 4, 5, 4, 5, 4, 5, 4, 5, 4, 5, 4]:
+            cls.review(cls.veteran, rating)
+        cls.review(cls.newcomer, 5)
+
+    @classmethod
+    def provider(cls, username, categories):
+        user = UserModel.objects.create_user(username=username, email=f'{username}@example.com',
+                                             password='x', is_service_provider=True)
+        user.profile.role = 'SERVICE'
+        user.profile.save()
+        user.profile.service_categories.set(categories)
+        return user.profile
+
+    @classmethod
+    def review(cls, profile, rating):
+        booking = Booking.objects.create(
+            user=cls.customer, service_provider=profile, service_category='Plumbing', description='Leak',
+            address='1 Street', scheduled_date='2026-01-01T10:00:00Z', status='COMPLETED',
+            completed_at='2026-01-01T12:00:00Z',
+        )
+        return Review.objects.create(booking=booking, user=cls.customer, provider=profile,
+                                     rating=rating, comment='Good')
+
+    def top(self, **params):
+        response = APIClient().get('/providers/top/', params)
+        self.assertEqual(response.status_code, 200)
+        return [provider['username'] for provider in response.data]
+
+    def test_volume_beats_a_single_perfect_review(self):
+        self.veteran.refresh_from_db()
+        self.newcomer.refresh_from_db()
+        self.assertGreater(self.newcomer.rating, self.veteran.rating)
+        self.assertGreater(self.veteran.ranking_score, self.newcomer.ranking_score)
+        response = APIClient().get('/providers/')
+        self.assertEqual([provider['username'] for provider in response.data], ['veteran', 'newcomer'])
+
+    def test_scores_follow_reviews_and_bookings(self):
+        before = Profile.objects.get(pk=self.newcomer.pk).ranking_score
+        with CaptureQueriesContext(connection) as queries:
+            review = self.review(self.newcomer, 1)
+        after = Profile.objects.get(pk=self.newcomer.pk).ranking_score
+        self.assertLess(after, before)
+        # Only this provider is recomputed, once for the completed booking and once for the review
+        updates = [query['sql'] for query in queries
+                   if query['sql'].startswith('UPDATE "local_user_profile" SET "ranking_score"')]
+        self.assertEqual(len(updates), 2)
+        for update in updates:
+            self.assertIn(f'"local_user_profile"."id" IN ({self.newcomer.pk})', update)
+
+        review.delete()
+        self.assertGreater(Profile.objects.get(pk=self.newcomer.pk).ranking_score, after)
+        # The category rows carry the same score
+        scores = set(ProviderCategory.objects.filter(profile=self.newcomer).values_list('ranking_score', flat=True))
+        self.assertEqual(scores, {Profile.objects.get(pk=self.newcomer.pk).ranking_score})
+
+    def test_a_new_category_gets_the_score(self):
+        self.veteran.service_categories.add(self.painting)
+        row = ProviderCategory.objects.get(profile=self.veteran, servicecategory=self.painting)
+        self.assertEqual(row.ranking_score, Profile.objects.get(pk=self.veteran.pk).ranking_score)
+        self.assertNotEqual(row.ranking_score, 0)
+
+    def test_top_providers_by_category_and_area(self):
+        self.assertEqual(self.top(category='plumbing'), ['veteran', 'newcomer'])
+        self.assertEqual(self.top(category='Painting'), ['newcomer'])
+        self.assertEqual(self.top(category='plumbing', service_area='andheri'), ['veteran'])
+        self.assertEqual(self.top(category='carpentry'), [])
+        self.assertEqual(self.top(page_size=1), ['veteran'])
+
+        Profile.objects.filter(pk=self.veteran.pk).update(is_available=False)
+        self.assertEqual(self.top(category='plumbing'), ['newcomer'])
+
+    def completed(self, profile, days_ago, rating=None):
+        booking = Booking.objects.create(
+            user=self.customer, service_provider=profile, service_category='Plumbing', description='Leak',
+            address='1 Street', scheduled_date='2026-01-01T10:00:00Z', status='COMPLETED',
+            completed_at=timezone.now() - timedelta(days=days_ago),
+        )
+        if rating is not None:
+            Review.objects.create(booking=booking, user=self.customer, provider=profile, rating=rating,
+                                  comment='Good')
+
+    def scores(self):
+        return dict(Profile.objects.filter(role='SERVICE').values_list('user__username', 'ranking_score'))
+
+    def test_recency_is_bounded(self):
+        # 4.9 stars from 20 reviews, last active a quarter ago
+        star = self.provider('star', [self.plumbing])
+        for rating in [5] * 18 + [4, 4]:
+            self.completed(star, days_ago=90, rating=rating)
+        # Signed up yesterday; a single 5-star job today
+        self.provider('joined', [self.plumbing])
+        rising = self.provider('rising', [self.plumbing])
+        self.completed(rising, days_ago=0, rating=5)
+        # Same record as 'rising', a year ago
+        lapsed = self.provider('lapsed', [self.plumbing])
+        self.completed(lapsed, days_ago=365, rating=5)
+
+        scores = self.scores()
+        # Nothing for joining: just the prior rating
+        self.assertAlmostEqual(scores['joined'], 3.5)
+        self.assertAlmostEqual(scores['rising'] - scores['lapsed'], 1 - 1 / (1 + 365 / 90), places=3)
+        self.assertGreater(scores['star'], scores['rising'])
+        self.assertGreater(scores['rising'], scores['lapsed'])
+        self.assertGreater(scores['lapsed'], scores['joined'])
+
+        # Years later, after the daily refresh: everyone has decayed, in the same order
+        with mock.patch('local_user.ranking.timezone.now', return_value=timezone.now() + timedelta(days=3 * 365)):
+            refresh_rankings()
+        later = self.scores()
+        self.assertAlmostEqual(later['joined'], 3.5)
+        self.assertLess(later['star'], scores['star'])
+        self.assertEqual(sorted(later, key=later.get), sorted(scores, key=scores.get))
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class RequestMetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.provider = UserModel.objects.create_user(username='provider', email='provider@example.com',
+                                                     password='x', is_service_provider=True)
+        cls.provider.profile.role = 'SERVICE'
+        cls.provider.profile.save()
+
+    def serialize_seconds(self):
+        return request_metrics.snapshot().get('providers GET', {}).get('serialize_seconds', 0.0)
+
+    def test_serializer_time_of_generic_views(self):
+        before = self.serialize_seconds()
+        response = APIClient().get('/providers/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('serialize;dur=', response['Server-Timing'])
+        self.assertGreater(self.serialize_seconds(), before)
+
+    def test_metrics_view_uses_the_default_authentication(self):
+        staff = UserModel.objects.create_user(username='staff', email='staff@example.com', password='x',
+                                              is_staff=True)
+        self.assertEqual(APIClient().get('/metrics').status_code, 401)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token_for_user(staff).access_token}')
+        response = client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('localseva_http_request_duration_seconds', response.content.decode())
+        # Basic auth, for the scraper
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Basic ' + base64.b64encode(b'staff:x').decode())
+        self.assertEqual(client.get('/metrics').status_code, 200)
+
+
+class CounterCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = UserModel.objects.create_user(username='seller', email='seller@example.com', password='x')
+        cls.provider = UserModel.objects.create_user(username='provider', email='provider@example.com',
+                                                     password='x', is_service_provider=True)
+        cls.provider.profile.role = 'SERVICE'
+        cls.provider.profile.save()
+        cls.product = Product.objects.create(
+            seller=cls.seller, title='Sofa', description='Sofa', category='FURNITURE', condition='GOOD',
+            price=100, address='1 Street', city='Pune'
+        )
+
+    def comment_count(self):
+        return Product.objects.get(pk=self.product.pk).comment_count
+
+    def profile(self, user):
+        return Profile.objects.get(user=user)
+
+    def test_comment_count_follows_visibility(self):
+        comment = ProductComment.objects.create(product=self.product, user=self.provider, comment='Still there?')
+        self.assertEqual(self.comment_count(), 1)
+        comment.is_visible = False
+        comment.save()
+        self.assertEqual(self.comment_count(), 0)
+        # Saving it again unchanged doesn't count it twice
+        comment.save()
+        self.assertEqual(self.comment_count(), 0)
+        comment.is_visible = True
+        comment.save()
+        self.assertEqual(self.comment_count(), 1)
+        comment.delete()
+        self.assertEqual(self.comment_count(), 0)
+
+    def test_completed_bookings_are_counted_on_the_transition(self):
+        booking = Booking.objects.create(
+            user=self.seller, service_provider=self.provider.profile, service_category='Plumbing',
+            description='Leak', address='1 Street', scheduled_date='2026-11-01T10:00:00Z', status='IN_PROGRESS'
+        )
+        self.assertEqual(self.profile(self.provider).completed_bookings_count, 0)
+        update_booking(booking, PROVIDER, status='COMPLETED')
+        self.assertEqual(self.profile(self.provider).completed_bookings_count, 1)
+
+    def test_deactivated_products_are_not_active_listings(self):
+        self.assertEqual(self.profile(self.seller).active_listings_count, 1)
+        self.product.is_active = False
+        self.product.save()
+        self.assertEqual(self.profile(self.seller).active_listings_count, 0)
+
+    def test_reconcile_repairs_drift(self):
+        ProductComment.objects.create(product=self.product, user=self.provider, comment='Still there?')
+        # Writes that bypass the signals
+        Product.objects.filter(pk=self.product.pk).update(comment_count=42)
+        Profile.objects.filter(user=self.seller).update(active_listings_count=0)
+
+        self.assertEqual(COUNTERS['comment_count'].reconcile(), 1)
+        self.assertEqual(COUNTERS['active_listings_count'].reconcile(batch_size=1), 1)
+        self.assertEqual(self.comment_count(), 1)
+        self.assertEqual(self.profile(self.seller).active_listings_count, 1)
+        # Nothing left to fix
+        self.assertEqual(COUNTERS['comment_count'].reconcile(), 0)
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class KeysetPaginationTests(TestCase):
+    # Ties and NULLs around every page boundary at two per page
+    PRICES = [None, 300, 100, None, 200, 100, None, 300, 100]
+
+    @classmethod
+    def setUpTestData(cls):
+        for number, price in enumerate(cls.PRICES):
+            user = UserModel.objects.create_user(username=f'provider{number}', email=f'p{number}@example.com',
+                                                 password='x', is_service_provider=True)
+            user.profile.role = 'SERVICE'
+            user.profile.base_price = price
+            user.profile.save()
+
+    def get(self, url, params=None):
+        response = APIClient().get(url, params)
+        self.assertEqual(response.status_code, 200)
+        links = dict((rel, link) for link, rel in re.findall(r'<([^>]+)>; rel="(\w+)"', response.get('Link', '')))
+        return [provider['id'] for provider in response.data], links
+
+    def walk(self, ordering, expected):
+        pages = []
+        ids, links = self.get('/providers/', {'ordering': ordering, 'page_size': 2})
+        pages.append(ids)
+        while 'next' in links:
+            ids, links = self.get(links['next'])
+            pages.append(ids)
+        self.assertEqual([pk for page in pages for pk in page], expected)
+
+        # And back again, from the last page
+        backwards = [pages[-1]]
+        while 'prev' in links:
+            ids, links = self.get(links['prev'])
+            backwards.append(ids)
+        self.assertEqual(backwards, pages[::-1])
+
+    def test_pages_across_nulls_in_both_directions(self):
+        profiles = Profile.objects.filter(role='SERVICE')
+        # PostgreSQL puts NULLs last ascending and first descending
+        self.walk('base_price', list(profiles.order_by(F('base_price').asc(nulls_last=True), 'id')
+                                     .values_list('id', flat=True)))
+        self.walk('-base_price', list(profiles.order_by(F('base_price').desc(nulls_first=True), '-id')
+                                      .values_list('id', flat=True)))
+
+    def test_bad_cursors_are_not_found(self):
+        _, links = self.get('/providers/', {'ordering': 'base_price', 'page_size': 2})
+        cursor = parse_qs(urlsplit(links['next']).query)['cursor'][0]
+        # Made for another ordering
+        response = APIClient().get('/providers/', {'ordering': '-base_price', 'cursor': cursor})
+        self.assertEqual(response.status_code, 404)
+
+        payload = json.loads(base64.urlsafe_b64decode(cursor))
+        payload['v'][0] = 'cheap'
+        tampered = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+        for cursor in [tampered, 'not-a-cursor', cursor[:-4]]:
+            response = APIClient().get('/providers/', {'ordering': 'base_price', 'cursor': cursor})
+            self.assertEqual(response.status_code, 404)
+
+    def test_page_size_is_capped(self):
+        with mock.patch.object(KeysetPagination, 'max_page_size', 3):
+            ids, links = self.get('/providers/', {'page_size': 100})
+        self.assertEqual(len(ids), 3)
+        self.assertIn('next', links)
+
+
+ran = []
+
+
+@task
+def record(value):
+    ran.append(value)
+
+
+@task(max_attempts=3)
+def always_fails():
+    raise RuntimeError("Out of luck")
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        ran.clear()
+
+    def due_now(self, job):
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+
+    def test_failures_back_off_then_fail(self):
+        job = enqueue(always_fails)
+        for attempt, delay in [(1, 10), (2, 20)]:
+            self.due_now(job)
+            [job] = claim(worker='worker')
+            before = timezone.now()
+            # No jitter
+            with mock.patch('local_user.jobs.random.uniform', return_value=1.0), \
+                    self.assertLogs('local_user.jobs', 'ERROR'):
+                self.assertFalse(run_job(job))
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts, job.locked_by), ('QUEUED', attempt, ''))
+            self.assertAlmostEqual((job.run_at - before).total_seconds(), delay, delta=1)
+            self.assertIn("Out of luck", job.last_error)
+            # Not due before the delay is up
+            self.assertEqual(claim(worker='worker'), [])
+
+        self.due_now(job)
+        [job] = claim(worker='worker')
+        with self.assertLogs('local_user.jobs', 'ERROR'):
+            self.assertFalse(run_job(job))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('FAILED', 3))
+        self.assertEqual(claim(worker='worker'), [])
+
+    @override_settings(JOB_LOCK_TIMEOUT=60)
+    def test_jobs_of_a_dead_worker_are_claimed_again(self):
+        enqueue(record, value=1)
+        [stale] = claim(worker='dead')
+        self.assertEqual(claim(worker='alive'), [])
+
+        Job.objects.filter(pk=stale.pk).update(locked_at=timezone.now() - timedelta(seconds=61))
+        [job] = claim(worker='alive')
+        self.assertEqual((job.locked_by, job.attempts), ('alive', 2))
+        self.assertTrue(run_job(job))
+        self.assertEqual(ran, [1])
+        self.assertFalse(Job.objects.exists())
+
+    @override_settings(JOB_QUEUE_EAGER=True)
+    def test_eager_mode_runs_inline_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertIsNone(enqueue(record, value=2))
+            self.assertEqual(ran, [])
+        self.assertEqual(ran, [2])
+        self.assertFalse(Job.objects.exists())
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=60)
+class ResponseCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = UserModel.objects.create_user(username='customer', email='customer@example.com',
+                                                     password='x')
+        cls.provider = UserModel.objects.create_user(username='provider', email='provider@example.com',
+                                                     password='x', is_service_provider=True)
+        cls.provider.profile.role = 'SERVICE'
+        cls.provider.profile.save()
+        cls.booking = Booking.objects.create(
+            user=cls.customer, service_provider=cls.provider.profile, service_category='Plumbing',
+            description='Leak', address='1 Street', scheduled_date='2026-01-01T10:00:00Z', status='COMPLETED',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def x_cache(self, params=None):
+        response = APIClient().get('/providers/', params)
+        return response.status_code, response.get('X-Cache')
+
+    def test_invalidated_when_the_write_commits(self):
+        self.assertEqual(self.x_cache(), (200, 'MISS'))
+        self.assertEqual(self.x_cache(), (200, 'HIT'))
+
+        # A rolled back review changes nothing
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                Review.objects.create(booking=self.booking, user=self.customer, provider=self.provider.profile,
+                                      rating=1, comment='Bad')
+                raise RuntimeError("Rolled back")
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.x_cache(), (200, 'HIT'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                Review.objects.create(booking=self.booking, user=self.customer, provider=self.provider.profile,
+                                      rating=5, comment='Good')
+            # Not committed yet: the old page is still what others see
+            self.assertEqual(self.x_cache(), (200, 'HIT'))
+        self.assertEqual(self.x_cache(), (200, 'MISS'))
+        self.assertEqual(self.x_cache(), (200, 'HIT'))
+
+    def test_errors_are_not_cached(self):
+        for _ in range(2):
+            self.assertEqual(self.x_cache({'near': 'nowhere'}), (400, None))
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class NearbyFilterTests(TestCase):
+    # A degree of latitude is 111.195 km; the equator is a geohash cell border at every precision
+    PROVIDERS = {
+        'center': (0.02, 30.0),
+        'inside': (-0.069, 30.0),  # 9.9 km south, across the equator
+        'outside': (-0.071, 30.0),  # 10.1 km south
+        'east': (10.0, 179.95),
+        'across': (10.0, -179.97),  # 8.8 km east of 'east', across the antimeridian
+        'far': (10.0, -179.7),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        for name, (latitude, longitude) in cls.PROVIDERS.items():
+            user = UserModel.objects.create_user(username=name, email=f'{name}@example.com', password='x',
+                                                 is_service_provider=True)
+            user.profile.role = 'SERVICE'
+            user.profile.latitude, user.profile.longitude = latitude, longitude
+            user.profile.save()
+
+    def near(self, name, **params):
+        latitude, longitude = self.PROVIDERS[name]
+        response = APIClient().get('/providers/', {'near': f'{latitude},{longitude}', **params})
+        self.assertEqual(response.status_code, 200)
+        return [provider['username'] for provider in response.data]
+
+    def test_radius_across_a_cell_border(self):
+        self.assertNotEqual(encode_geohash(*self.PROVIDERS['center'])[0],
+                            encode_geohash(*self.PROVIDERS['inside'])[0])
+        self.assertEqual(self.near('center', radius=10), ['center', 'inside'])
+
+    def test_search_across_the_antimeridian(self):
+        self.assertEqual(self.near('east', radius=10), ['east', 'across'])
+        self.assertEqual(self.near('across', radius=10), ['across', 'east'])
+
+    def test_invalid_near_is_rejected(self):
+        for params in [{'near': 'nowhere'}, {'near': '95,10'}, {'near': '10,200'},
+                       {'near': '10,20', 'radius': '0'}, {'near': '10,20', 'radius': 'far'}]:
+            self.assertEqual(APIClient().get('/providers/', params).status_code, 400)
+
+
+class ProductImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = UserModel.objects.create_user(username='seller', email='seller@example.com', password='x')
+        Product.objects.create(
+            seller=cls.seller, title='Sofa', description='Sofa', category='FURNITURE', condition='GOOD',
+            price=100, address='1 Street', city='Pune'
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.seller)
+
+    def rows(self, count):
+        return [
+            {'title': f'Chair {number}', 'description': 'Wooden chair', 'category': 'FURNITURE',
+             'condition': 'GOOD', 'price': '500.00', 'address': '12 Shop Lane', 'city': 'Pune'}
+            for number in range(count)
+        ]
+
+    def listings(self):
+        return Profile.objects.get(user=self.seller).active_listings_count
+
+    def test_an_invalid_row_imports_nothing(self):
+        rows = self.rows(3)
+        rows[1]['category'] = 'SOFA'
+        response = self.client.post('/marketplace/import/', rows, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual((response.data['valid'], response.data['created']), (2, 0))
+        [error] = response.data['errors']
+        self.assertEqual(error['row'], 1)
+        self.assertEqual(list(error['errors']), ['category'])
+        self.assertEqual(Product.objects.count(), 1)
+        self.assertEqual(self.listings(), 1)
+
+    def test_dry_run_writes_nothing(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/marketplace/import/?dry_run=true', self.rows(3), format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['valid'], response.data['created']), (3, 0))
+        self.assertEqual([query['sql'] for query in queries], [])
+        self.assertFalse(Job.objects.exists())
+
+    def test_import_counts_the_new_listings(self):
+        response = self.client.post('/marketplace/import/', self.rows(5), format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 5)
+        self.assertEqual(Product.objects.filter(pk__in=response.data['ids']).count(), 5)
+        self.assertEqual(self.listings(), 6)
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class FuzzyProviderSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for username, location, bio in [
+            ('rajesh', 'Andheri West', 'Experienced plumber, fixes leaks fast'),
+            ('rajeshwari', 'Bandra', 'Electrician'),
+            ('sunita', 'Thane', 'Painter'),
+        ]:
+            user = UserModel.objects.create_user(username=username, email=f'{username}@example.com',
+                                                 password='x', is_service_provider=True)
+            user.profile.role = 'SERVICE'
+            user.profile.location = location
+            user.profile.bio = bio
+            user.profile.save()
+
+    def search(self, **params):
+        response = APIClient().get('/providers/', params)
+        self.assertEqual(response.status_code, 200)
+        return [provider['username'] for provider in response.data]
+
+    def threshold(self, value):
+        request = Request(APIRequestFactory().get('/providers/', {'similarity': value}))
+        return ProviderSearchFilter().get_threshold(request)
+
+    def test_fuzzy_mode_tolerates_typos(self):
+        self.assertEqual(self.search(search='plumbr'), [])
+        self.assertEqual(self.search(search='plumbr', search_mode='fuzzy'), ['rajesh'])
+
+    def test_ordered_by_similarity(self):
+        self.assertEqual(self.search(search='rajesh', search_mode='fuzzy'), ['rajesh', 'rajeshwari'])
+        # An explicit ordering wins
+        self.assertEqual(self.search(search='rajesh', search_mode='fuzzy', ordering='-created_at'),
+                         ['rajeshwari', 'rajesh'])
+        # A stricter threshold keeps only the close match
+        self.assertEqual(self.search(search='rajesh', search_mode='fuzzy', similarity='0.9'), ['rajesh'])
+
+    def test_fuzzy_location(self):
+        self.assertEqual(self.search(location='Andheri Wst'), [])
+        self.assertEqual(self.search(location='Andheri Wst', search_mode='fuzzy'), ['rajesh'])
+
+    def test_threshold_is_clamped(self):
+        self.assertEqual(self.threshold('0.5'), 0.5)
+        self.assertEqual(self.threshold('0'), ProviderSearchFilter.min_threshold)
+        self.assertEqual(self.threshold('7'), 1.0)
+        for value in ['nan', 'inf', '-inf', 'high']:
+            self.assertEqual(self.threshold(value), ProviderSearchFilter.default_threshold)
+
+    def test_threshold_does_not_outlive_the_request(self):
+        self.search(search='rajesh', search_mode='fuzzy', similarity='0.9')
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT current_setting('pg_trgm.similarity_threshold'), "
+                           "current_setting('pg_trgm.word_similarity_threshold')")
+            self.assertEqual(cursor.fetchone(), ('0.3', '0.6'))
+
+
+def completed_booking(customer, profile):
+    return Booking.objects.create(
+        user=customer, service_provider=profile, service_category='Plumbing', description='Leak',
+        address='1 Street', scheduled_date='2026-01-01T10:00:00Z', status='COMPLETED',
+    )
+
+
+class ProviderRatingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = UserModel.objects.create_user(username='customer', email='customer@example.com',
+                                                     password='x')
+        cls.providers = []
+        for name in ['first', 'second']:
+            user = UserModel.objects.create_user(username=name, email=f'{name}@example.com', password='x',
+                                                 is_service_provider=True)
+            user.profile.role = 'SERVICE'
+            user.profile.save()
+            cls.providers.append(user.profile)
+
+    def review(self, profile, rating):
+        return Review.objects.create(booking=completed_booking(self.customer, profile), user=self.customer,
+                                     provider=profile, rating=rating, comment='Good')
+
+    def rating(self, profile):
+        return Profile.objects.values_list('rating_count', 'rating_sum', 'rating').get(pk=profile.pk)
+
+    def test_create_update_and_delete(self):
+        first, second = self.providers
+        review = self.review(first, 4)
+        self.review(first, 5)
+        self.assertEqual(self.rating(first), (2, 9, 4.5))
+
+        review.rating = 2
+        review.save()
+        self.assertEqual(self.rating(first), (2, 7, 3.5))
+
+        # Moved to another provider
+        review.provider = second
+        review.save()
+        self.assertEqual(self.rating(first), (1, 5, 5.0))
+        self.assertEqual(self.rating(second), (1, 2, 2.0))
+
+        review.delete()
+        self.assertEqual(self.rating(second), (0, 0, 0.0))
+        self.assertEqual(COUNTERS['provider_rating'].reconcile(), 0)
+
+    def test_one_update_whatever_the_number_of_reviews(self):
+        first, _ = self.providers
+        counts = []
+        for existing in [0, 10]:
+            for rating in [4] * existing:
+                self.review(first, rating)
+            booking = completed_booking(self.customer, first)
+            with CaptureQueriesContext(connection) as queries:
+                review = Review.objects.create(booking=booking, user=self.customer, provider=first,
+                                               rating=5, comment='Good')
+            counts.append(len(queries))
+            updates = [query['sql'] for query in queries if '"rating_sum" = ' in query['sql']]
+            self.assertEqual(len(updates), 1)
+            self.assertIn('("local_user_profile"."rating_sum" + 5)', updates[0])
+
+        self.assertEqual(counts[0], counts[1])
+        with CaptureQueriesContext(connection) as queries:
+            review.delete()
+        self.assertEqual(len([query for query in queries if '"rating_sum" = ' in query['sql']]), 1)
+        self.assertEqual(self.rating(first), (11, 45, 45 / 11))
+
+
+class ConcurrentReviewTests(TransactionTestCase):
+    writers = 8
+
+    def test_concurrent_reviews_are_all_counted(self):
+        customer = UserModel.objects.create_user(username='customer', email='customer@example.com', password='x')
+        provider = UserModel.objects.create_user(username='provider', email='provider@example.com', password='x',
+                                                 is_service_provider=True)
+        provider.profile.role = 'SERVICE'
+        provider.profile.save()
+        bookings = [completed_booking(customer, provider.profile) for _ in range(self.writers)]
+        ready = threading.Barrier(self.writers)
+        errors = []
+
+        def write(booking, rating):
+            try:
+                with transaction.atomic():
+                    # Every writer has its transaction open before any of them writes
+                    ready.wait(timeout=10)
+                    Review.objects.create(booking=booking, user=customer, provider=provider.profile,
+                                          rating=rating, comment='Good')
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        ratings = [index % 5 + 1 for index in range(self.writers)]
+        threads = [threading.Thread(target=write, args=args) for args in zip(bookings, ratings)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(Profile.objects.values_list('rating_count', 'rating_sum').get(pk=provider.profile.pk),
+                         (self.writers, sum(ratings)))
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class EagerLoadingTests(TestCase):
+    """Every list endpoint takes as many queries for 5 rows as for 1"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = UserModel.objects.create_user(username='owner', email='owner@example.com', password='x',
+                                                  is_service_provider=True)
+        cls.owner.profile.role = 'SERVICE'
+        cls.owner.profile.save()
+        cls.product = cls.make_product(cls.owner)
+        cls.categories = ServiceCategory.objects.resolve(['Plumbing', 'Painting'])
+        cls.areas = ServiceArea.objects.resolve(['Andheri'])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.users = 0
+
+    @staticmethod
+    def make_product(seller):
+        return Product.objects.create(
+            seller=seller, title='Sofa', description='Sofa', category='FURNITURE', condition='GOOD',
+            price=100, address='1 Street', city='Pune'
+        )
+
+    def user(self, provider=False):
+        self.users += 1
+        user = UserModel.objects.create_user(username=f'user{self.users}', email=f'user{self.users}@example.com',
+                                             password='x', is_service_provider=provider)
+        if provider:
+            user.profile.role = 'SERVICE'
+            user.profile.save()
+            user.profile.service_categories.set(self.categories)
+            user.profile.service_areas.set(self.areas)
+            AvailabilitySlot.objects.create(provider=user.profile, weekday=1, start_time='09:00', end_time='17:00')
+        return user
+
+    def assertConstantQueries(self, url, add_row):
+        counts = []
+        for rows in [1, 4]:
+            for _ in range(rows):
+                add_row()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(queries))
+        self.assertGreaterEqual(len(response.data), 5)
+        self.assertEqual(counts[0], counts[1], f'{url}: {counts[0]} queries for 1 row, {counts[1]} for 5')
+
+    def test_providers(self):
+        self.assertConstantQueries('/providers/', lambda: self.user(provider=True))
+
+    def test_top_providers(self):
+        self.assertConstantQueries('/providers/top/', lambda: self.user(provider=True))
+
+    def test_provider_reviews(self):
+        def review():
+            customer = self.user()
+            Review.objects.create(booking=completed_booking(customer, self.owner.profile), user=customer,
+                                  provider=self.owner.profile, rating=5, comment='Good')
+        self.assertConstantQueries(f'/providers/{self.owner.profile.pk}/reviews/', review)
+
+    def test_bookings(self):
+        self.assertConstantQueries('/bookings/', lambda: completed_booking(self.owner, self.user(True).profile))
+
+    def test_reports(self):
+        self.assertConstantQueries('/reports/my/', lambda: Report.objects.create(
+            reporter=self.owner, reported_user=self.user(), report_type='FRAUD', description='Scam'
+        ))
+
+    def test_marketplace(self):
+        self.assertConstantQueries('/marketplace/', lambda: self.make_product(self.user()))
+
+    def test_my_products(self):
+        self.assertConstantQueries('/marketplace/my-products/', lambda: self.make_product(self.owner))
+
+    def test_product_comments(self):
+        self.assertConstantQueries(f'/marketplace/{self.product.pk}/comments/', lambda: ProductComment.objects.create(
+            product=self.product, user=self.user(), comment='Still there?'
+        ))
+
+    def test_my_product_comments(self):
+        self.assertConstantQueries('/marketplace/my-product-comments/', lambda: ProductComment.objects.create(
+            product=self.product, user=self.user(), comment='Still there?'
+        ))
+
+
+def image_file(name, size=(1200, 600), image_format='JPEG'):
+    output = BytesIO()
+    Image.new('RGB', size, 'teal').save(output, format=image_format)
+    return SimpleUploadedFile(name, output.getvalue())
+
+
+class ImageVariantTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = UserModel.objects.create_user(username='seller', email='seller@example.com', password='x')
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        storage = {'BACKEND': 'django.core.files.storage.FileSystemStorage'}
+        settings_override = override_settings(
+            MEDIA_ROOT=directory.name, RESPONSE_CACHE_TIMEOUT=0,
+            STORAGES={**settings.STORAGES, 'default': storage, 'image_variants': storage},
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.seller)
+
+    def create_product(self, **images):
+        data = {'title': 'Sofa', 'description': 'Sofa', 'category': 'FURNITURE', 'condition': 'GOOD',
+                'price': 100, 'address': '1 Street', 'city': 'Pune', **images}
+        return self.client.post('/marketplace/create/', data, format='multipart')
+
+    def open_variant(self, name):
+        with get_storage().open(name) as file:
+            image = Image.open(BytesIO(file.read()))
+        return image.format, image.size
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIZE=20000)
+    def test_uploads_are_checked(self):
+        noise = BytesIO()
+        Image.frombytes('RGB', (100, 100), os.urandom(30000)).save(noise, format='PNG')
+        uploads = {
+            'main_image': SimpleUploadedFile('noise.png', noise.getvalue()),
+            'image_2': image_file('sofa.bmp', image_format='BMP'),
+            'image_3': SimpleUploadedFile('sofa.jpg', b'not an image'),
+        }
+        for field, upload in uploads.items():
+            response = self.create_product(**{field: upload})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(list(response.data), [field])
+        self.assertFalse(Product.objects.exists())
+
+        response = self.client.put('/profile/', {'avatar': image_file('me.bmp', image_format='BMP')},
+                                   format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('avatar', response.data)
+
+        response = self.create_product(main_image=image_file('sofa.png', (50, 50), 'PNG'))
+        self.assertEqual(response.status_code, 201)
+
+    def test_variants_are_generated_in_the_background(self):
+        response = self.create_product(main_image=image_file('sofa.jpg'))
+        self.assertEqual(response.status_code, 201)
+        product = Product.objects.get()
+        # Not in the request: the original until the job has run
+        self.assertEqual(product.image_variants, {})
+        self.assertTrue(response.data['thumb'].endswith(product.main_image.url))
+        self.assertTrue(Job.objects.filter(name='local_user.images.generate_variants').exists())
+
+        run_pending()
+        product.refresh_from_db()
+        source = product.main_image.name
+        self.assertEqual(product.image_variants, {'main_image': {
+            'source': source, 'thumb': variant_name(source, 'thumb'), 'medium': variant_name(source, 'medium'),
+        }})
+        self.assertEqual(self.open_variant(variant_name(source, 'thumb')), ('WEBP', (200, 100)))
+        self.assertEqual(self.open_variant(variant_name(source, 'medium')), ('WEBP', (800, 400)))
+        response = self.client.get(f'/marketplace/{product.pk}/')
+        self.assertTrue(response.data['thumb'].endswith(get_storage().url(variant_name(source, 'thumb'))))
+        self.assertTrue(response.data['medium'].endswith(get_storage().url(variant_name(source, 'medium'))))
+
+    @override_settings(IMAGE_VARIANT_FORMAT='JPEG')
+    def test_replaced_images_replace_their_variants(self):
+        self.create_product(main_image=image_file('sofa.jpg'))
+        run_pending()
+        product = Product.objects.get()
+        old_thumb = product.image_variants['main_image']['thumb']
+        self.assertEqual(self.open_variant(old_thumb), ('JPEG', (200, 100)))
+
+        product.main_image.save('table.png', image_file('table.png', (600, 1200), 'PNG'))
+        run_pending()
+        product.refresh_from_db()
+        entry = product.image_variants['main_image']
+        self.assertEqual(entry['source'], product.main_image.name)
+        self.assertEqual(self.open_variant(entry['thumb']), ('JPEG', (100, 200)))
+        self.assertFalse(get_storage().exists(old_thumb))
+
+    def test_unreadable_images_are_recorded_once(self):
+        product = Product.objects.create(
+            seller=self.seller, title='Sofa', description='Sofa', category='FURNITURE', condition='GOOD',
+            price=100, address='1 Street', city='Pune', main_image=ContentFile(b'not an image', name='sofa.jpg'),
+        )
+        with self.assertLogs('local_user.images', 'WARNING'):
+            run_pending()
+        product.refresh_from_db()
+        self.assertEqual(product.image_variants, {'main_image': {'source': product.main_image.name}})
+        product.save()
+        self.assertFalse(Job.objects.exists())
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0, PRODUCT_VIEW_FLUSH_INTERVAL=3600)
+class ViewCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = UserModel.objects.create_user(username='seller', email='seller@example.com', password='x')
+        cls.sofa, cls.table = [
+            Product.objects.create(seller=seller, title=title, description=title, category='FURNITURE',
+                                   condition='GOOD', price=100, address='1 Street', city='Pune')
+            for title in ['Sofa', 'Table']
+        ]
+
+    def setUp(self):
+        # The buffer is per process; start each test empty and flushed
+        product_views._pending.clear()
+        product_views._last_flush = time.monotonic()
+        self.addCleanup(product_views._pending.clear)
+
+    def view(self, product):
+        response = APIClient().get(f'/marketplace/{product.pk}/')
+        self.assertEqual(response.status_code, 200)
+        return response.data['views']
+
+    def stored_views(self):
+        return dict(Product.objects.values_list('title', 'views'))
+
+    def test_views_are_buffered(self):
+        with CaptureQueriesContext(connection) as queries:
+            counts = [self.view(self.sofa) for _ in range(3)]
+        # Each response counts its own view, but nothing is written
+        self.assertEqual(counts, [1, 2, 3])
+        self.assertFalse([query for query in queries if query['sql'].startswith('UPDATE')])
+        self.assertEqual(self.stored_views(), {'Sofa': 0, 'Table': 0})
+
+    def test_flushed_after_a_response_once_due(self):
+        for _ in range(5):
+            self.view(self.sofa)
+        self.view(self.table)
+        product_views._last_flush -= 3600
+
+        # The flush runs on request_finished, after any request
+        with CaptureQueriesContext(connection) as queries:
+            APIClient().get('/marketplace/')
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+        # One UPDATE per product, adding its views to the stored count
+        increments = sorted(int(re.search(r'"views" = \("local_user_product"."views" \+ (\d+)\)', sql)[1])
+                            for sql in updates)
+        self.assertEqual(increments, [1, 5])
+        self.assertEqual(self.stored_views(), {'Sofa': 5, 'Table': 1})
+        self.assertEqual(product_views.pending(self.sofa.pk), 0)
+        self.assertEqual(self.view(self.sofa), 6)
+
+    def test_failed_flushes_keep_the_counts(self):
+        counter = ViewCounter(flush_interval=0)
+        counter.increment(self.sofa.pk, 4)
+        with mock.patch('django.db.models.query.QuerySet.update', side_effect=DatabaseError), \
+                self.assertLogs('local_user.view_counter', 'ERROR'):
+            counter.flush()
+        self.assertEqual(counter.pending(self.sofa.pk), 4)
+        counter.flush()
+        self.assertEqual(counter.pending(self.sofa.pk), 0)
+        self.assertEqual(self.stored_views()['Sofa'], 4)
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class TaxonomyTests(TestCase):
+    # 40 characters, but NFKD turns each ligature into "ffi": a 120 character slug
+    LONG_NAME = '\ufb03' * 40
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.plumbing, cls.painting = ServiceCategory.objects.resolve(['Plumbing', 'Painting'])
+        for name, categories in [('first', ['Plumbing', 'Painting']), ('second', ['Plumbing'])]:
+            user = UserModel.objects.create_user(username=name, email=f'{name}@example.com', password='x',
+                                                 is_service_provider=True)
+            user.profile.role = 'SERVICE'
+            user.profile.save()
+            user.profile.service_categories.set(ServiceCategory.objects.resolve(categories))
+        # Not a provider (any more): not counted
+        customer = UserModel.objects.create_user(username='customer', email='customer@example.com', password='x')
+        customer.profile.service_categories.set([cls.plumbing])
+
+    def setUp(self):
+        cache.clear()
+
+    def catalog(self):
+        response = APIClient().get('/categories/')
+        self.assertEqual(response.status_code, 200)
+        return [(term['name'], term['slug'], term['provider_count']) for term in response.data]
+
+    def test_names_are_matched_by_slug(self):
+        self.assertEqual(split_terms('Plumbing, plumbing ,, Electrical'), ['Plumbing', 'Electrical'])
+        self.assertEqual(ServiceCategory.objects.resolve(' PLUMBING,Painting'), [self.plumbing, self.painting])
+        self.assertEqual(ServiceCategory.objects.count(), 2)
+
+    def test_long_names_fit_the_slug_column(self):
+        [term] = ServiceCategory.objects.resolve([self.LONG_NAME])
+        self.assertEqual((term.name, term.slug), (self.LONG_NAME, 'ffi' * 33 + 'f'))
+        self.assertEqual(ServiceCategory.objects.resolve([self.LONG_NAME]), [term])
+        UserModel.objects.get(username='second').profile.service_categories.add(term)
+        response = APIClient().get('/providers/', {'category': self.LONG_NAME})
+        self.assertEqual([provider['username'] for provider in response.data], ['second'])
+
+    def test_catalog_counts_providers(self):
+        self.assertEqual(self.catalog(), [('Painting', 'painting', 1), ('Plumbing', 'plumbing', 2)])
+        # Cached, and dropped when a provider's categories change
+        with self.assertNumQueries(0):
+            self.catalog()
+        UserModel.objects.get(username='second').profile.service_categories.set(
+            ServiceCategory.objects.resolve(['Painting', 'Roofing'])
+        )
+        self.assertEqual(self.catalog(), [('Painting', 'painting', 2), ('Plumbing', 'plumbing', 1),
+                                          ('Roofing', 'roofing', 1)])
+
+
+class MigrationTestCase(TransactionTestCase):
+    """Runs the local_user migrations back to `migrate_from`, then forward again in the test"""
+    migrate_from = None
+
+    def setUp(self):
+        self.latest = MigrationExecutor(connection).loader.graph.leaf_nodes('local_user')
+        self.addCleanup(self.migrate, self.latest)
+        self.old_apps = self.migrate([('local_user', self.migrate_from)])
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        executor.loader.build_graph()
+        return executor.loader.project_state(targets).apps
+
+
+class TaxonomyMigrationTests(MigrationTestCase):
+    migrate_from = '0005_provider_trigram_search'
+
+    def test_json_lists_are_copied_to_the_tables(self):
+        OldUser = self.old_apps.get_model('local_user', 'UserModel')
+        OldProfile = self.old_apps.get_model('local_user', 'Profile')
+        lists = {
+            'first': (['Plumbing', ' plumbing ', 'Electrical', ''], ['Andheri']),
+            # Older clients stored comma separated strings
+            'second': ('Electrical, Painting,', 'Andheri,Bandra'),
+            'third': ([TaxonomyTests.LONG_NAME, 'x' * 120], []),
+        }
+        for name, (categories, areas) in lists.items():
+            user = OldUser.objects.create(username=name, email=f'{name}@example.com')
+            OldProfile.objects.create(user=user, role='SERVICE', categories=categories, service_locations=areas)
+
+        self.migrate(self.latest)
+        copied = {
+            profile.user.username: (
+                sorted(profile.service_categories.values_list('name', flat=True)),
+                sorted(profile.service_areas.values_list('name', flat=True)),
+            )
+            for profile in Profile.objects.select_related('user')
+        }
+        self.assertEqual(copied, {
+            'first': (['Electrical', 'Plumbing'], ['Andheri']),
+            'second': (['Electrical', 'Painting'], ['Andheri', 'Bandra']),
+            'third': (sorted([TaxonomyTests.LONG_NAME, 'x' * 100]), []),
+        })
+        # One row per term, shared between profiles, slugs within the column
+        self.assertEqual(ServiceCategory.objects.count(), 5)
+        self.assertEqual(sorted(ServiceCategory.objects.values_list('slug', flat=True)),
+                         ['electrical', 'ffi' * 33 + 'f', 'painting', 'plumbing', 'x' * 100])
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class ProductSearchTests(TestCase):
+    # title, description, seller
+    PRODUCTS = [
+        ('Leather sofa', 'Brown, three seats', 'seller'),
+        ('Oak table', 'Comes with a matching sofa cushion', 'seller'),
+        ('Brass lamp', 'Reading light', 'sofa'),
+        ('Sofa bed', 'Broken frame', 'seller'),
+        ('Sofabed', 'Folds out', 'seller'),
+        ('Leather armchair', 'Goes with any sofa', 'seller'),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        sellers = {
+            name: UserModel.objects.create_user(username=name, email=f'{name}@example.com', password='x')
+            for name in {seller for _, _, seller in cls.PRODUCTS}
+        }
+        for title, description, seller in cls.PRODUCTS:
+            Product.objects.create(seller=sellers[seller], title=title, description=description,
+                                   category='FURNITURE', condition='GOOD', price=100, address='1 Street',
+                                   city='Pune')
+
+    def search(self, text):
+        response = APIClient().get('/marketplace/', {'search': text})
+        self.assertEqual(response.status_code, 200)
+        return [product['title'] for product in response.data]
+
+    def test_ranked_by_field_weight(self):
+        titles = self.search('sofa')
+        # Title matches, then description matches, then the seller's name
+        self.assertCountEqual(titles[:2], ['Leather sofa', 'Sofa bed'])
+        self.assertCountEqual(titles[2:4], ['Oak table', 'Leather armchair'])
+        self.assertEqual(titles[4:], ['Brass lamp'])
+        # An explicit ordering wins over relevance
+        response = APIClient().get('/marketplace/', {'search': 'sofa', 'ordering': 'created_at'})
+        self.assertEqual([product['title'] for product in response.data],
+                         ['Leather sofa', 'Oak table', 'Brass lamp', 'Sofa bed', 'Leather armchair'])
+
+    def test_query_syntax(self):
+        self.assertCountEqual(self.search('leather sofa'), ['Leather sofa', 'Leather armchair'])
+        self.assertEqual(self.search('"leather sofa"'), ['Leather sofa'])
+        self.assertEqual(self.search('"sofa leather"'), [])
+        self.assertNotIn('Sofabed', self.search('sofa'))
+        self.assertIn('Sofabed', self.search('sof*'))
+        self.assertNotIn('Sofa bed', self.search('sofa -broken'))
+        self.assertIn('Sofa bed', self.search('sofa -"broken leg"'))
+        # Operators are not passed through to to_tsquery()
+        self.assertEqual(self.search("sofa & !lamp | ('"), self.search('sofa lamp'))
+
+    def test_kept_up_to_date_by_the_trigger(self):
+        Product.objects.filter(title='Oak table').update(title='Oak desk')
+        self.assertEqual(self.search('desk'), ['Oak desk'])
+        self.assertEqual(self.search('table'), [])
+
+        product = Product.objects.get(title='Brass lamp')
+        product.seller = UserModel.objects.get(username='seller')
+        product.save()
+        self.assertNotIn('Brass lamp', self.search('sofa'))
+
+        Product.objects.bulk_create([Product(seller=product.seller, title='Bookshelf', description='Pine',
+                                             category='FURNITURE', condition='GOOD', price=50,
+                                             address='1 Street', city='Pune')])
+        self.assertEqual(self.search('pine'), ['Bookshelf'])
+
+
+class SearchVectorMigrationTests(MigrationTestCase):
+    migrate_from = '0003_counter_caches'
+
+    def test_existing_products_are_backfilled(self):
+        seller = self.old_apps.get_model('local_user', 'UserModel').objects.create(username='seller',
+                                                                                    email='seller@example.com')
+        OldProduct = self.old_apps.get_model('local_user', 'Product')
+        for title in ['Leather sofa', 'Oak table']:
+            OldProduct.objects.create(seller=seller, title=title, description='Used', category='FURNITURE',
+                                      condition='GOOD', price=100, address='1 Street', city='Pune')
+
+        self.migrate(self.latest)
+        self.assertFalse(Product.objects.filter(search_vector__isnull=True).exists())
+        matches = Product.objects.filter(search_vector=parse_search_query('sofa'))
+        self.assertEqual(list(matches.values_list('title', flat=True)), ['Leather sofa'])
+        # The seller's name is searchable too
+        self.assertEqual(Product.objects.filter(search_vector=parse_search_query('seller')).count(), 2)
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class AsyncViewParityTests(TestCase):
+    """The async read views answer exactly like the DRF views they wrap"""
+
+    @classmethod
+    def setUpTestData(cls):
+        customer = UserModel.objects.create_user(username='customer', email='customer@example.com', password='x')
+        plumbing, painting = ServiceCategory.objects.resolve(['Plumbing', 'Painting'])
+        for name, latitude, categories in [('rajesh', 19.1, [plumbing]), ('sunita', 19.2, [plumbing, painting])]:
+            user = UserModel.objects.create_user(username=name, email=f'{name}@example.com', password='x',
+                                                 is_service_provider=True)
+            user.profile.role = 'SERVICE'
+            user.profile.bio = 'Plumber and painter'
+            user.profile.latitude, user.profile.longitude = latitude, 72.8
+            user.profile.save()
+            user.profile.service_categories.set(categories)
+            Review.objects.create(booking=completed_booking(customer, user.profile), user=customer,
+                                  provider=user.profile, rating=4, comment='Good')
+        cls.provider = user.profile
+        refresh_rankings()
+        for title in ['Leather sofa', 'Sofa bed', 'Oak table']:
+            cls.product = Product.objects.create(
+                seller=customer, title=title, description=title, category='FURNITURE', condition='GOOD',
+                price=100, address='1 Street', city='Pune'
+            )
+            ProductComment.objects.create(product=cls.product, user=user, comment='Still there?')
+
+    def assertSameResponse(self, path, params=None):
+        # Detail views count a view per request; start both from the same count
+        product_views._pending.clear()
+        expected = APIClient().get(path, params)
+        product_views._pending.clear()
+        with override_settings(ROOT_URLCONF=ASGI_URLCONF):
+            response = ASGIClient().get(path, params)
+            # resolver_match is lazy: resolve while the URLs are overridden
+            self.assertTrue(issubclass(response.resolver_match.func.view_class, AsyncReadView))
+        self.assertEqual(
+            (response.status_code, response.data, response.get('Link')),
+            (expected.status_code, expected.data, expected.get('Link')),
+        )
+        return response
+
+    def test_providers(self):
+        self.assertSameResponse('/providers/')
+        self.assertSameResponse('/providers/', {'page_size': 1})
+        self.assertSameResponse('/providers/', {'category': 'painting', 'ordering': 'created_at'})
+        self.assertSameResponse('/providers/', {'search': 'plumber'})
+        self.assertSameResponse('/providers/', {'search': 'rajsh', 'search_mode': 'fuzzy'})
+        self.assertSameResponse('/providers/', {'near': '19.1,72.8', 'radius': 50})
+        self.assertSameResponse('/providers/', {'near': 'nowhere'})
+        self.assertSameResponse('/providers/top/', {'category': 'plumbing'})
+        self.assertSameResponse(f'/providers/{self.provider.pk}/reviews/')
+
+    def test_marketplace(self):
+        self.assertSameResponse('/marketplace/')
+        response = self.assertSameResponse('/marketplace/', {'search': 'sofa', 'page_size': 1})
+        self.assertEqual(len(response.data), 1)
+        self.assertSameResponse('/marketplace/', {'ordering': 'price', 'max_price': 150})
+        self.assertSameResponse(f'/marketplace/{self.product.pk}/')
+        self.assertSameResponse('/marketplace/999999/')
+        self.assertSameResponse(f'/marketplace/{self.product.pk}/comments/')
+
+
+class ForeignKeyIndexTests(TestCase):
+    def test_covered_foreign_keys_have_no_index_of_their_own(self):
+        for model, field, covering_index in [
+            (Booking, 'user', 'booking_user_created'),
+            (Booking, 'service_provider', 'booking_provider_created'),
+            (Review, 'provider', 'review_provider_created'),
+            (Report, 'reporter', 'report_reporter_created'),
+        ]:
+            with connection.cursor() as cursor:
+                constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+            column = model._meta.get_field(field).column
+            self.assertEqual(constraints[covering_index]['columns'][0], column)
+            self.assertFalse([name for name, constraint in constraints.items()
+                              if constraint['index'] and constraint['columns'] == [column]])
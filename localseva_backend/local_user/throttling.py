@@ -0,0 +1,268 @@
+"""
+Token-bucket throttling and load shedding, shared by all workers on a machine.
+
+Throttling: every client has a bucket per scope that refills at RATE tokens
+per second, up to BURST, and each request takes its cost out of it:
+
+- `UserTokenBucketThrottle` - one bucket per logged-in user;
+- `IPTokenBucketThrottle` - one bucket per client IP, for every request,
+  so anonymous clients and many accounts behind one address are limited too.
+
+A request costs the view's `throttle_cost` (1 by default; login and
+register run PBKDF2 and cost more), plus QUERY_COSTS for the search and
+distance filters. Costs grow with the load the shedder sees, up to double
+at its in-flight limit. An empty bucket gets 429 with Retry-After.
+
+Load shedding: `LoadSheddingMiddleware` answers 503 with Retry-After
+before any work is done when either
+
+- more than SHED_MAX_IN_FLIGHT requests are in progress across all workers, or
+- database queries have been slower than SHED_DB_LATENCY_MS on average
+  lately. A growing share of requests is shed the slower they get, but
+  never all of them, so the latency keeps being measured and recovers.
+
+Both keep their state in one SQLite file (THROTTLE_STORE) instead of
+process memory, so the limits apply to the machine rather than to each
+worker, with no extra service to run. A request costs a few short
+statements on it; if the store can't be used the request is let through.
+Under ASGI those statements run in worker threads, never on the event loop:
+the shedder hands them to a thread pool, and the async read views throttle
+in the thread that runs the rest of their DRF checks (async_views.py).
+"""
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import JsonResponse
+from rest_framework.throttling import BaseThrottle
+
+# Module, not names: metrics.py defines a view, which loads these throttles
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Extra cost of the expensive list filters
+QUERY_COSTS = {'search': 3, 'near': 2}
+# Worker rows not updated for this long belong to workers that are gone
+WORKER_TTL = 60
+# Weight of the latest request in a worker's average query latency
+LATENCY_WEIGHT = 0.2
+# Never shed more than this share of requests because of latency
+MAX_LATENCY_SHED = 0.9
+# Paths the shedder always lets through, so operators can still look in
+SHED_EXEMPT_PREFIXES = ('/admin/', '/metrics')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS workers (
+    pid INTEGER PRIMARY KEY, in_flight INTEGER NOT NULL, db_latency REAL NOT NULL, updated REAL NOT NULL
+);
+"""
+
+
+class SharedStore:
+    """Buckets and worker load in a SQLite file, one connection per thread"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self._local = threading.local()
+        self._last_prune = time.time()
+
+    def get_path(self):
+        return self.path or getattr(settings, 'THROTTLE_STORE', '/var/tmp/localseva_throttle.sqlite3')
+
+    def connection(self):
+        connection = getattr(self._local, 'connection', None)
+        # A forked worker must not reuse its parent's connection
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.get_path(), timeout=1, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            # Losing the last moments of throttle state in a crash is fine
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.executescript(SCHEMA)
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    def take(self, key, cost, rate, burst):
+        """Take `cost` tokens from the bucket; returns seconds to wait if there aren't enough"""
+        now = time.time()
+        cost = min(cost, burst)
+        params = {'key': key, 'cost': cost, 'rate': rate, 'burst': burst, 'now': now}
+        connection = self.connection()
+        taken = connection.execute(
+            """
+            INSERT INTO buckets (key, tokens, updated) VALUES (:key, :burst - :cost, :now)
+            ON CONFLICT (key) DO UPDATE SET
+                tokens = min(:burst, tokens + (:now - updated) * :rate) - :cost, updated = :now
+            WHERE min(:burst, tokens + (:now - updated) * :rate) >= :cost
+            RETURNING tokens
+            """, params
+        ).fetchone()
+        self.prune_if_due(now)
+        if taken is not None:
+            return None
+        row = connection.execute(
+            'SELECT min(:burst, tokens + (:now - updated) * :rate) FROM buckets WHERE key = :key', params
+        ).fetchone()
+        tokens = row[0] if row else 0
+        return max(cost - tokens, 0) / rate
+
+    def prune_if_due(self, now):
+        # Buckets untouched for an hour are full again; forget them
+        if now - self._last_prune >= 60:
+            self._last_prune = now
+            self.connection().execute('DELETE FROM buckets WHERE updated < ?', (now - 3600,))
+
+    def publish(self, in_flight, db_latency):
+        """Store this worker's load; returns (requests in flight, average query latency) of all workers"""
+        now = time.time()
+        connection = self.connection()
+        connection.execute(
+            'INSERT OR REPLACE INTO workers (pid, in_flight, db_latency, updated) VALUES (?, ?, ?, ?)',
+            (os.getpid(), in_flight, db_latency, now)
+        )
+        total, latency = connection.execute(
+            'SELECT sum(in_flight), avg(db_latency) FROM workers WHERE updated >= ?', (now - WORKER_TTL,)
+        ).fetchone()
+        return total or 0, latency or 0.0
+
+
+store = SharedStore()
+
+
+def load_factor(request):
+    """0 when idle, 1 at the shedder's in-flight limit (set by LoadSheddingMiddleware)"""
+    return getattr(request, 'load_factor', 0.0)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    scope = None
+
+    def get_key(self, request):
+        raise NotImplementedError
+
+    def get_rate(self):
+        """(tokens per second, bucket size)"""
+        return (
+            getattr(settings, f'THROTTLE_{self.scope.upper()}_RATE'),
+            getattr(settings, f'THROTTLE_{self.scope.upper()}_BURST'),
+        )
+
+    def get_cost(self, request, view):
+        cost = getattr(view, 'throttle_cost', 1)
+        cost += sum(extra for param, extra in QUERY_COSTS.items() if request.query_params.get(param))
+        return cost * (1 + min(load_factor(request), 1))
+
+    def allow_request(self, request, view):
+        self.wait_seconds = None
+        key = self.get_key(request)
+        if key is None or not getattr(settings, 'THROTTLING', True):
+            return True
+        rate, burst = self.get_rate()
+        try:
+            self.wait_seconds = store.take(f'{self.scope}:{key}', self.get_cost(request, view), rate, burst)
+        except sqlite3.Error:
+            logger.exception("Throttle store unavailable, not throttling")
+            return True
+        return self.wait_seconds is None
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    scope = 'user'
+
+    def get_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return request.user.pk
+        return None
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    scope = 'ip'
+
+    def get_key(self, request):
+        return self.get_ident(request)
+
+
+class LoadSheddingMiddleware:
+    """503 + Retry-After while the machine is overloaded (see module docstring)"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'LOAD_SHEDDING', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.in_flight = 0
+        self.db_latency = 0.0
+        self._lock = threading.Lock()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if request.path.startswith(SHED_EXEMPT_PREFIXES):
+            return self.get_response(request)
+        shed = self.start(request)
+        if shed is not None:
+            return shed
+        try:
+            return self.get_response(request)
+        finally:
+            self.finish()
+
+    async def __acall__(self, request):
+        if request.path.startswith(SHED_EXEMPT_PREFIXES):
+            return await self.get_response(request)
+        # The store is a blocking SQLite file: keep it off the event loop
+        shed = await sync_to_async(self.start, thread_sensitive=False)(request)
+        if shed is not None:
+            return shed
+        try:
+            return await self.get_response(request)
+        finally:
+            await sync_to_async(self.finish, thread_sensitive=False)()
+
+    def update(self, change, latency=None):
+        with self._lock:
+            self.in_flight += change
+            if latency is not None:
+                self.db_latency += LATENCY_WEIGHT * (latency - self.db_latency)
+            in_flight, db_latency = self.in_flight, self.db_latency
+        try:
+            return store.publish(in_flight, db_latency)
+        except sqlite3.Error:
+            logger.exception("Throttle store unavailable, not shedding load")
+            return 0, 0.0
+
+    def start(self, request):
+        """Count the request in; returns the 503 response if it should be shed instead"""
+        in_flight, db_latency = self.update(+1)
+        max_in_flight = settings.SHED_MAX_IN_FLIGHT
+        max_latency = settings.SHED_DB_LATENCY_MS / 1000
+        request.load_factor = in_flight / max_in_flight if max_in_flight else 0.0
+
+        shed = bool(max_in_flight) and in_flight > max_in_flight
+        if not shed and max_latency and db_latency > max_latency:
+            shed = random.random() < min((db_latency - max_latency) / max_latency, MAX_LATENCY_SHED)
+        if not shed:
+            return None
+        self.update(-1)
+        response = JsonResponse({"detail": "Server is busy, please retry shortly"}, status=503)
+        response['Retry-After'] = str(settings.SHED_RETRY_AFTER)
+        return response
+
+    def finish(self):
+        # Average query time of this request, measured by RequestMetricsMiddleware
+        timings = metrics.current_timings.get()
+        latency = timings.db / timings.queries if timings is not None and timings.queries else None
+        self.update(-1, latency)
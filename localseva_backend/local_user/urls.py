@@ -1,34 +1,51 @@
+from django.conf import settings
 from django.urls import path, include
+from . import async_views
 from .views import (
-    RegisterView, LoginView, ProfileUpdateView,
-    BecomeServiceProviderView, ServiceProviderListView,
-    BookingCreateView, BookingListView, BookingDetailView,
+    RegisterView, LoginView, LogoutView, ProfileUpdateView, AvailabilitySlotsView,
+    BecomeServiceProviderView, ServiceProviderListView, TopProvidersView,
+    ServiceCategoryCatalogView, ServiceAreaCatalogView,
+    BookingCreateView, BookingListView, BookingDetailView, BookingBulkUpdateView,
     ReviewCreateView, ProviderReviewsListView,
     ReportCreateView, UserReportsListView,
-    ProductListView, ProductCreateView, ProductDetailView,
+    ProductListView, ProductCreateView, ProductBulkImportView, ProductDetailView,
     ProductCommentCreateView, ProductCommentListView, ProductCommentDeleteView,
     UserProductsListView, UserProductCommentsListView, home
 )
 
+
+def read_view(view_class, async_view_class):
+    """The async version of a read-heavy view when serving under ASGI"""
+    if settings.ASYNC_READ_VIEWS:
+        return async_view_class.as_view()
+    return view_class.as_view()
+
+
 urlpatterns = [
     #landing
     path("", home, name="home"),
     # Authentication
     path('register/', RegisterView.as_view(), name="register"),
     path('login/', LoginView.as_view(), name="login"),
+    path('logout/', LogoutView.as_view(), name="logout"),
 
     # Profile Management
     path('profile/', ProfileUpdateView.as_view(), name="profile"),
+    path('profile/availability/', AvailabilitySlotsView.as_view(), name="availability-slots"),
     path('profile/become-provider/', BecomeServiceProviderView.as_view(), name="become-provider"),
 
     # Service Providers Listing
-    path('providers/', ServiceProviderListView.as_view(), name="providers"),
-    path('providers/<int:provider_id>/reviews/', ProviderReviewsListView.as_view(), name="provider-reviews"),
+    path('providers/', read_view(ServiceProviderListView, async_views.AsyncServiceProviderListView), name="providers"),
+    path('providers/top/', read_view(TopProvidersView, async_views.AsyncTopProvidersView), name="top-providers"),
+    path('providers/<int:provider_id>/reviews/', read_view(ProviderReviewsListView, async_views.AsyncProviderReviewsListView), name="provider-reviews"),
+    path('categories/', ServiceCategoryCatalogView.as_view(), name="service-categories"),
+    path('service-areas/', ServiceAreaCatalogView.as_view(), name="service-areas"),
 
     # Bookings (Simplified Flow)
     path('bookings/', BookingListView.as_view(), name="bookings"),
     path('bookings/create/', BookingCreateView.as_view(), name="create-booking"),
     path('bookings/<int:pk>/', BookingDetailView.as_view(), name="booking-detail"),
+    path('bookings/bulk-update/', BookingBulkUpdateView.as_view(), name="bulk-update-bookings"),
 
     # Reviews
     path('reviews/create/', ReviewCreateView.as_view(), name="create-review"),
@@ -38,13 +55,14 @@ urlpatterns = [
     path('reports/my/', UserReportsListView.as_view(), name="my-reports"),
 
     # Marketplace (OLX-like)
-    path('marketplace/', ProductListView.as_view(), name="marketplace"),
+    path('marketplace/', read_view(ProductListView, async_views.AsyncProductListView), name="marketplace"),
     path('marketplace/create/', ProductCreateView.as_view(), name="create-product"),
-    path('marketplace/<int:pk>/', ProductDetailView.as_view(), name="product-detail"),
+    path('marketplace/import/', ProductBulkImportView.as_view(), name="import-products"),
+    path('marketplace/<int:pk>/', read_view(ProductDetailView, async_views.AsyncProductDetailView), name="product-detail"),
     path('marketplace/my-products/', UserProductsListView.as_view(), name="my-products"),
 
     # Product Comments
-    path('marketplace/<int:product_id>/comments/', ProductCommentListView.as_view(), name="product-comments"),
+    path('marketplace/<int:product_id>/comments/', read_view(ProductCommentListView, async_views.AsyncProductCommentListView), name="product-comments"),
     path('marketplace/comments/create/', ProductCommentCreateView.as_view(), name="create-comment"),
     path('marketplace/comments/<int:pk>/delete/', ProductCommentDeleteView.as_view(), name="delete-comment"),
     path('marketplace/my-product-comments/', UserProductCommentsListView.as_view(), name="my-product-comments"),
@@ -0,0 +1,76 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCounter:
+    """
+    Buffers product view increments in process memory and writes them out
+    periodically, one `UPDATE ... SET views = views + n` per product.
+
+    Compared with `product.views += 1; product.save()` on every GET this
+    doesn't rewrite the whole row, doesn't bump `updated_at` (QuerySet.update
+    skips auto_now), can't lose concurrent increments, and turns N writes to
+    a popular listing into one per flush interval.
+
+    Flushing happens after a response has been sent (see signals.py), so
+    it never adds latency to the request that triggers it. Counts not yet
+    flushed are lost if the process is killed hard; a normal shutdown
+    flushes them through atexit.
+    """
+
+    def __init__(self, flush_interval=None):
+        self.flush_interval = flush_interval
+        self._pending = Counter()
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def get_flush_interval(self):
+        if self.flush_interval is not None:
+            return self.flush_interval
+        return getattr(settings, 'PRODUCT_VIEW_FLUSH_INTERVAL', 10)
+
+    def increment(self, product_id, count=1):
+        with self._lock:
+            self._pending[product_id] += count
+
+    def flush_if_due(self):
+        # Called once the response has been sent (request_finished signal)
+        if self._pending and time.monotonic() - self._last_flush >= self.get_flush_interval():
+            self.flush()
+
+    def pending(self, product_id):
+        """Views recorded by this process that are not in the database yet"""
+        with self._lock:
+            return self._pending.get(product_id, 0)
+
+    def flush(self):
+        from .models import Product
+
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+
+        try:
+            with transaction.atomic():
+                # Fixed order so concurrent flushes from other workers can't deadlock
+                for product_id, count in sorted(pending.items()):
+                    Product.objects.filter(pk=product_id).update(views=F('views') + count)
+        except DatabaseError:
+            logger.exception("Failed to flush product view counts, will retry")
+            with self._lock:
+                self._pending.update(pending)
+
+
+product_views = ViewCounter()
+atexit.register(product_views.flush)
@@ -4,19 +4,35 @@ from rest_framework.response import Response
 from rest_framework import status, permissions
 from rest_framework.generics import ListAPIView, RetrieveAPIView, CreateAPIView, UpdateAPIView, DestroyAPIView
 from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.parsers import JSONParser, MultiPartParser
 from django.contrib.auth import authenticate
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
-from django.db import models
-from django.utils import timezone
+from django.core.cache import cache
+from django.db import models, transaction
 
 from .serializers import (
     RegisterSerializer, LoginSerializer, ProfileSerializer,
     ServiceProviderSerializer, BookingSerializer, BookingUpdateSerializer,
-    ReviewSerializer, ReportSerializer, ProductSerializer, ProductCommentSerializer
+    ReviewSerializer, ReportSerializer, ProductSerializer, ProductCommentSerializer,
+    TaxonomyTermSerializer, AvailabilitySlotSerializer
 )
-from .models import Profile, Booking, Review, Report, Product, ProductComment
+from .models import (
+    Profile, Booking, Review, Report, Product, ProductComment, ServiceCategory, ServiceArea,
+    AvailabilitySlot, term_slug
+)
+from .authentication import refresh_claims, revoke_token, token_for_user
+from .availability import ProviderAvailabilityFilter, reserve
+from .booking_bulk import bulk_transition
+from .booking_states import actor_for
+from .geo import NearbyFilter
+from .jobs import enqueue
+from .metrics import SerializerTimingMixin
+from .product_import import import_products, read_csv
+from .response_cache import CachedResponseMixin, invalidate_model
+from .search import ProductSearchFilter, ProviderSearchFilter, is_fuzzy_search
+from .tasks import mark_marketplace_seller
+from .view_counter import product_views
 
 User = get_user_model()
 
@@ -27,13 +43,15 @@ def home(request):
 
 class RegisterView(APIView):
     permission_classes = [permissions.AllowAny]
+    # Password hashing is slow on purpose
+    throttle_cost = 20
 
     def post(self, request):
         serializer = RegisterSerializer(data=request.data)
         if serializer.is_valid():
             data = serializer.validated_data
             user = serializer.save()
-            refresh = RefreshToken.for_user(user)
+            refresh = token_for_user(user)
             return Response({
                 "message": "User registered successfully",
                 "access": str(refresh.access_token),
@@ -46,6 +64,8 @@ class RegisterView(APIView):
 
 class LoginView(APIView):
     permission_classes = [permissions.AllowAny]
+    # Password hashing is slow on purpose
+    throttle_cost = 20
 
     def post(self, request):
         serializer = LoginSerializer(data=request.data)
@@ -56,7 +76,7 @@ class LoginView(APIView):
             if user is None:
                 return Response({"error": "Invalid credentials"}, status=status.HTTP_401_UNAUTHORIZED)
 
-            refresh = RefreshToken.for_user(user)
+            refresh = token_for_user(user)
 
             return Response({
                 "message": "Login successful",
@@ -69,6 +89,17 @@ class LoginView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class LogoutView(APIView):
+    """Revoke the access token this request was made with"""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        if request.auth is None:
+            return Response({"error": "Not logged in with a token"}, status=status.HTTP_400_BAD_REQUEST)
+        revoke_token(request.auth)
+        return Response({"message": "Logout successful"}, status=status.HTTP_200_OK)
+
+
 class ProfileUpdateView(APIView):
     """
     Single profile endpoint for all users
@@ -86,30 +117,70 @@ class ProfileUpdateView(APIView):
     def put(self, request):
         """Update profile - can upgrade to service provider"""
         profile = request.user.profile
+        role = profile.role
         data = request.data.copy()
 
         # If user is becoming a service provider
         if data.get('role') == 'SERVICE' and profile.role != 'SERVICE':
-            # Set role to service
+            # Set role to service (saved with the rest of the profile below)
             profile.role = "SERVICE"
-            profile.save()
-            # Update user model flag
-            request.user.is_service_provider = True
-            request.user.save()
 
         serializer = ProfileSerializer(profile, data=data, partial=True)
         if serializer.is_valid():
-            serializer.save()
-
-            # Update user's is_service_provider flag based on role
-            if 'role' in data:
-                request.user.is_service_provider = (data['role'] == 'SERVICE')
-                request.user.save()
+            # One profile write and at most one user write, together
+            with transaction.atomic():
+                serializer.save()
+
+                # Update user's is_service_provider flag based on role
+                claims_changed = profile.role != role
+                if 'role' in data:
+                    is_service_provider = (data['role'] == 'SERVICE')
+                    if request.user.is_service_provider != is_service_provider:
+                        request.user.is_service_provider = is_service_provider
+                        request.user.save(update_fields=['is_service_provider'])
+                        claims_changed = True
+
+                # Tokens issued so far carry the old role
+                if claims_changed:
+                    refresh_claims(request.user)
 
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class AvailabilitySlotsView(APIView):
+    """
+    The provider's weekly availability slots; PUT replaces all of them
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        slots = AvailabilitySlot.objects.filter(provider=request.user.profile)
+        return Response(AvailabilitySlotSerializer(slots, many=True).data)
+
+    def put(self, request):
+        profile = request.user.profile
+        if profile.role != 'SERVICE':
+            return Response(
+                {"error": "Only service providers have availability slots"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        serializer = AvailabilitySlotSerializer(data=request.data, many=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            AvailabilitySlot.objects.filter(provider=profile).delete()
+            slots = AvailabilitySlot.objects.bulk_create(
+                AvailabilitySlot(provider=profile, **slot) for slot in serializer.validated_data
+            )
+            # bulk_create sends no signals
+            invalidate_model(AvailabilitySlot.__name__)
+        slots.sort(key=lambda slot: (slot.weekday, slot.start_time))
+        return Response(AvailabilitySlotSerializer(slots, many=True).data)
+
+
 class BecomeServiceProviderView(APIView):
     """
     Quick endpoint to mark user as service provider
@@ -126,8 +197,11 @@ class BecomeServiceProviderView(APIView):
                 "next_step": "Update your profile to add service provider details"
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        request.user.is_service_provider = True
-        request.user.save()
+        with transaction.atomic():
+            request.user.is_service_provider = True
+            request.user.save(update_fields=['is_service_provider'])
+            # Tokens issued so far say otherwise
+            refresh_claims(request.user)
 
         return Response({
             "message": "You are now marked as a service provider!",
@@ -145,14 +219,20 @@ class BecomeServiceProviderView(APIView):
         }, status=status.HTTP_200_OK)
 
 
-class ServiceProviderListView(ListAPIView):
+class ServiceProviderListView(SerializerTimingMixin, CachedResponseMixin, ListAPIView):
     """List all service providers (profiles with role=SERVICE)"""
+    cache_namespace = 'providers'
     permission_classes = [permissions.AllowAny]
     serializer_class = ServiceProviderSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    # ?search_mode=fuzzy switches search and location to trigram matching,
+    # ?near=lat,lng&radius=km returns the nearest providers first,
+    # ?available_from=&available_to= only those free in that window
+    filter_backends = [DjangoFilterBackend, NearbyFilter, ProviderSearchFilter, ProviderAvailabilityFilter,
+                       filters.OrderingFilter]
     filterset_fields = ['pricing_type', 'is_available']
     search_fields = ['user__username', 'bio', 'location', 'description']
-    ordering_fields = ['rating', 'experience_years', 'base_price']
+    ordering_fields = ['ranking_score', 'rating', 'experience_years', 'base_price', 'created_at']
+    ordering = ['-ranking_score']
 
     def get_queryset(self):
         queryset = Profile.objects.filter(role='SERVICE')
@@ -165,7 +245,10 @@ class ServiceProviderListView(ListAPIView):
         # Filter by location if provided
         location = self.request.query_params.get('location', None)
         if location:
-            queryset = queryset.filter(location__icontains=location)
+            if is_fuzzy_search(self.request):
+                queryset = queryset.filter(location__trigram_similar=location)
+            else:
+                queryset = queryset.filter(location__icontains=location)
 
         # Filter by min experience if provided
         min_experience = self.request.query_params.get('min_experience', None)
@@ -177,28 +260,92 @@ class ServiceProviderListView(ListAPIView):
         if max_price:
             queryset = queryset.filter(base_price__lte=float(max_price))
 
-        # Filter by category if provided (checking JSON array)
+        # Filter by category / served area (indexed join on the taxonomy tables)
         category = self.request.query_params.get('category', None)
         if category:
-            # This is a basic filter for JSON array - might need adjustment based on exact JSON structure
-            queryset = queryset.filter(categories__contains=[category])
+            queryset = queryset.filter(service_categories__slug=term_slug(category))
+
+        service_area = self.request.query_params.get('service_area', None)
+        if service_area:
+            queryset = queryset.filter(service_areas__slug=term_slug(service_area))
+
+        return ServiceProviderSerializer.setup_eager_loading(queryset)
+
+
+class TopProvidersView(SerializerTimingMixin, CachedResponseMixin, ListAPIView):
+    """
+    Best ranked available providers, optionally of one category and/or
+    service area (see ranking.py). Read in score order from an index:
+    the category's when one is given, otherwise the profiles'.
+    """
+    cache_namespace = 'top-providers'
+    permission_classes = [permissions.AllowAny]
+    serializer_class = ServiceProviderSerializer
+    filter_backends = []
+    ordering = ['-score']
+
+    def get_queryset(self):
+        queryset = Profile.objects.filter(role='SERVICE', is_available=True)
+        score = models.F('ranking_score')
+
+        category = self.request.query_params.get('category')
+        if category:
+            # By id, so the plan can walk that category's part of the index
+            category_id = ServiceCategory.objects.filter(slug=term_slug(category)).values_list('pk', flat=True).first()
+            if category_id is None:
+                queryset = queryset.none()
+            else:
+                queryset = queryset.filter(providercategory__servicecategory_id=category_id)
+                score = models.F('providercategory__ranking_score')
+        queryset = queryset.annotate(score=score)
+
+        service_area = self.request.query_params.get('service_area')
+        if service_area:
+            queryset = queryset.filter(service_areas__slug=term_slug(service_area))
+
+        return ServiceProviderSerializer.setup_eager_loading(queryset)
+
+
+class ServiceCategoryCatalogView(APIView):
+    """All service categories with the number of providers offering them (cached)"""
+    permission_classes = [permissions.AllowAny]
+    model = ServiceCategory
+    cache_timeout = 60 * 10
+
+    def get(self, request):
+        cache_key = self.model.catalog_cache_key()
+        data = cache.get(cache_key)
+        if data is None:
+            terms = self.model.objects.annotate(
+                provider_count=models.Count('providers', filter=models.Q(providers__role='SERVICE'))
+            ).order_by('name')  # Meta.ordering doesn't apply to aggregations
+            data = TaxonomyTermSerializer(terms, many=True).data
+            cache.set(cache_key, data, self.cache_timeout)
+        return Response(data)
+
 
-        return queryset
+class ServiceAreaCatalogView(ServiceCategoryCatalogView):
+    """All service areas with the number of providers serving them (cached)"""
+    model = ServiceArea
 
 
-class BookingCreateView(CreateAPIView):
+class BookingCreateView(SerializerTimingMixin, CreateAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = BookingSerializer
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        # The booking only exists if its time could be reserved
+        with transaction.atomic():
+            booking = serializer.save(user=self.request.user)
+            reserve(booking)
 
 
-class BookingListView(ListAPIView):
+class BookingListView(SerializerTimingMixin, ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = BookingSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['status']
+    ordering = ['-created_at']
 
     def get_queryset(self):
         user = self.request.user
@@ -206,15 +353,17 @@ class BookingListView(ListAPIView):
 
         if user_type == 'provider' and user.is_service_provider:
             # Return bookings where user is the service provider
-            return Booking.objects.filter(service_provider=user.profile)
+            queryset = Booking.objects.filter(service_provider=user.profile)
         else:
             # Return bookings where user is the customer
-            return Booking.objects.filter(user=user)
+            queryset = Booking.objects.filter(user=user)
+
+        return BookingSerializer.setup_eager_loading(queryset)
 
 
 
 #changes in update
-class BookingDetailView(RetrieveAPIView, UpdateAPIView):
+class BookingDetailView(SerializerTimingMixin, RetrieveAPIView, UpdateAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_serializer_class(self):
@@ -225,75 +374,74 @@ class BookingDetailView(RetrieveAPIView, UpdateAPIView):
     def get_queryset(self):
         user = self.request.user
         # Users can see bookings they made OR bookings they received as service providers
-        return Booking.objects.filter(
+        queryset = Booking.objects.filter(
             models.Q(user=user) |
             models.Q(service_provider=user.profile)
         )
+        return BookingSerializer.setup_eager_loading(queryset)
 
     def update(self, request, *args, **kwargs):
         booking = self.get_object()
-        user = request.user
-
-        # Use appropriate serializer
-        if user.profile == booking.service_provider:
-            # Provider can give quote or update status
-            serializer = BookingUpdateSerializer(booking, data=request.data, partial=True, context={'request': request})
-        elif user == booking.user:
-            # User can accept/reject quote or update notes
-            data = request.data.copy()
-            # User can accept quote, reject quote, or update notes
-            if 'status' in data and data['status'] in ['ACCEPTED', 'REJECTED']:
-                serializer = BookingUpdateSerializer(booking, data=data, partial=True, context={'request': request})
-            else:
-                # User updating notes only
-                booking.user_notes = data.get('user_notes', booking.user_notes)
-                booking.save()
-                serializer = BookingSerializer(booking)
-                return Response(serializer.data)
-        else:
+
+        # Provider can give quote or update status, user can accept/reject quote or update notes
+        actor = actor_for(booking, request.user)
+        if actor is None:
             return Response(
                 {"error": "You don't have permission to update this booking"},
                 status=status.HTTP_403_FORBIDDEN
             )
 
+        serializer = BookingUpdateSerializer(booking, data=request.data, partial=True,
+                                             context={'request': request, 'actor': actor})
         if serializer.is_valid():
+            # One conditional UPDATE; 409 if the booking changed meanwhile
             serializer.save()
-
-            # If provider is giving quote, set quoted_at timestamp
-            if 'quote_price' in request.data and booking.quoted_at is None:
-                booking.quoted_at = timezone.now()
-                booking.save()
-
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class ReviewCreateView(CreateAPIView):
+
+class BookingBulkUpdateView(APIView):
+    """
+    Many transitions of the provider's bookings at once - quotes, rejections,
+    starts and completions - each reported back by position (see
+    booking_bulk.py).
+    """
+    permission_classes = [IsAuthenticated]
+    throttle_cost = 5
+
+    def post(self, request):
+        if not request.user.is_service_provider:
+            return Response(
+                {"error": "Only service providers can update bookings in bulk"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        return Response(bulk_transition(request.user.profile, request.data))
+
+class ReviewCreateView(SerializerTimingMixin, CreateAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = ReviewSerializer
 
     def perform_create(self, serializer):
-        review = serializer.save(user=self.request.user)
+        # The provider's rating_count/rating_sum are bumped with one F() UPDATE
+        # by the provider_rating counter (see counters.py); keep it in the same
+        # transaction as the review insert
+        with transaction.atomic():
+            serializer.save(user=self.request.user)
 
-        # Update provider's rating
-        provider = review.provider
-        provider.total_reviews += 1
-        provider.rating = (
-                                  (provider.rating * (provider.total_reviews - 1)) + review.rating
-                          ) / provider.total_reviews
-        provider.save()
 
-
-class ProviderReviewsListView(ListAPIView):
+class ProviderReviewsListView(SerializerTimingMixin, CachedResponseMixin, ListAPIView):
+    cache_namespace = 'provider-reviews'
     permission_classes = [permissions.AllowAny]
     serializer_class = ReviewSerializer
+    ordering = ['-created_at']
 
     def get_queryset(self):
         provider_id = self.kwargs['provider_id']
-        return Review.objects.filter(provider_id=provider_id).order_by('-created_at')
+        return ReviewSerializer.setup_eager_loading(Review.objects.filter(provider_id=provider_id))
 
 
 # ============= REPORT SYSTEM =============
-class ReportCreateView(CreateAPIView):
+class ReportCreateView(SerializerTimingMixin, CreateAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = ReportSerializer
 
@@ -301,24 +449,28 @@ class ReportCreateView(CreateAPIView):
         serializer.save(reporter=self.request.user)
 
 
-class UserReportsListView(ListAPIView):
+class UserReportsListView(SerializerTimingMixin, ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = ReportSerializer
+    ordering = ['-created_at']
 
     def get_queryset(self):
         user = self.request.user
         # Users can see reports they made
-        return Report.objects.filter(reporter=user).order_by('-created_at')
+        return ReportSerializer.setup_eager_loading(Report.objects.filter(reporter=user))
 
 
 # ============= MARKETPLACE =============
-class ProductListView(ListAPIView):
+class ProductListView(SerializerTimingMixin, CachedResponseMixin, ListAPIView):
+    cache_namespace = 'marketplace'
     permission_classes = [permissions.AllowAny]
     serializer_class = ProductSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    # Full-text search ranks by relevance unless ?ordering= is given;
+    # ?near=lat,lng&radius=km sorts by distance (before relevance)
+    filter_backends = [DjangoFilterBackend, NearbyFilter, ProductSearchFilter, filters.OrderingFilter]
     filterset_fields = ['category', 'condition', 'city', 'is_sold']
-    search_fields = ['title', 'description', 'seller__username']
     ordering_fields = ['price', 'created_at', 'views']
+    ordering = ['-created_at']
 
     def get_queryset(self):
         queryset = Product.objects.filter(is_active=True)
@@ -332,36 +484,59 @@ class ProductListView(ListAPIView):
         if max_price:
             queryset = queryset.filter(price__lte=float(max_price))
 
-        return queryset
+        return ProductSerializer.setup_eager_loading(queryset)
 
 
 #changes here
-class ProductCreateView(CreateAPIView):
+class ProductCreateView(SerializerTimingMixin, CreateAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = ProductSerializer
 
     def perform_create(self, serializer):
-        # Update user's profile to mark as marketplace seller
-        profile = self.request.user.profile
-        if not profile.is_marketplace_seller:
-            profile.is_marketplace_seller = True
-            profile.save()
+        with transaction.atomic():
+            serializer.save(seller=self.request.user,is_active = True)
+            # Mark the user's profile as marketplace seller, in the background
+            profile = self.request.user.profile
+            if not profile.is_marketplace_seller:
+                enqueue(mark_marketplace_seller, profile_id=profile.pk)
 
-        serializer.save(seller=self.request.user,is_active = True)
 
+class ProductBulkImportView(APIView):
+    """
+    Create many products at once from a JSON array (request body) or a CSV
+    upload (multipart field `file`, one product per row, header row with
+    the field names). Either every row is created or, if any is invalid,
+    none is and the invalid ones are reported by row index. ?dry_run=true
+    only validates.
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = [JSONParser, MultiPartParser]
+    throttle_cost = 20
+
+    def post(self, request):
+        if 'file' in request.FILES:
+            rows = read_csv(request.FILES['file'])
+        else:
+            rows = request.data
+        dry_run = request.query_params.get('dry_run') in ('1', 'true', 'True')
 
-class ProductDetailView(RetrieveAPIView, UpdateAPIView, DestroyAPIView):
+        result = import_products(request.user, rows, dry_run=dry_run)
+        if result['errors']:
+            return Response(result, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_200_OK if dry_run else status.HTTP_201_CREATED)
+
+
+class ProductDetailView(SerializerTimingMixin, RetrieveAPIView, UpdateAPIView, DestroyAPIView):
     permission_classes = [permissions.AllowAny]
     serializer_class = ProductSerializer
 
     def get_queryset(self):
-        return Product.objects.all()
+        return ProductSerializer.setup_eager_loading(Product.objects.all())
 
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
-        # Increment view count
-        instance.views += 1
-        instance.save()
+        # Increment view count (buffered, written in batches)
+        product_views.increment(instance.pk)
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
 
@@ -388,7 +563,7 @@ class ProductDetailView(RetrieveAPIView, UpdateAPIView, DestroyAPIView):
         return Response({"message": "Product deactivated successfully"}, status=status.HTTP_200_OK)
 
 
-class ProductCommentCreateView(CreateAPIView):
+class ProductCommentCreateView(SerializerTimingMixin, CreateAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = ProductCommentSerializer
 
@@ -396,18 +571,20 @@ class ProductCommentCreateView(CreateAPIView):
         serializer.save(user=self.request.user)
 
 
-class ProductCommentListView(ListAPIView):
+class ProductCommentListView(SerializerTimingMixin, ListAPIView):
     permission_classes = [permissions.AllowAny]
     serializer_class = ProductCommentSerializer
+    ordering = ['-created_at']
 
     def get_queryset(self):
         product_id = self.kwargs['product_id']
-        return ProductComment.objects.filter(product_id=product_id, is_visible=True).order_by('-created_at')
+        queryset = ProductComment.objects.filter(product_id=product_id, is_visible=True)
+        return ProductCommentSerializer.setup_eager_loading(queryset)
 
 
 class ProductCommentDeleteView(DestroyAPIView):
     permission_classes = [IsAuthenticated]
-    queryset = ProductComment.objects.all()
+    queryset = ProductComment.objects.select_related('product')
 
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -430,21 +607,24 @@ class ProductCommentDeleteView(DestroyAPIView):
             return Response({"message": "Comment deleted successfully"}, status=status.HTTP_200_OK)
 
 
-class UserProductsListView(ListAPIView):
+class UserProductsListView(SerializerTimingMixin, ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = ProductSerializer
+    ordering = ['-created_at']
 
     def get_queryset(self):
-        return Product.objects.filter(seller=self.request.user)
+        return ProductSerializer.setup_eager_loading(Product.objects.filter(seller=self.request.user))
 
 
-class UserProductCommentsListView(ListAPIView):
+class UserProductCommentsListView(SerializerTimingMixin, ListAPIView):
     """Get comments on user's products"""
     permission_classes = [IsAuthenticated]
     serializer_class = ProductCommentSerializer
+    ordering = ['-created_at']
 
     def get_queryset(self):
         # Get comments on all products owned by the user
-        return ProductComment.objects.filter(
+        queryset = ProductComment.objects.filter(
             product__seller=self.request.user
-        ).order_by('-created_at')
\ No newline at end of file
+        )
+        return ProductCommentSerializer.setup_eager_loading(queryset)
\ No newline at end of file
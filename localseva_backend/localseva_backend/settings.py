@@ -26,6 +26,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'cloudinary',
     'cloudinary_storage',
     'django_filters',
@@ -38,6 +39,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover the whole request
+    'local_user.metrics.RequestMetricsMiddleware',
+    'local_user.throttling.LoadSheddingMiddleware',
+    'local_user.db_router.ReplicaRoutingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -51,6 +56,7 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'localseva_backend.urls'
 CORS_ALLOW_ALL_ORIGINS = True
+CORS_EXPOSE_HEADERS = ['Link', 'Server-Timing']
 
 TEMPLATES = [
     {
@@ -92,6 +98,28 @@ DATABASES = {
     }
 }
 
+#Read replicas (local_user.db_router): comma separated host[:port] list, same
+#database name and credentials as the primary. Safe-method requests read from a
+#replica unless the client wrote within DB_PRIMARY_PIN_SECONDS
+DATABASE_REPLICAS = []
+for number, address in enumerate(filter(None, os.getenv("DB_REPLICA_HOSTS", "").split(",")), 1):
+    alias = f"replica_{number}"
+    host, _, port = address.strip().partition(":")
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "PORT": port or DATABASES["default"]["PORT"],
+        # Tests share the primary's test database, unless DB_REPLICA_TEST_SEPARATE
+        # gives each replica its own one to prove reads really go there
+        "TEST": (
+            {"NAME": f"test_{DATABASES['default']['NAME']}_{alias}"}
+            if os.getenv("DB_REPLICA_TEST_SEPARATE") == "True" else {"MIRROR": "default"}
+        ),
+    }
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ["local_user.db_router.PrimaryReplicaRouter"]
+DB_PRIMARY_PIN_SECONDS = int(os.getenv("DB_PRIMARY_PIN_SECONDS", 15))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -133,10 +161,16 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 #media
 MEDIA_URL = '/media/'
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 STORAGES = {
     "default": {
         "BACKEND": "cloudinary_storage.storage.MediaCloudinaryStorage",
     },
+    # Resized image variants (local_user/images.py). Set to
+    # django.core.files.storage.FileSystemStorage to keep them under MEDIA_ROOT
+    "image_variants": {
+        "BACKEND": os.getenv("IMAGE_VARIANT_STORAGE", "cloudinary_storage.storage.MediaCloudinaryStorage"),
+    },
     "staticfiles": {
         "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
     },
@@ -155,12 +189,30 @@ CLOUDINARY_STORAGE = {
 
 
 
+#JWT authentication without a user lookup per request: the user comes from the
+#token claims (local_user.authentication). STATELESS_JWT=False looks it up again
+STATELESS_JWT = os.getenv("STATELESS_JWT", "True") == "True"
+JWT_AUTHENTICATION = (
+    'local_user.authentication.StatelessJWTAuthentication' if STATELESS_JWT
+    else 'rest_framework_simplejwt.authentication.JWTAuthentication'
+)
+#Seconds each worker may use its cached copy of the revoked token list
+TOKEN_DENYLIST_CACHE_SECONDS = int(os.getenv("TOKEN_DENYLIST_CACHE_SECONDS", 10))
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
 
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        JWT_AUTHENTICATION,
         'rest_framework.authentication.SessionAuthentication',
-    )
+    ),
+    # Keyset pagination - next/prev cursors are sent in the Link header
+    'DEFAULT_PAGINATION_CLASS': 'local_user.pagination.KeysetPagination',
+    # Token buckets per client IP and per user (local_user.throttling)
+    'DEFAULT_THROTTLE_CLASSES': [
+        'local_user.throttling.IPTokenBucketThrottle',
+        'local_user.throttling.UserTokenBucketThrottle',
+    ],
+    'PAGE_SIZE': 50,
 }
 
 
@@ -175,3 +227,80 @@ SIMPLE_JWT = {
     "AUTH_HEADER_TYPES": ("Bearer",),
 }
 
+#Product view counts are buffered in memory and written every N seconds
+PRODUCT_VIEW_FLUSH_INTERVAL = int(os.getenv("PRODUCT_VIEW_FLUSH_INTERVAL", 10))
+
+#Cache - local memory by default, set CACHE_BACKEND=file to share it between
+#worker processes on one machine (no external service needed)
+CACHE_BACKENDS = {
+    "locmem": "django.core.cache.backends.locmem.LocMemCache",
+    "file": "django.core.cache.backends.filebased.FileBasedCache",
+}
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKENDS[os.getenv("CACHE_BACKEND", "locmem")],
+        "LOCATION": os.getenv("CACHE_LOCATION", "/var/tmp/localseva_cache"),
+    }
+}
+
+#Cached GET responses for the public listing endpoints (seconds)
+RESPONSE_CACHE_TIMEOUT = int(os.getenv("RESPONSE_CACHE_TIMEOUT", 60))
+
+#Serve the read-heavy GET endpoints with native async views (local_user.async_views).
+#Turned on by asgi.py; leave off for WSGI workers
+ASYNC_READ_VIEWS = os.getenv("ASYNC_READ_VIEWS") == "True"
+
+#Format of the resized image variants (local_user.images): WEBP or JPEG
+IMAGE_VARIANT_FORMAT = os.getenv("IMAGE_VARIANT_FORMAT", "WEBP")
+#Largest accepted image upload in bytes (JPEG, PNG, WebP or GIF)
+IMAGE_UPLOAD_MAX_SIZE = int(os.getenv("IMAGE_UPLOAD_MAX_SIZE", 10 * 1024 * 1024))
+
+#Background jobs (local_user.jobs): run them in-process after commit instead of
+#by `manage.py run_jobs` workers - for local development only
+JOB_QUEUE_EAGER = os.getenv("JOB_QUEUE_EAGER") == "True"
+#Seconds before a job claimed by a worker that died is picked up again
+JOB_LOCK_TIMEOUT = int(os.getenv("JOB_LOCK_TIMEOUT", 600))
+
+#Largest accepted bulk product import (POST /marketplace/import/)
+PRODUCT_IMPORT_MAX_ROWS = int(os.getenv("PRODUCT_IMPORT_MAX_ROWS", 5000))
+#Largest accepted bulk booking update (POST /bookings/bulk-update/)
+BOOKING_BULK_UPDATE_MAX_ITEMS = int(os.getenv("BOOKING_BULK_UPDATE_MAX_ITEMS", 200))
+
+#Per-request timings (local_user.metrics): Server-Timing header and per-route
+#Prometheus metrics at /metrics (staff only)
+REQUEST_METRICS = os.getenv("REQUEST_METRICS", "True") == "True"
+SERVER_TIMING = os.getenv("SERVER_TIMING", "True") == "True"
+#Shared directory where each worker writes its totals, so /metrics covers all workers
+METRICS_DIR = os.getenv("METRICS_DIR")
+METRICS_FLUSH_INTERVAL = int(os.getenv("METRICS_FLUSH_INTERVAL", 10))
+
+#Token-bucket throttling (local_user.throttling): a client may spend RATE tokens
+#per second, up to BURST at once. Requests cost 1 token, login/register and the
+#search filters more. Over the limit the answer is 429 with Retry-After
+THROTTLING = os.getenv("THROTTLING", "True") == "True"
+THROTTLE_USER_RATE = float(os.getenv("THROTTLE_USER_RATE", 10))
+THROTTLE_USER_BURST = float(os.getenv("THROTTLE_USER_BURST", 100))
+THROTTLE_IP_RATE = float(os.getenv("THROTTLE_IP_RATE", 20))
+THROTTLE_IP_BURST = float(os.getenv("THROTTLE_IP_BURST", 200))
+#Load shedding: 503 with Retry-After while more requests than this are in flight
+#across all workers, or queries average more than this many ms (needs
+#REQUEST_METRICS); 0 turns a check off
+LOAD_SHEDDING = os.getenv("LOAD_SHEDDING", "True") == "True"
+SHED_MAX_IN_FLIGHT = int(os.getenv("SHED_MAX_IN_FLIGHT", 64))
+SHED_DB_LATENCY_MS = float(os.getenv("SHED_DB_LATENCY_MS", 250))
+SHED_RETRY_AFTER = int(os.getenv("SHED_RETRY_AFTER", 2))
+#SQLite file holding the throttle buckets and worker load, shared by the workers
+#on one machine
+THROTTLE_STORE = os.getenv("THROTTLE_STORE", "/var/tmp/localseva_throttle.sqlite3")
+
+#Provider ranking score (local_user.ranking): reviews are averaged together with
+#PRIOR_WEIGHT reviews of PRIOR_RATING; review volume and completed bookings add
+#their WEIGHT x ln(1 + count); the latest completed booking adds up to
+#RECENCY_WEIGHT, halved after RECENCY_DAYS. Run `manage.py refresh_rankings`
+#daily, and after changing these
+RANKING_PRIOR_RATING = float(os.getenv("RANKING_PRIOR_RATING", 3.5))
+RANKING_PRIOR_WEIGHT = float(os.getenv("RANKING_PRIOR_WEIGHT", 10))
+RANKING_REVIEW_WEIGHT = float(os.getenv("RANKING_REVIEW_WEIGHT", 0.25))
+RANKING_BOOKING_WEIGHT = float(os.getenv("RANKING_BOOKING_WEIGHT", 0.25))
+RANKING_RECENCY_WEIGHT = float(os.getenv("RANKING_RECENCY_WEIGHT", 1))
+RANKING_RECENCY_DAYS = float(os.getenv("RANKING_RECENCY_DAYS", 90))
@@ -18,10 +18,12 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from local_user.metrics import MetricsView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api-auth/', include('rest_framework.urls')),
+    path('metrics', MetricsView.as_view(), name="metrics"),
     path('api/user/', include('local_user.urls')),
     path("",include('local_user.urls')),
 ]